@@ -0,0 +1,129 @@
+"""Compares compiled struct definitions against the original field-by-field decoder and encoder.
+
+Run with: python benchmarks/bench_definitions.py
+"""
+from __future__ import print_function
+
+from io import BytesIO
+import os
+import struct
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from isomedia.atom import AtomHeader, UINT_BYTES_TO_FORMAT, interpret_atom, interpret_int, write_atom
+
+MVHD_DEFINITION = [
+    ('version', (1, int)),
+    ('flags', (3, None)),
+    ('creation_time', (4, int)),
+    ('modification_time', (4, int)),
+    ('timescale', (4, int)),
+    ('duration', (4, int)),
+    ('rate', (4, int)),
+    ('volume', (2, int)),
+    ('reserved', (2, int)),
+    ('preferred_long', (list, (4, int), 2)),
+    ('matrix', (list, (4, int), 9)),
+    ('preview_time', (4, int)),
+    ('preview_duration', (4, int)),
+    ('poster_time', (4, int)),
+    ('selection_time', (4, int)),
+    ('selection_duration', (4, int)),
+    ('current_time', (4, int)),
+    ('next_track_ID', (4, int))
+]
+
+FTYP_DEFINITION = [
+    ('major_brand', (4, None)),
+    ('minor_version', (4, int)),
+    ('compatible_brands', (list, (4, None), None))
+]
+
+def legacy_interpret_atom(atom_header, atom_body, definition):
+    # The per-field implementation that compiled definitions replaced.
+    def cast_field(data, size, cast):
+        if cast == int:
+            data = interpret_int(data, 0, size)
+        return data
+
+    result = {}
+    atom_body_length = atom_header.size - atom_header.header_length
+    bytes_read = 0
+
+    for field_name, field_type in definition:
+        length = field_type[0]
+
+        if length == list:
+            item_length, item_cast = field_type[1]
+            item_count = field_type[2]
+
+            data = []
+            while (item_count is None and bytes_read < atom_body_length) or (item_count is not None and len(data) < item_count):
+                item_data = atom_body.read(item_length)
+                bytes_read += len(item_data)
+                data.append(cast_field(item_data, item_length, item_cast))
+        else:
+            data = atom_body.read(length)
+            bytes_read += len(data)
+            data = cast_field(data, length, field_type[1])
+
+        result[field_name] = data
+
+    return result
+
+def legacy_write_atom(properties, definition):
+    result = b''
+
+    for field_name, field_type in definition:
+        field_value = properties[field_name]
+        length = field_type[0]
+
+        if length == list:
+            item_length, item_cast = field_type[1]
+            for item_value in field_value:
+                if item_cast == int:
+                    result += struct.pack(UINT_BYTES_TO_FORMAT[item_length], item_value)
+                else:
+                    result += item_value
+        else:
+            if field_type[1] == int:
+                result += struct.pack(UINT_BYTES_TO_FORMAT[length], field_value)
+            else:
+                result += field_value
+
+    return result
+
+def bench(name, definition, body, number):
+    header = AtomHeader('test', 8 + len(body), 8)
+    properties = interpret_atom(header, BytesIO(body), definition)
+
+    assert legacy_interpret_atom(header, BytesIO(body), definition) == properties
+    assert legacy_write_atom(properties, definition) == write_atom(properties, definition) == body
+
+    timings = [
+        ('decode (per-field)', lambda: legacy_interpret_atom(header, BytesIO(body), definition)),
+        ('decode (compiled)', lambda: interpret_atom(header, BytesIO(body), definition)),
+        ('encode (per-field)', lambda: legacy_write_atom(properties, definition)),
+        ('encode (compiled)', lambda: write_atom(properties, definition)),
+    ]
+
+    for label, function in timings:
+        seconds = min(timeit.repeat(function, number=number, repeat=3))
+        print('%-6s %-20s %8.2f us' % (name, label, seconds / number * 1e6))
+
+def main():
+    number = 20000
+
+    mvhd_body = struct.pack('>B3s5IHH2I9I7I', 0, b'\x00\x00\x00', 1, 2, 600, 1200, 0x10000, 0x100, 0,
+                            0, 0,
+                            0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000,
+                            0, 0, 0, 0, 0, 0, 3)
+    ftyp_body = b'isom' + struct.pack('>I', 512) + b'isomiso2avc1mp41'
+
+    bench('mvhd', MVHD_DEFINITION, mvhd_body, number)
+    bench('ftyp', FTYP_DEFINITION, ftyp_body, number)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""Times isomedia.faststart on a synthetic file with moov after a large (sparse) mdat.
+
+Run with: python benchmarks/bench_faststart.py [mdat size in MiB] [sample count]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import isomedia
+
+from synthetic import write_progressive_file
+
+def main():
+    mdat_size = (int(sys.argv[1]) if len(sys.argv) > 1 else 4096) * 1024 * 1024
+    sample_count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+
+    directory = tempfile.mkdtemp()
+    in_path = os.path.join(directory, 'in.mp4')
+    out_path = os.path.join(directory, 'out.mp4')
+
+    try:
+        with open(in_path, 'wb') as fp:
+            write_progressive_file(fp, mdat_size, sample_count)
+
+        with open(in_path, 'rb') as in_fp, open(out_path, 'wb') as out_fp:
+            start = time.time()
+            isomedia.faststart(in_fp, out_fp)
+            elapsed = time.time() - start
+
+        size = os.path.getsize(out_path)
+        print('input:      %d bytes, %d samples' % (os.path.getsize(in_path), sample_count))
+        print('output:     %d bytes' % size)
+        print('faststart:  %.2f s (%.1f MiB/s)' % (elapsed, size / elapsed / (1024 * 1024)))
+    finally:
+        for path in (in_path, out_path):
+            if os.path.exists(path):
+                os.remove(path)
+        os.rmdir(directory)
+
+if __name__ == '__main__':
+    main()
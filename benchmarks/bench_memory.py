@@ -0,0 +1,68 @@
+"""Measures the memory held by a parsed atom tree for a synthetic many-fragment file.
+
+Run with: python benchmarks/bench_memory.py [fragments]
+"""
+from __future__ import print_function
+
+import gc
+import os
+import sys
+import tempfile
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import isomedia
+from isomedia.atom import ContainerMixin
+
+from synthetic import write_fragmented_file
+
+def count_atoms(atoms):
+    count = 0
+    for atom in atoms:
+        count += 1
+        if isinstance(atom, ContainerMixin):
+            count += count_atoms(atom.children)
+    return count
+
+def tree_size(document):
+    """Sums sys.getsizeof over every object reachable from the document's atoms, excluding the document itself."""
+    skip_types = (type, types.ModuleType, types.FunctionType)
+    seen = set([id(document), id(document.fp)])
+    pending = [document.atoms]
+    total = 0
+
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen or isinstance(obj, skip_types):
+            continue
+
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        pending.extend(gc.get_referents(obj))
+
+    return total
+
+def main():
+    fragments = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    handle, path = tempfile.mkstemp(suffix='.mp4')
+    try:
+        with os.fdopen(handle, 'wb') as fp:
+            write_fragmented_file(fp, fragments, track_count=2)
+
+        with open(path, 'rb') as fp:
+            document = isomedia.load(fp, eager=True)
+
+            atom_count = count_atoms(document.atoms)
+            size = tree_size(document)
+
+            print('fragments:      %d' % fragments)
+            print('atoms:          %d' % atom_count)
+            print('tree bytes:     %d' % size)
+            print('bytes per atom: %.1f' % (float(size) / atom_count))
+    finally:
+        os.remove(path)
+
+if __name__ == '__main__':
+    main()
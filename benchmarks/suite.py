@@ -0,0 +1,175 @@
+"""Runs every benchmark scenario on synthetic files and saves the results as JSON, optionally comparing them with the
+results of an earlier run.
+
+Run with: python benchmarks/suite.py [--scale N] [--repeat N] [--output results.json] [--compare baseline.json]
+
+Each scenario is measured for:
+    load_seconds         parsing the whole tree (eager load)
+    lazy_load_seconds    parsing the top level only
+    peak_memory_bytes    peak memory allocated during the eager load (Python 3 only)
+    write_seconds        writing the loaded document back out, and the equivalent write_mib_per_second
+    lookup_seconds       one find_all of the scenario's path, once its children are parsed
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import isomedia
+
+from synthetic import metadata_path, write_fragmented_file, write_metadata_file, write_progressive_file
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+MIB = 1024 * 1024
+
+# name -> (writer(fp, scale), lookup path)
+SCENARIOS = [
+    ('huge_mdat', lambda fp, scale: write_progressive_file(fp, scale * 1024 * MIB, 1000),
+     'moov/trak/mdia/minf/stbl/stco'),
+    ('sample_tables', lambda fp, scale: write_progressive_file(fp, 64 * MIB, scale * 1000000, variable_sizes=True),
+     'moov/trak/mdia/minf/stbl/stsz'),
+    ('fragments', lambda fp, scale: write_fragmented_file(fp, scale * 5000, track_count=2), 'moof/traf/trun'),
+    ('deep_metadata', lambda fp, scale: write_metadata_file(fp, 32, scale * 5000), metadata_path(32)),
+    ('large_size', lambda fp, scale: write_fragmented_file(fp, scale * 5000, track_count=2, large=True),
+     'moof/traf/trun'),
+]
+
+# Metrics where a larger value is a regression.
+COMPARED_METRICS = ['load_seconds', 'lazy_load_seconds', 'peak_memory_bytes', 'write_seconds', 'lookup_seconds']
+
+def best_time(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        function()
+        times.append(time.time() - start)
+    return min(times)
+
+def measure_peak_memory(path):
+    if tracemalloc is None:
+        return None
+
+    tracemalloc.start()
+    try:
+        with open(path, 'rb') as fp:
+            isomedia.load(fp, eager=True)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run_scenario(directory, writer, lookup_path, scale, repeat):
+    path = os.path.join(directory, 'input.mp4')
+    out_path = os.path.join(directory, 'output.mp4')
+
+    with open(path, 'wb') as fp:
+        writer(fp, scale)
+    file_size = os.path.getsize(path)
+
+    results = {'file_bytes': file_size}
+
+    with open(path, 'rb') as fp:
+        results['load_seconds'] = best_time(lambda: isomedia.load(fp, eager=True), repeat)
+        results['lazy_load_seconds'] = best_time(lambda: isomedia.load(fp), repeat)
+
+        document = isomedia.load(fp, eager=True)
+
+        def write():
+            with open(out_path, 'wb') as out_fp:
+                document.write(out_fp)
+
+        results['write_seconds'] = best_time(write, repeat)
+        results['write_mib_per_second'] = float(file_size) / MIB / max(results['write_seconds'], 1e-9)
+
+        matches = document.find_all(lookup_path)
+        assert matches, 'The scenario should contain %s' % lookup_path
+
+        lookups = 100
+        results['lookup_seconds'] = best_time(lambda: [document.find_all(lookup_path) for _ in range(lookups)],
+                                              repeat) / lookups
+
+    results['peak_memory_bytes'] = measure_peak_memory(path)
+
+    os.remove(path)
+    if os.path.exists(out_path):
+        os.remove(out_path)
+
+    return results
+
+def compare(results, baseline, threshold):
+    """Prints each metric against the baseline. Returns the number of regressions larger than threshold."""
+    regressions = 0
+
+    for name, metrics in sorted(results['scenarios'].items()):
+        baseline_metrics = baseline.get('scenarios', {}).get(name)
+        if baseline_metrics is None:
+            continue
+
+        for metric in COMPARED_METRICS:
+            new, old = metrics.get(metric), baseline_metrics.get(metric)
+            if not new or not old:
+                continue
+
+            ratio = float(new) / old
+            regressed = ratio > 1 + threshold
+            regressions += regressed
+            print('%-14s %-18s %8.3fx%s' % (name, metric, ratio, '  REGRESSION' if regressed else ''))
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks isomedia on synthetic files.')
+    parser.add_argument('--scale', type=int, default=1, help='multiplies the size of every scenario')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement; the best is kept')
+    parser.add_argument('--scenario', action='append', help='only run the named scenario(s)')
+    parser.add_argument('--output', help='file to save the results to as JSON')
+    parser.add_argument('--compare', help='results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='slowdown (as a fraction) beyond which a metric counts as a regression')
+    args = parser.parse_args()
+
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scale': args.scale,
+        'repeat': args.repeat,
+        'scenarios': {},
+    }
+
+    directory = tempfile.mkdtemp()
+    try:
+        for name, writer, lookup_path in SCENARIOS:
+            if args.scenario and name not in args.scenario:
+                continue
+
+            metrics = run_scenario(directory, writer, lookup_path, args.scale, args.repeat)
+            results['scenarios'][name] = metrics
+            print('%-14s load %.3fs  lazy %.3fs  write %.3fs (%.0f MiB/s)  lookup %.1fus' % (
+                name, metrics['load_seconds'], metrics['lazy_load_seconds'], metrics['write_seconds'],
+                metrics['write_mib_per_second'], metrics['lookup_seconds'] * 1e6))
+    finally:
+        shutil.rmtree(directory)
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
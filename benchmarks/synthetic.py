@@ -0,0 +1,178 @@
+"""Writers for synthetic ISO base media files with a controllable shape, for benchmarks."""
+import struct
+
+from isomedia.compat import type_from_bytes, type_to_bytes
+
+MAX_UINT32 = (2 ** 32) - 1
+
+# Boxes whose bodies are only other boxes, as far as large_size needs to know.
+PLAIN_CONTAINERS = set(['moov', 'mvex', 'moof', 'traf', 'trak', 'mdia', 'minf', 'stbl', 'udta', 'ilst'])
+
+def box(atom_type, body, large=False):
+    size = 8 + len(body)
+    if large or size > MAX_UINT32:
+        return struct.pack('>I4sQ', 1, type_to_bytes(atom_type), size + 8) + body
+    return struct.pack('>I4s', size, type_to_bytes(atom_type)) + body
+
+def large_size(data):
+    """Re-encodes a run of boxes, and the boxes inside them, with 64-bit (largesize) headers."""
+    boxes = []
+    position = 0
+
+    while position < len(data):
+        size, atom_type = struct.unpack('>I4s', data[position:position + 8])
+        header_length = 8
+        if size == 1:
+            size = struct.unpack('>Q', data[position + 8:position + 16])[0]
+            header_length = 16
+
+        body = data[position + header_length:position + size]
+        atom_type = type_from_bytes(atom_type)
+        if atom_type in PLAIN_CONTAINERS:
+            body = large_size(body)
+        boxes.append(box(atom_type, body, large=True))
+        position += size
+
+    return b''.join(boxes)
+
+def full_box(atom_type, version, flags, body):
+    return box(atom_type, struct.pack('>I', (version << 24) | flags) + body)
+
+def ftyp():
+    return box('ftyp', b'isom' + struct.pack('>I', 512) + b'isomiso2mp41')
+
+def mvhd(timescale=1000, duration=0, next_track_id=2):
+    matrix = struct.pack('>9I', 0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+    body = (struct.pack('>4I', 0, 0, timescale, duration) + struct.pack('>IHH', 0x10000, 0x100, 0) + b'\x00' * 8 +
+            matrix + b'\x00' * 24 + struct.pack('>I', next_track_id))
+    return full_box('mvhd', 0, 0, body)
+
+def trex(track_id):
+    return full_box('trex', 0, 0, struct.pack('>5I', track_id, 1, 0, 0, 0))
+
+def fragmented_moov(track_count=1):
+    mvex = box('mvex', b''.join(trex(track_id) for track_id in range(1, track_count + 1)))
+    return box('moov', mvhd(next_track_id=track_count + 1) + mvex)
+
+def moof(sequence_number, base_decode_time, track_count, samples_per_traf, sample_duration, sample_size):
+    trafs = []
+    for track_id in range(1, track_count + 1):
+        tfhd = full_box('tfhd', 0, 0x020000, struct.pack('>I', track_id))
+        tfdt = full_box('tfdt', 1, 0, struct.pack('>Q', base_decode_time))
+        samples = struct.pack('>I', sample_duration) + struct.pack('>I', sample_size)
+        # data-offset, sample-duration and sample-size present
+        trun = full_box('trun', 0, 0x000301, struct.pack('>Ii', samples_per_traf, 0) + samples * samples_per_traf)
+        trafs.append(box('traf', tfhd + tfdt + trun))
+
+    mfhd = full_box('mfhd', 0, 0, struct.pack('>I', sequence_number))
+    return box('moof', mfhd + b''.join(trafs))
+
+def write_payload(fp, atom_type, payload_size, chunk_size=1 << 20, large=False):
+    """Writes an atom of payload_size zero bytes without holding it in memory."""
+    size = 8 + payload_size
+    if large or size > MAX_UINT32:
+        fp.write(struct.pack('>I4sQ', 1, type_to_bytes(atom_type), size + 8))
+    else:
+        fp.write(struct.pack('>I4s', size, type_to_bytes(atom_type)))
+
+    chunk = b'\x00' * min(chunk_size, payload_size)
+    remaining = payload_size
+    while remaining > 0:
+        fp.write(chunk[:remaining])
+        remaining -= len(chunk)
+
+def write_fragmented_file(fp, fragments, track_count=1, samples_per_traf=30, sample_duration=1000, sample_size=64,
+                          large=False):
+    """Writes a fragmented file made of an ftyp, a moov and fragments moof/mdat pairs. With large, every box has a
+    64-bit header."""
+    encode = large_size if large else (lambda data: data)
+
+    fp.write(encode(ftyp()))
+    fp.write(encode(fragmented_moov(track_count)))
+
+    for sequence_number in range(1, fragments + 1):
+        base_decode_time = (sequence_number - 1) * samples_per_traf * sample_duration
+        fp.write(encode(moof(sequence_number, base_decode_time, track_count, samples_per_traf, sample_duration,
+                             sample_size)))
+        write_payload(fp, 'mdat', track_count * samples_per_traf * sample_size, large=large)
+
+def sample_table(sample_count, sample_size, samples_per_chunk, chunk_offsets, variable_sizes=False):
+    stts = full_box('stts', 0, 0, struct.pack('>3I', 1, sample_count, 1000))
+    stsc = full_box('stsc', 0, 0, struct.pack('>4I', 1, 1, samples_per_chunk, 1))
+    if variable_sizes:
+        # One stsz entry per sample, as real video has, even though the sizes happen to be equal.
+        stsz = full_box('stsz', 0, 0, struct.pack('>2I', 0, sample_count) + struct.pack('>I', sample_size) * sample_count)
+    else:
+        stsz = full_box('stsz', 0, 0, struct.pack('>2I', sample_size, sample_count))
+
+    if chunk_offsets and max(chunk_offsets) > MAX_UINT32:
+        stco = full_box('co64', 0, 0, struct.pack('>I%dQ' % len(chunk_offsets), len(chunk_offsets), *chunk_offsets))
+    else:
+        stco = full_box('stco', 0, 0, struct.pack('>I%dI' % len(chunk_offsets), len(chunk_offsets), *chunk_offsets))
+
+    return box('stbl', stts + stsc + stsz + stco)
+
+def progressive_moov(sample_count, sample_size, samples_per_chunk, chunk_offsets, variable_sizes=False):
+    stbl = sample_table(sample_count, sample_size, samples_per_chunk, chunk_offsets, variable_sizes)
+    trak = box('trak', box('mdia', box('minf', stbl)))
+    return box('moov', mvhd(duration=sample_count) + trak)
+
+def write_progressive_file(fp, mdat_size, sample_count, samples_per_chunk=10, moov_at_end=True, variable_sizes=False):
+    """Writes a single-track, non-fragmented file whose samples evenly fill an mdat of mdat_size bytes.
+
+    The mdat is left as a hole (fp must be a real, seekable file), so multi-gigabyte inputs are cheap to create on file
+    systems with sparse file support.
+    """
+    sample_size = mdat_size // sample_count
+    chunk_size = sample_size * samples_per_chunk
+    chunk_count = (sample_count + samples_per_chunk - 1) // samples_per_chunk
+
+    mdat_header_length = 16 if 8 + mdat_size > MAX_UINT32 else 8
+    header = ftyp()
+
+    def write_moov(mdat_start):
+        chunk_offsets = [mdat_start + mdat_header_length + chunk * chunk_size for chunk in range(chunk_count)]
+        fp.write(progressive_moov(sample_count, sample_size, samples_per_chunk, chunk_offsets, variable_sizes))
+
+    fp.write(header)
+
+    if moov_at_end:
+        mdat_start = len(header)
+    else:
+        # The moov's size doesn't depend on the offsets' values, only on whether they need 64 bits.
+        moov_size = len(progressive_moov(sample_count, sample_size, samples_per_chunk, [MAX_UINT32 + 1] * chunk_count
+                                         if len(header) + mdat_size > MAX_UINT32 else [0] * chunk_count,
+                                         variable_sizes))
+        mdat_start = len(header) + moov_size
+        write_moov(mdat_start)
+
+    if mdat_header_length == 16:
+        fp.write(struct.pack('>I4sQ', 1, b'mdat', mdat_header_length + mdat_size))
+    else:
+        fp.write(struct.pack('>I4s', mdat_header_length + mdat_size, b'mdat'))
+    fp.seek(mdat_size, 1)
+
+    if moov_at_end:
+        write_moov(mdat_start)
+    else:
+        fp.truncate()
+
+def metadata(depth, items):
+    """Returns a udta holding an iTunes-style meta/ilst with items tags, itself nested in depth - 1 further udta."""
+    hdlr = full_box('hdlr', 0, 0, struct.pack('>I4s3I', 0, b'mdir', 0, 0, 0) + b'\x00')
+    tags = b''.join(box('\xa9nam', full_box('data', 0, 1, struct.pack('>I', 0) + b'tag %d' % item))
+                    for item in range(items))
+    udta = box('udta', full_box('meta', 0, 0, hdlr + box('ilst', tags)))
+
+    for level in range(depth - 1):
+        udta = box('udta', udta)
+    return udta
+
+def metadata_path(depth):
+    return '/'.join(['moov'] + ['udta'] * depth + ['meta', 'ilst'])
+
+def write_metadata_file(fp, depth, items):
+    """Writes a small file whose moov carries deeply nested metadata (see metadata)."""
+    fp.write(ftyp())
+    fp.write(box('moov', mvhd() + metadata(depth, items)))
+    write_payload(fp, 'mdat', 1024)
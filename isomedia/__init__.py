@@ -1,39 +1,417 @@
-from isomedia.atom import ContainerAtom, write_atom_header
-from isomedia.exceptions import MalformedIsomFile
-from isomedia.parser import parse_file
+import gc
+import os
 
-CHUNK_SIZE = 1024
+from isomedia.atom import ContainerMixin
+from isomedia.atom_list import AtomList, find, find_all
+from isomedia.block_reader import DEFAULT_BLOCK_SIZE, BlockReader
+from isomedia.cache import identify
+from isomedia.compat import PY3
+from isomedia.exceptions import AtomSizeChangedError, MalformedIsomFile
+from isomedia.faststart import move_moov_before_mdat
+from isomedia.mapping import MappedReader, map_file
+from isomedia.padding import absorb_size_changes, is_padding, restore_layout, snapshot_layout, update_sizes
+from isomedia.parallel import load_subtree, parse_containers
+from isomedia.parser import parse_children, parse_file
+from isomedia.payload_cache import PayloadCache
+from isomedia.selection import Selection
+from isomedia.source import FileSource, SourceReader
+from isomedia.transfer import COPY_BUFFER_SIZE, RangeWriter, copy_range, positional_reads, split_ranges
+
+if PY3:
+    # The asyncio API uses syntax that only Python 3 can compile.
+    from isomedia.aio import aload
 
 class ISOBaseMediaFile(object):
-    def __init__(self, fp):
+    def __init__(self, fp, mmap=False, eager=False, cache=None, stats=None, block_size=DEFAULT_BLOCK_SIZE,
+                 selection=None, source=None, payload_cache=None):
         self.fp = fp
-        self.atoms = parse_file(fp, self)
+        # Where atom bodies are read from (see source.FileSource); documents loaded from a source have no fp.
+        self.source = source if source is not None else FileSource(fp)
+        self._map = None
+        self._owns_fp = False
+        # Unmapped files are parsed through a BlockReader reading blocks of this size, unless it is None.
+        self.block_size = block_size
+        # A stats.ParseStats that measures parsing and writing, if any.
+        self.stats = stats
+        # Children already parsed in another process, pickled, by the offset of the first child (see parallel.py).
+        self._parsed_children = {}
+        # Holds the payloads loaded by get_data, within a byte budget (see payload_cache.PayloadCache).
+        self.payload_cache = payload_cache if payload_cache is not None else PayloadCache()
+        # Identifies this document's payloads in the cache, which may be shared with other documents.
+        self._payload_owner = object()
 
-    def __write_atom(self, atom, fp):
-        if isinstance(atom, ContainerAtom):
-            fp.write(write_atom_header(atom))
+        if mmap:
+            # Atoms parsed from the map hold views into it rather than copies of the file.
+            self._map = map_file(fp)
 
-            for child in atom.children:
-                self.__write_atom(child, fp)
+        # A selective parse isn't the whole file's parse, so it is neither served from nor stored in the cache.
+        identity = identify(fp) if cache is not None and selection is None else None
+        entry = cache.lookup(identity) if identity is not None else None
+        atoms = entry.build_atoms(self) if entry is not None else None
+
+        # The cache the file is recorded in and the file's identity when loaded, for save_in_place to discard its entry.
+        self._parse_cache = cache if identity is not None else None
+        self._identity = identity
+
+        # Unless eager, containers only record where their children are and parse them on first access.
+        if atoms is not None:
+            self.atoms = atoms
+        elif selection is not None:
+            # Everything a selection doesn't skip is parsed up front, within its limits.
+            parse = selection.begin()
+            self.atoms = parse_file(parse.wrap(self._reader()), self, eager=True, stats=stats, selection=parse)
+        else:
+            self.atoms = parse_file(self._reader(), self, eager=eager, stats=stats)
+
+            # Don't record a file that changed while it was being parsed.
+            if identity is not None and identify(fp) == identity:
+                cache.store(identity, self)
+
+    def _reader(self):
+        if self._map is not None:
+            reader = MappedReader(self._map)
+        elif self.fp is None:
+            reader = SourceReader(self.source)
+        else:
+            # Stats count what is actually read from the file, beneath the block reader.
+            reader = self.fp if self.stats is None else self.stats.wrap(self.fp)
+            if self.block_size:
+                reader = BlockReader(reader, self.block_size)
+            return reader
+
+        if self.stats is not None:
+            reader = self.stats.wrap(reader)
+        return reader
+
+    def defer_parsed_children(self, offset, data):
+        """Records children parsed elsewhere and pickled by parallel.dump_subtree, to be loaded on first access instead of
+        parsing them again."""
+        self._parsed_children[offset] = data
+
+    def parse_children(self, offset, length, parent=None):
+        data = self._parsed_children.pop(offset, None)
+        if data is not None:
+            return load_subtree(data, self, parent)
+
+        ptr = self._reader()
+        ptr.seek(offset)
+        return parse_children(ptr, offset, length, document=self, parent=parent, eager=False, stats=self.stats)
+
+    def read_range(self, offset, length):
+        """Returns up to length bytes of the file at offset. Reads are positional, so payloads can be read from several
+        threads at once."""
+        if self._map is not None:
+            return MappedReader(self._map).view(offset, length)
+
+        return self.source.read_at(offset, length)
+
+    def read_payload(self, offset, length):
+        """Returns the payload at offset, through the payload cache. Mapped payloads are views into the map, which cost
+        nothing to keep, and aren't cached."""
+        if self._map is not None:
+            return self.read_range(offset, length)
+
+        return self.payload_cache.get(self._payload_owner, offset, length, lambda: self.read_range(offset, length))
+
+    def readinto(self, offset, buffer_data):
+        """Fills buffer_data with the bytes of the file at offset, like read_range, returning the number of bytes
+        read."""
+        target = memoryview(buffer_data)
+        if self._map is None:
+            readinto_at = getattr(self.source, 'readinto_at', None)
+            if readinto_at is not None:
+                return readinto_at(offset, target)
+            data = self.source.read_at(offset, len(target))
+        else:
+            data = self._map[offset:offset + len(target)]
+
+        target[:len(data)] = data
+        return len(data)
+
+    def read_ranges(self, offset, lengths):
+        """Reads consecutive ranges of the given lengths starting at offset, as a single read, returning one buffer per
+        range. Raises MalformedIsomFile if the file ends first."""
+        if self._map is None:
+            readv_at = getattr(self.source, 'readv_at', None)
+            if readv_at is not None:
+                return readv_at(offset, lengths)
+
+        return split_ranges(self.read_range(offset, sum(lengths)), lengths)
+
+    def __copy_range(self, offset, length, fp):
+        if self._map is not None:
+            fp.write(self.read_range(offset, length))
+        elif self.fp is None or not positional_reads(self.fp):
+            # Read through the source, which serialises reads of file-like objects that have to be sought.
+            for start in range(offset, offset + length, COPY_BUFFER_SIZE):
+                wanted = min(COPY_BUFFER_SIZE, offset + length - start)
+                data = self.source.read_at(start, wanted)
+                if len(data) != wanted:
+                    raise MalformedIsomFile
+                fp.write(data)
+        else:
+            copy_range(self.fp, fp, offset, length)
+
+    def __write_atom(self, atom, output):
+        if self.stats is not None:
+            self.stats.measure_write(self.__write_atom_flushed, atom, output)
+        else:
+            self.__write_atom_unmeasured(atom, output)
+
+    def __write_atom_flushed(self, atom, output):
+        self.__write_atom_unmeasured(atom, output)
+        # Range copies are held back to merge with the next one. When measuring, make them now, so that each copy is
+        # charged to the atom that queued it rather than to whichever is written next.
+        output.flush()
+
+    def __write_atom_unmeasured(self, atom, output):
+        if isinstance(atom, ContainerMixin):
+            fields = atom.fields_to_bytes()
+
+            if atom.children_loaded():
+                output.write(fields)
+                for child in atom.children:
+                    self.__write_atom(child, output)
+            elif (len(fields) + atom._children_range[1] == atom._input_size and
+                  bytes(self.read_range(atom._input_file_offset, len(fields))) == fields):
+                # Neither the header nor the (never parsed) children changed: copy the atom as it is, which lets it
+                # merge with neighbouring untouched atoms into one range copy.
+                output.copy(atom._input_file_offset, atom._input_size)
+            else:
+                output.write(fields)
+                output.copy(atom._children_range[0], atom._children_range[1])
         else:
             if atom.LOAD_DATA:
-                fp.write(atom.to_bytes())
+                output.write(atom.to_bytes())
             else:
                 # Lazy-loaded Atoms are read-and-copy only.
-                self.fp.seek(atom._input_file_offset)
-                remaining_to_read = atom.size
-
-                while remaining_to_read > 0:
-                    next_chunk_length = min(CHUNK_SIZE, remaining_to_read)
-                    fp.write(self.fp.read(next_chunk_length))
-                    remaining_to_read -= next_chunk_length
+                output.copy(atom._input_file_offset, atom._input_size)
 
     def write(self, fp):
+        output = RangeWriter(fp, self.__copy_range)
+
         for atom in self.atoms:
-            self.__write_atom(atom, fp)
+            self.__write_atom(atom, output)
+
+        output.flush()
+
+    def __patch_if_changed(self, offset, data, patches):
+        if bytes(self.read_range(offset, len(data))) != data:
+            patches.append((offset, data))
+
+    def __collect_patches(self, atoms, offset, end, patches, moved):
+        for atom in atoms:
+            if atom._input_file_offset != offset or atom.size != atom._input_size:
+                # A new or resized atom, or one shifted by a change in its siblings' layout: rewrite all of it. Payloads
+                # such as mdat must stay where they are, since other atoms point into them.
+                if not atom.LOAD_DATA and not is_padding(atom):
+                    raise AtomSizeChangedError
+
+                data = atom.to_bytes()
+                if len(data) != atom.size:
+                    raise AtomSizeChangedError
+                patches.append((offset, data))
+                moved.append((atom, offset))
+            else:
+                self.__collect_atom_patches(atom, patches, moved)
+
+            offset += atom.size
+
+        if offset != end:
+            raise AtomSizeChangedError
+
+    def __collect_atom_patches(self, atom, patches, moved):
+        if atom.size != atom._input_size:
+            raise AtomSizeChangedError
+
+        if isinstance(atom, ContainerMixin):
+            fields = atom.fields_to_bytes()
+            self.__patch_if_changed(atom._input_file_offset, fields, patches)
+
+            atom_end = atom._input_file_offset + atom.size
+            if atom.children_loaded():
+                self.__collect_patches(atom.children, atom._input_file_offset + len(fields), atom_end, patches, moved)
+            elif atom._children_range != (atom._input_file_offset + len(fields), atom.size - len(fields)):
+                raise AtomSizeChangedError
+        elif atom.LOAD_DATA:
+            data = atom.to_bytes()
+            if len(data) != atom.size:
+                raise AtomSizeChangedError
+            self.__patch_if_changed(atom._input_file_offset, data, patches)
+
+    def __rebase(self, atom, offset):
+        atom._input_file_offset = offset
+        atom._input_size = atom.size
+
+        if isinstance(atom, ContainerMixin):
+            children_offset = offset + len(atom.fields_to_bytes())
+            for child in atom.children:
+                self.__rebase(child, children_offset)
+                children_offset += child.size
+
+    def rebalance_padding(self):
+        """Updates atom sizes after edits and absorbs size changes into neighbouring free/skip atoms, so that as few
+        atoms as possible (and ideally no payloads) move when the document is written."""
+        update_sizes(self.atoms)
+        absorb_size_changes(self.atoms, self)
+
+    def save_in_place(self):
+        """Writes changes back into the file the document was loaded from, overwriting only the byte ranges of atoms
+        that changed. The file must be open for writing; documents loaded from a source (see load_source) can't be
+        saved in place.
+
+        Size changes are first absorbed into neighbouring free/skip atoms (see rebalance_padding). Raises
+        AtomSizeChangedError, before writing anything or changing the document, if that isn't enough to keep every
+        payload in place; use write() to save such changes to a new file instead.
+        """
+        if self.fp is None:
+            raise IOError('A document loaded from a source has no file to save in place; use write() instead.')
+
+        self.fp.seek(0, os.SEEK_END)
+        file_size = self.fp.tell()
+
+        layout = snapshot_layout(self.atoms)
+        patches = []
+        moved = []
+        try:
+            self.rebalance_padding()
+            self.__collect_patches(self.atoms, 0, file_size, patches, moved)
+        except AtomSizeChangedError:
+            restore_layout(layout)
+            raise
+
+        for offset, data in patches:
+            self.fp.seek(offset)
+            self.fp.write(data)
+        self.fp.flush()
+
+        for atom, offset in moved:
+            self.__rebase(atom, offset)
+
+        # Cached payloads may have been overwritten.
+        self.payload_cache.discard(self._payload_owner)
+
+        # The file no longer matches its cache entry, even if its size and modification time stayed the same.
+        if self._parse_cache is not None:
+            self._parse_cache.invalidate(self._identity)
+            identity = identify(self.fp)
+            if identity is not None and identity != self._identity:
+                self._parse_cache.invalidate(identity)
+
+    @property
+    def atoms(self):
+        return self._atoms
+
+    @atoms.setter
+    def atoms(self, value):
+        self._atoms = value if isinstance(value, AtomList) else AtomList(value)
+
+    def find(self, path):
+        """Returns the first atom at path, e.g. 'moov/trak/mdia/mdhd', or None. '*' matches any type."""
+        return find(self.atoms, path)
+
+    def find_all(self, path):
+        """Returns every atom at path, e.g. 'moof/traf/trun', in file order. '*' matches any type."""
+        return find_all(self.atoms, path)
+
+    def _unmap(self):
+        try:
+            self._map.close()
+            return True
+        except BufferError:
+            pass
+
+        # Python 3 won't close a map that views still point into. Drop the document's own atoms, whose parents and
+        # children refer to each other and so are only freed by a collection, and try again.
+        self.atoms = []
+        self._parsed_children = {}
+        gc.collect()
+        try:
+            self._map.close()
+            return True
+        except BufferError:
+            return False
+
+    def close(self):
+        """Releases the memory map, if any, and closes fp if the document opened it. The document can't be used
+        afterwards.
+
+        Returns False if the map is still in use: views the caller holds, from get_data or in mapped atoms, keep it
+        mapped until they are released. Otherwise returns True.
+        """
+        unmapped = True
+        if self._map is not None and hasattr(self._map, 'close'):
+            unmapped = self._unmap()
+        self._map = None
+        self.payload_cache.discard(self._payload_owner)
+
+        if self._owns_fp:
+            self.fp.close()
+        return unmapped
 
     def __repr__(self):
         return str(self.atoms)
 
-def load(fp):
-    return ISOBaseMediaFile(fp)
+def load(fp, mmap=False, eager=False, cache=None, stats=None, block_size=DEFAULT_BLOCK_SIZE, selection=None,
+         payload_cache=None):
+    """Parses fp. Container children are parsed on first access unless eager, which parses (and so validates) the
+    whole tree up front.
+
+    With a cache (see cache.ParseCache), a file on disk that was parsed before is loaded from the cache instead, with its
+    whole tree already parsed; one that wasn't is parsed in full to be stored. With stats (see stats.ParseStats),
+    parsing and writing are measured by atom type.
+
+    Unless mapped, fp is read in aligned blocks of block_size bytes while parsing (see block_reader.BlockReader); None
+    reads it directly.
+
+    With a selection (see selection.Selection), only the selected atoms are parsed, all of them up front; the rest of
+    the file is kept unparsed and written back as it is.
+
+    Payloads loaded by get_data are kept in payload_cache (see payload_cache.PayloadCache), by default a new cache of
+    payload_cache.DEFAULT_MAX_BYTES; pass PayloadCache(0) to keep none, or one cache to several documents to share its
+    budget.
+    """
+    return ISOBaseMediaFile(fp, mmap=mmap, eager=eager, cache=cache, stats=stats, block_size=block_size,
+                            selection=selection, payload_cache=payload_cache)
+
+def load_path(path, eager=False, cache=None, stats=None, selection=None, payload_cache=None):
+    """Opens and memory-maps the file at path. The returned document owns the file and is released by close()."""
+    fp = open(path, 'rb')
+    try:
+        document = ISOBaseMediaFile(fp, mmap=True, eager=eager, cache=cache, stats=stats, selection=selection,
+                                    payload_cache=payload_cache)
+    except Exception:
+        fp.close()
+        raise
+
+    document._owns_fp = True
+    return document
+
+def load_parallel(path, processes=None, threads=False):
+    """Opens the file at path like load_path, then parses the children of every top-level container (for fragmented
+    files, thousands of moof atoms) in a pool of processes, or threads if threads, raising any error in them as eager
+    would. Children parsed in other processes are only unpickled when first accessed."""
+    document = load_path(path)
+    try:
+        parse_containers(document, path, processes=processes, threads=threads)
+    except Exception:
+        document.close()
+        raise
+    return document
+
+def load_source(source, eager=False, stats=None, selection=None, payload_cache=None):
+    """Parses the file read through source, anything with read_at(offset, length) and size() (see source.FileSource).
+    For files in high-latency storage, wrap the source in a source.CachingSource, and close() it once done with the
+    document: neither the document nor close() on it stops the source's prefetch threads."""
+    return ISOBaseMediaFile(None, eager=eager, stats=stats, selection=selection, source=source,
+                            payload_cache=payload_cache)
+
+def faststart(in_fp, out_fp):
+    """Writes in_fp to out_fp with moov moved ahead of the media data, so that playback can start before the whole file
+    has been read. mdat payloads are copied without being loaded. Returns False if moov was already at the front, in
+    which case the file is copied unchanged.
+    """
+    document = ISOBaseMediaFile(in_fp)
+    moved = move_moov_before_mdat(document)
+    document.write(out_fp)
+    return moved
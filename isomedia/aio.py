@@ -0,0 +1,92 @@
+"""asyncio counterparts of the stream parser, for use with asyncio.StreamReader or any object with an async read().
+
+Python 3 only.
+"""
+import asyncio
+
+from isomedia.atom import STANDARD_HEADER_LENGTH, AtomHeader
+from isomedia.exceptions import MalformedIsomFile, ParseLimitExceeded
+from isomedia.stream import DEFAULT_CHUNK_SIZE, DEFAULT_MAX_BUFFER_SIZE, StreamedFile, header_length_needed, \
+    is_payload_type, new_streamed_atom, parse_complete_atom, read_stream_header
+
+async def read_exactly(reader, n):
+    """Reads n bytes from reader, or fewer only if the stream ends first."""
+    readexactly = getattr(reader, 'readexactly', None)
+    if readexactly is not None:
+        try:
+            return await readexactly(n)
+        except asyncio.IncompleteReadError as e:
+            return e.partial
+
+    chunks = []
+    remaining = n
+    while remaining > 0:
+        data = await reader.read(remaining)
+        if not data:
+            break
+        chunks.append(data)
+        remaining -= len(data)
+
+    return b''.join(chunks)
+
+async def read_header(reader):
+    """Reads the next atom header, returning None if the stream ended cleanly before it."""
+    data = await read_exactly(reader, STANDARD_HEADER_LENGTH)
+    if not data:
+        return None, None
+    if len(data) < STANDARD_HEADER_LENGTH:
+        raise MalformedIsomFile
+
+    extension_length = header_length_needed(data) - STANDARD_HEADER_LENGTH
+    if extension_length:
+        extension = await read_exactly(reader, extension_length)
+        if len(extension) < extension_length:
+            raise MalformedIsomFile
+        data += extension
+
+    return data, read_stream_header(data)
+
+async def iter_atoms(reader, max_buffer_size=DEFAULT_MAX_BUFFER_SIZE, stream_payloads=True, on_payload=None,
+                     chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields top-level atoms from reader as each one completes.
+
+    Takes the same options as StreamParser, except that payload atoms (mdat, free, skip) are streamed through rather
+    than buffered by default.
+    """
+    offset = 0
+
+    while True:
+        header_data, header = await read_header(reader)
+        if header is None:
+            return
+
+        atom_type, atom_size, header_length = header
+        remaining = atom_size - header_length
+
+        if stream_payloads and is_payload_type(atom_type):
+            new_atom = new_streamed_atom(AtomHeader(atom_type, atom_size, header_length), offset)
+
+            while remaining > 0:
+                data = await reader.read(min(chunk_size, remaining))
+                if not data:
+                    raise MalformedIsomFile
+                remaining -= len(data)
+
+                if on_payload is not None:
+                    on_payload(new_atom, data)
+        else:
+            if atom_size > max_buffer_size:
+                raise ParseLimitExceeded
+
+            body = await read_exactly(reader, remaining)
+            if len(body) < remaining:
+                raise MalformedIsomFile
+
+            new_atom = parse_complete_atom(header_data + body, offset)
+
+        yield new_atom
+        offset += atom_size
+
+async def aload(reader, **kwargs):
+    """Parses every top-level atom from reader. Takes the same options as iter_atoms."""
+    return StreamedFile([new_atom async for new_atom in iter_atoms(reader, **kwargs)])
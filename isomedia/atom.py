@@ -1,8 +1,13 @@
 from itertools import chain
-import StringIO
+import array
+from io import BytesIO
 import struct
+import sys
 
-from isomedia.exceptions import AtomSpecificationError
+from isomedia.atom_list import AtomList, find, find_all
+from isomedia.compat import type_to_bytes
+from isomedia.exceptions import AtomSpecificationError, MalformedIsomFile
+from isomedia.mapping import make_view
 
 CONTAINER_ATOMS = [
     '----',
@@ -75,6 +80,9 @@ MAX_UINT32 = (2 ** 32) - 1
 STANDARD_HEADER_LENGTH = 8
 EXTENDED_HEADER_LENGTH = 16
 
+# Size of the chunks LazyLoadAtom.iter_data yields.
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
 def interpret_int(data, offset, size):
     assert size in UINT_BYTES_TO_FORMAT
     field = data[offset:offset + size]
@@ -92,111 +100,277 @@ def interpret_int16(data, offset=0):
 def interpret_int8(data, offset=0):
     return interpret_int(data, offset, 1)
 
+def _find_array_typecode(size, typecodes):
+    for typecode in typecodes:
+        try:
+            if array.array(typecode).itemsize == size:
+                return typecode
+        except ValueError:
+            # 'q' and 'Q' only exist from Python 3.3 onwards.
+            continue
+    return None
+
+UINT_BYTES_TO_TYPECODE = dict((size, _find_array_typecode(size, 'BHILQ')) for size in UINT_BYTES_TO_FORMAT)
+INT_BYTES_TO_TYPECODE = dict((size, _find_array_typecode(size, 'bhilq')) for size in UINT_BYTES_TO_FORMAT)
+
+def _array_format(size, count, signed):
+    format_char = UINT_BYTES_TO_FORMAT[size][1]
+    if signed:
+        format_char = format_char.lower()
+    return '>%d%s' % (count, format_char)
+
+def new_int_array(size, values=(), signed=False):
+    """Returns a compact column of integers of the given byte width.
+
+    Falls back to a plain list when the platform's array module has no type of that width (64-bit values on Python 2
+    builds where a C long is 32 bits).
+    """
+    typecode = (INT_BYTES_TO_TYPECODE if signed else UINT_BYTES_TO_TYPECODE)[size]
+    if typecode is None:
+        return list(values)
+    return array.array(typecode, values)
+
+def interpret_int_array(data, size, signed=False, offset=0):
+    """Decodes a run of big-endian integers from data[offset:] with a single bulk unpack."""
+    assert size in UINT_BYTES_TO_FORMAT
+    count = (len(data) - offset) // size
+    typecode = (INT_BYTES_TO_TYPECODE if signed else UINT_BYTES_TO_TYPECODE)[size]
+
+    # data may be a view into a memory map; take a view of the entries rather than slicing out a copy.
+    data = make_view(data, offset, count * size)
+
+    if typecode is None:
+        return list(struct.unpack(_array_format(size, count, signed), data))
+
+    values = array.array(typecode)
+    if hasattr(values, 'frombytes'):
+        values.frombytes(data)
+    else:
+        values.fromstring(data)
+
+    if sys.byteorder == 'little' and size > 1:
+        values.byteswap()
+
+    return values
+
+def write_int_array(values, size, signed=False):
+    typecode = (INT_BYTES_TO_TYPECODE if signed else UINT_BYTES_TO_TYPECODE)[size]
+
+    if typecode is None:
+        return struct.pack(_array_format(size, len(values), signed), *values)
+
+    # Always copy: the caller's column must not be byteswapped underneath it.
+    values = array.array(typecode, values)
+    if sys.byteorder == 'little' and size > 1:
+        values.byteswap()
+
+    if hasattr(values, 'tobytes'):
+        return values.tobytes()
+    return values.tostring()
+
 def write_atom_header(atom):
-    header_bytes = ''
+    header_bytes = b''
 
     if atom.size > MAX_UINT32:
         header_bytes += struct.pack(UINT_BYTES_TO_FORMAT[4], 1)
     else:
         header_bytes += struct.pack(UINT_BYTES_TO_FORMAT[4], atom.size)
-    header_bytes += atom.type
+    header_bytes += type_to_bytes(atom.type)
     if atom.size > MAX_UINT32:
         header_bytes += struct.pack(UINT_BYTES_TO_FORMAT[8], atom.size)
 
     return header_bytes
 
-def interpret_atom(atom_header, atom_body, definition):
-    def cast_field(data, size, cast):
-        if cast == int:
-            data = interpret_int(data, 0, size)
-        return data
+class CompiledDefinition(object):
+    """A field definition compiled into a single struct.Struct for its fixed-size fields.
+
+    A definition is a list of (field_name, field_type) where field_type is one of:
+        (length, int)             an unsigned big-endian integer of length bytes
+        (length, None)            length raw bytes
+        (list, (length, cast), n) n items of either of the above
+        (list, (length, cast), None)
+                                  as many items as fill the rest of the atom body; must be the last field
+    """
+    def __init__(self, definition):
+        self.definition = definition
+        self.trailing = None
+
+        formats = []
+        # (field_name, number of struct values, is a list)
+        self.slots = []
+
+        for index, field in enumerate(definition):
+            field_name, field_type = field
+            length = field_type[0]
+
+            if length == list:
+                (item_length, item_cast), item_count = field_type[1], field_type[2]
+
+                if item_count is None:
+                    assert index == len(definition) - 1, 'A list without a count must be the last field.'
+                    self.trailing = (field_name, item_length, item_cast)
+                    continue
+
+                formats.append(self._field_format(item_length, item_cast) * item_count)
+                self.slots.append((field_name, item_count, True))
+            else:
+                formats.append(self._field_format(length, field_type[1]))
+                self.slots.append((field_name, 1, False))
 
-    result = {}
-    atom_body_length = atom_header.size - atom_header.header_length
+        self.struct = struct.Struct('>' + ''.join(formats))
+        self.size = self.struct.size
 
-    bytes_read = 0
+    @staticmethod
+    def _field_format(length, cast):
+        if cast == int:
+            assert length in UINT_BYTES_TO_FORMAT
+            return UINT_BYTES_TO_FORMAT[length][1]
+        return '%ds' % length
+
+    def unpack(self, atom_header, atom_body):
+        data = atom_body.read(self.size)
+        if len(data) != self.size:
+            raise AtomSpecificationError
+
+        values = self.struct.unpack(data)
+
+        result = {}
+        position = 0
+        for field_name, count, is_list in self.slots:
+            if is_list:
+                result[field_name] = list(values[position:position + count])
+            else:
+                result[field_name] = values[position]
+            position += count
 
-    for field in definition:
-        field_name, field_type = field
-        length = field_type[0]
+        if self.trailing is not None:
+            field_name, item_length, item_cast = self.trailing
+            result[field_name] = self._unpack_trailing(atom_header, atom_body, item_length, item_cast)
 
-        if length == list:
-            item_length, item_cast = field_type[1]
-            item_count = field_type[2]
+        return result
 
-            data = []
-            while (item_count is None and bytes_read < atom_body_length) or len(data) < item_count:
-                item_data = atom_body.read(item_length)
-                bytes_read += len(item_data)
+    def _unpack_trailing(self, atom_header, atom_body, item_length, item_cast):
+        remaining = atom_header.size - atom_header.header_length - self.size
+        if remaining <= 0:
+            return []
 
-                if len(item_data) != item_length:
-                    raise AtomSpecificationError
+        if remaining % item_length != 0:
+            raise AtomSpecificationError
 
-                item_data = cast_field(item_data, item_length, item_cast)
-                data.append(item_data)
+        data = atom_body.read(remaining)
+        if len(data) != remaining:
+            raise AtomSpecificationError
 
-        else:
-            data = atom_body.read(length)
-            bytes_read += len(data)
+        if item_cast == int:
+            return list(interpret_int_array(data, item_length))
 
-            if len(data) != length:
-                raise AtomSpecificationError
+        data = bytes(data)
+        return [data[offset:offset + item_length] for offset in range(0, remaining, item_length)]
 
-            cast = field_type[1]
-            data = cast_field(data, length, cast)
+    def pack(self, properties):
+        values = []
+        for field_name, count, is_list in self.slots:
+            if is_list:
+                values.extend(properties[field_name])
+            else:
+                values.append(properties[field_name])
 
-        result[field_name] = data
+        result = self.struct.pack(*values)
 
-    return result
+        if self.trailing is not None:
+            field_name, item_length, item_cast = self.trailing
+            if item_cast == int:
+                result += write_int_array(properties[field_name], item_length)
+            else:
+                result += b''.join(properties[field_name])
 
-def write_atom(properties, definition):
-    result = ''
+        return result
 
-    for field in definition:
-        field_name, field_type = field
-        field_value = properties[field_name]
+_compiled_definitions = {}
 
-        length = field_type[0]
+def compile_definition(definition):
+    """Returns the CompiledDefinition for definition, compiling it only the first time it is seen."""
+    key = tuple(definition)
 
-        if length == list:
-            item_length, item_cast = field_type[1]
+    compiled = _compiled_definitions.get(key)
+    if compiled is None:
+        compiled = CompiledDefinition(definition)
+        _compiled_definitions[key] = compiled
 
-            for item_value in field_value:
-                if item_cast == int:
-                    result += struct.pack(UINT_BYTES_TO_FORMAT[item_length], item_value)
-                else:
-                    result += item_value
-        else:
-            cast = field_type[1]
-            if cast == int:
-                result += struct.pack(UINT_BYTES_TO_FORMAT[length], field_value)
-            else:
-                result += field_value
+    return compiled
+
+def interpret_atom(atom_header, atom_body, definition):
+    return compile_definition(definition).unpack(atom_header, atom_body)
 
-    return result
+def write_atom(properties, definition):
+    return compile_definition(definition).pack(properties)
 
 class AtomHeader(object):
+    __slots__ = ('type', 'size', 'header_length')
+
     def __init__(self, atom_type, atom_size, header_length):
         self.type = atom_type
         self.size = atom_size
         self.header_length = header_length
 
+class AtomHeaderView(object):
+    """An atom's header fields, read from and written to the atom itself, which keeps them in its own slots."""
+    __slots__ = ('_atom',)
+
+    def __init__(self, atom):
+        self._atom = atom
+
+    @property
+    def type(self):
+        return self._atom.type
+
+    @type.setter
+    def type(self, value):
+        self._atom.type = value
+
+    @property
+    def size(self):
+        return self._atom.size
+
+    @size.setter
+    def size(self, value):
+        self._atom.size = value
+
+    @property
+    def header_length(self):
+        return self._atom.header_length
+
+    @header_length.setter
+    def header_length(self, value):
+        self._atom.header_length = value
+
+# Atom classes use __slots__ so that trees with many thousands of atoms (fragmented files have several per fragment) don't
+# pay for an instance __dict__ per atom. Subclasses must declare __slots__ too, or they get a __dict__ back.
+CONTAINER_SLOTS = ('_children', '_children_range')
+
 class Atom(object):
+    __slots__ = ('_type', 'size', 'header_length', 'document', 'parent_atom', '_input_file_offset', '_input_size',
+                 '_properties')
+
     # Allow lazy-loading (enabled when False)
     LOAD_DATA = True
+    # The body is kept as bytes rather than decoded, so a large one is better left in the file (see ReferencedAtom).
+    OPAQUE = False
 
     def __init__(self, atom_header, atom_body, document, parent_atom, file_offset):
-        self.header = atom_header
+        # The header's fields are kept on the atom itself rather than in a separate AtomHeader.
+        self._type = atom_header.type
+        self.size = atom_header.size
+        self.header_length = atom_header.header_length
 
         self.document = document
         self.parent_atom = parent_atom
 
         self._input_file_offset = file_offset
         self._input_size = atom_header.size
-        self._body_offset = atom_header.header_length
 
-        self._definition = {}
-        self.properties = {}
+        # Most atoms in a large tree (containers, unknown and lazy atoms) never have properties.
+        self._properties = None
 
     def to_bytes(self):
         return write_atom_header(self)
@@ -206,50 +380,112 @@ class Atom(object):
             'type': self.type
         })
 
+    @property
+    def properties(self):
+        if self._properties is None:
+            self._properties = {}
+        return self._properties
+
+    @properties.setter
+    def properties(self, value):
+        self._properties = value
+
+    @property
+    def header(self):
+        return AtomHeaderView(self)
+
+    @header.setter
+    def header(self, value):
+        self.type = value.type
+        self.size = value.size
+        self.header_length = value.header_length
+
     @property
     def type(self):
-        return self.header.type
+        return self._type
 
     @type.setter
     def type(self, value):
         assert isinstance(value, str), 'A box\'s type field should be a string.'
         assert len(value) == 4, 'A box\'s type should be 4 bytes exactly.'
-        self.header.type = value
+        self._type = value
+
+        # Keep the siblings' index by type up to date.
+        if self.parent_atom is not None:
+            siblings = self.parent_atom._children
+        else:
+            siblings = getattr(self.document, 'atoms', None)
+        if isinstance(siblings, AtomList):
+            siblings.changed()
 
     @property
-    def size(self):
-        return self.header.size
+    def _body_offset(self):
+        return self.header_length
 
-    @size.setter
-    def size(self, value):
-        self.header.size = value
+FULL_ATOM_DEFINITION = [
+    ('version', (1, int)),
+    ('flags', (3, None))
+]
 
 class FullAtom(Atom):
+    __slots__ = ()
+
     def __init__(self, atom_header, atom_body, document, parent_atom, file_offset):
         super(FullAtom, self).__init__(atom_header, atom_body, document, parent_atom, file_offset)
-
-        definition = [
-            ('version', (1, int)),
-            ('flags', (3, None))
-        ]
-
-        self.properties.update(interpret_atom(atom_header, atom_body, definition))
-        self._definition['FullAtom'] = definition
+        self.properties.update(interpret_atom(atom_header, atom_body, FULL_ATOM_DEFINITION))
 
     def to_bytes(self):
         written = super(FullAtom, self).to_bytes()
-        return ''.join([written, write_atom(self.properties, self._definition['FullAtom'])])
+        return b''.join([written, write_atom(self.properties, FULL_ATOM_DEFINITION)])
 
 class ContainerMixin(object):
+    # Slots for the children live on the concrete classes (see CONTAINER_SLOTS): two bases that both add slots can't
+    # be combined.
+    __slots__ = ()
+
     def __init__(self, atom_header, atom_body, document, parent_atom, file_offset):
         super(ContainerMixin, self).__init__(atom_header, atom_body, document, parent_atom, file_offset)
-        self.children = []
+        self._children = AtomList()
+        self._children_range = None
+
+    def defer_children(self, offset, length):
+        """Records where this atom's children live in the file so they are only parsed when first accessed."""
+        self._children = None
+        self._children_range = (offset, length)
+
+    def children_loaded(self):
+        return self._children is not None
+
+    @property
+    def children(self):
+        if self._children is None:
+            offset, length = self._children_range
+            self._children = self.document.parse_children(offset, length, parent=self)
+        return self._children
+
+    @children.setter
+    def children(self, value):
+        self._children = value if isinstance(value, AtomList) else AtomList(value)
+
+    def find(self, path):
+        """Returns the first descendant at path, e.g. 'trak/mdia/mdhd', or None. See atom_list.iter_path."""
+        return find(self.children, path)
+
+    def find_all(self, path):
+        """Returns every descendant at path. See atom_list.iter_path."""
+        return find_all(self.children, path)
+
+    def fields_to_bytes(self):
+        """Serializes the atom's header and own fields, without its children."""
+        return super(ContainerMixin, self).to_bytes()
 
     def to_bytes(self):
-        written = super(ContainerMixin, self).to_bytes()
-        return ''.join(chain([written], (child.to_bytes() for child in self.children)))
+        written = self.fields_to_bytes()
+        return b''.join(chain([written], (child.to_bytes() for child in self.children)))
 
 class ContainerAtom(ContainerMixin, Atom):
+    __slots__ = CONTAINER_SLOTS
+
     def __init__(self, atom_header, atom_body, document, parent_atom, file_offset):
         super(ContainerAtom, self).__init__(atom_header, atom_body, document, parent_atom, file_offset)
 
@@ -260,6 +496,10 @@ class ContainerAtom(ContainerMixin, Atom):
         })
 
 class GenericAtom(Atom):
+    __slots__ = ('_data',)
+
+    OPAQUE = True
+
     def __init__(self, atom_header, atom_body, document, parent_atom, file_offset):
         super(GenericAtom, self).__init__(atom_header, atom_body, document, parent_atom, file_offset)
         self._data = atom_body.read()
@@ -269,26 +509,64 @@ class GenericAtom(Atom):
 
     def to_bytes(self):
         written = super(GenericAtom, self).to_bytes()
-        return ''.join([written, self.get_data()])
+        return b''.join([written, bytes(self.get_data())])
 
 class LazyLoadAtom(Atom):
-    LOAD_DATA = False
+    """An atom whose payload is left in the file and only read on demand.
 
-    def __init__(self, atom_header, atom_body, document, parent_atom, file_offset):
-        super(LazyLoadAtom, self).__init__(atom_header, atom_body, document, parent_atom, file_offset)
-        self._data = None
+    get_data loads the whole payload through the document's payload cache, which keeps it only within the cache's byte
+    budget; read_range, readinto and iter_data read parts of it without caching anything.
+    """
+    __slots__ = ()
 
-    def get_data(self):
-        if self._data is None:
-            fp = self.document.fp
-            fp.seek(self._input_file_offset + self._body_offset)
-            self._data = fp.read(self._input_size - self._body_offset)
+    LOAD_DATA = False
 
-        return self._data
+    def get_data(self):
+        return self.document.read_payload(self._input_file_offset + self._body_offset,
+                                          self._input_size - self._body_offset)
+
+    def _clamp(self, offset, length):
+        """Clamps a range of the payload to the payload, returning its offset and length."""
+        payload_length = self._input_size - self._body_offset
+        offset = min(max(offset, 0), payload_length)
+        return offset, max(0, min(length, payload_length - offset))
+
+    def read_range(self, offset, length):
+        """Returns up to length bytes of the payload starting offset bytes into it, without loading the rest.
+
+        The file is read at the offset rather than from a shared position, so several threads can read payloads of the
+        same document at once.
+        """
+        offset, length = self._clamp(offset, length)
+        return self.document.read_range(self._input_file_offset + self._body_offset + offset, length)
+
+    def readinto(self, buffer_data, offset=0):
+        """Fills buffer_data with the payload from offset bytes into it, returning the number of bytes read: fewer than
+        the buffer's length only at the end of the payload. Safe to call from several threads, like read_range."""
+        target = memoryview(buffer_data)
+        offset, length = self._clamp(offset, len(target))
+        return self.document.readinto(self._input_file_offset + self._body_offset + offset, target[:length])
+
+    def iter_data(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Yields the payload in chunks of up to chunk_size bytes, holding no more than one in memory."""
+        payload_length = self._input_size - self._body_offset
+        offset = 0
+        while offset < payload_length:
+            chunk = self.read_range(offset, chunk_size)
+            if len(chunk) != min(chunk_size, payload_length - offset):
+                raise MalformedIsomFile
+            yield chunk
+            offset += len(chunk)
 
     def to_bytes(self):
         written = super(LazyLoadAtom, self).to_bytes()
-        return ''.join([written, self.get_data()])
+        return b''.join([written, bytes(self.get_data())])
+
+class ReferencedAtom(LazyLoadAtom):
+    """An atom with an opaque body (an unknown type, a uuid, or one that didn't match its definition) too large to read
+    into memory while parsing. Like any lazily loaded atom, its body stays in the file and is written back by range
+    copy."""
+    __slots__ = ()
 
 def create_atom(atom_type, atom_body):
     body_length = len(atom_body)
@@ -299,7 +577,7 @@ def create_atom(atom_type, atom_body):
 
     atom_size = header_length + body_length
     atom_header = AtomHeader(None, atom_size, header_length)
-    atom = GenericAtom(atom_header, StringIO.StringIO(atom_body), None, None, None)
+    atom = GenericAtom(atom_header, BytesIO(atom_body), None, None, None)
     atom.type = atom_type
 
     return atom
@@ -0,0 +1,81 @@
+WILDCARD = '*'
+
+class AtomList(list):
+    """A list of sibling atoms that can also look them up by type.
+
+    The index by type is built on the first lookup and dropped whenever the list is changed, so lookups stay correct
+    however the list is edited.
+    """
+    __slots__ = ('_by_type',)
+
+    def __init__(self, atoms=()):
+        super(AtomList, self).__init__(atoms)
+        self._by_type = None
+
+    def changed(self):
+        self._by_type = None
+
+    def __reduce__(self):
+        # Pickled as a plain list: the index is rebuilt on demand anyway.
+        return (AtomList, (list(self),))
+
+    def of_type(self, atom_type):
+        """Returns the atoms of the given type, in order."""
+        if self._by_type is None:
+            by_type = {}
+            for atom in self:
+                by_type.setdefault(atom.type, []).append(atom)
+            self._by_type = by_type
+
+        return self._by_type.get(atom_type, [])
+
+def _invalidating(name):
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        self._by_type = None
+        return method(self, *args, **kwargs)
+
+    wrapper.__name__ = name
+    return wrapper
+
+for _name in ['__setitem__', '__delitem__', '__setslice__', '__delslice__', '__iadd__', '__imul__', 'append', 'clear',
+              'extend', 'insert', 'pop', 'remove', 'reverse', 'sort']:
+    # The slice methods only exist on Python 2, and clear only on Python 3.
+    if hasattr(list, _name):
+        setattr(AtomList, _name, _invalidating(_name))
+
+def _iter_path(atoms, components):
+    atom_type = components[0]
+    matches = atoms if atom_type == WILDCARD else atoms.of_type(atom_type)
+
+    for atom in matches:
+        if len(components) == 1:
+            yield atom
+            continue
+
+        children = getattr(atom, 'children', None)
+        if children is not None:
+            for match in _iter_path(children, components[1:]):
+                yield match
+
+def iter_path(atoms, path):
+    """Yields the atoms at path below atoms, in file order. A path is a '/'-separated list of atom types, e.g.
+    'moov/trak/mdia/mdhd', in which '*' matches an atom of any type.
+
+    Deferred children are only parsed for the atoms along the path.
+    """
+    components = [component for component in path.split('/') if component]
+    if not components:
+        return iter([])
+    return _iter_path(atoms, components)
+
+def find(atoms, path):
+    """Returns the first atom at path below atoms (see iter_path), or None."""
+    for atom in iter_path(atoms, path):
+        return atom
+    return None
+
+def find_all(atoms, path):
+    """Returns every atom at path below atoms (see iter_path)."""
+    return list(iter_path(atoms, path))
@@ -0,0 +1,190 @@
+"""Inspects many files at once across a pool of worker processes, reporting a summary of each as a JSON line."""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import isomedia
+from isomedia.compat import PY3, type_from_bytes
+from isomedia.isom_atoms import FtypAtom, MvhdAtom, Stz2Atom, StszAtom
+from isomedia.sample_index import find_child, find_sample_table
+
+# Tasks handed to the pool, per worker process, before waiting for results. Bounds memory however many files there are.
+PENDING_PER_PROCESS = 4
+# Seconds to wait for a result before checking whether a worker died.
+POLL_INTERVAL = 1.0
+
+def iter_paths(paths):
+    """Yields each path in paths, replacing directories by every file beneath them."""
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, subdirectories, filenames in os.walk(path):
+                subdirectories.sort()
+                for filename in sorted(filenames):
+                    yield os.path.join(directory, filename)
+        else:
+            yield path
+
+def summarize_tracks(moov):
+    tracks = []
+
+    for trak in [atom for atom in moov.children if atom.type == 'trak']:
+        stbl = find_sample_table(trak)
+        stsz = find_child(stbl, 'stsz') or find_child(stbl, 'stz2')
+
+        sample_count = None
+        if isinstance(stsz, (StszAtom, Stz2Atom)):
+            sample_count = stsz.properties['sample_count']
+        tracks.append({'sample_count': sample_count})
+
+    return tracks
+
+def summarize_document(isofile):
+    summary = {
+        'layout': [[atom.type, atom._input_file_offset, atom.size] for atom in isofile.atoms]
+    }
+
+    for atom in isofile.atoms:
+        if isinstance(atom, FtypAtom):
+            summary['major_brand'] = type_from_bytes(atom.properties['major_brand'])
+            summary['compatible_brands'] = [type_from_bytes(brand) for brand in atom.properties['compatible_brands']]
+        elif atom.type == 'moov':
+            mvhd = find_child(atom, 'mvhd')
+            if isinstance(mvhd, MvhdAtom):
+                summary['timescale'] = mvhd.properties['timescale']
+                summary['duration'] = mvhd.properties['duration']
+            summary['tracks'] = summarize_tracks(atom)
+
+    return summary
+
+def error_summary(path, error_type, message):
+    return {'path': path, 'error': {'type': error_type, 'message': message}}
+
+def summarize(path):
+    """Returns a JSON-serializable summary of the file at path. Errors are reported in the summary, not raised."""
+    summary = {'path': path}
+
+    try:
+        isofile = isomedia.load_path(path)
+        try:
+            summary.update(summarize_document(isofile))
+        finally:
+            isofile.close()
+    except Exception as e:
+        summary = error_summary(path, type(e).__name__, str(e))
+
+    return summary
+
+def summarize_task(path):
+    """Runs summarize in a worker process, reporting even the errors it lets escape: on Python 2 the pool can't tell the
+    caller that a task raised, and its result would never arrive."""
+    try:
+        return summarize(path)
+    except BaseException as e:
+        return error_summary(path, type(e).__name__, str(e))
+
+class WorkerWatch(object):
+    """Counts the workers of pool that died. The pool replaces them, but the task each was running is lost: its result
+    never arrives.
+
+    Only the pool's own processes are watched (Pool keeps them in _pool), not other children of this process.
+    """
+    def __init__(self, pool):
+        self.pool = pool
+        self.workers = set()
+        self.died = 0
+        self.check()
+
+    def check(self):
+        # Take the pool's current workers first: the pool drops dead ones from its list once it has replaced them.
+        self.workers.update(self.pool._pool)
+        exited = set(worker for worker in self.workers if worker.exitcode is not None)
+        self.died += len(exited)
+        self.workers -= exited
+
+def inspect_files(paths, processes=None):
+    """Yields a summary (see summarize) of every file in paths, in the order they finish, parsing them in a pool of
+    processes (one per CPU by default). Directories in paths are walked recursively.
+    """
+    processes = processes or multiprocessing.cpu_count()
+    max_pending = processes * PENDING_PER_PROCESS
+
+    pool = multiprocessing.Pool(processes)
+    watch = WorkerWatch(pool)
+    # (task, summary) of every finished task, and the path of every task not finished yet, by task.
+    results = queue.Queue()
+    pending = {}
+
+    def submit(task, path):
+        def finished(summary):
+            results.put((task, summary))
+
+        def failed(e):
+            # Errors in sending the result back.
+            results.put((task, error_summary(path, type(e).__name__, str(e))))
+
+        options = {'error_callback': failed} if PY3 else {}
+        pool.apply_async(summarize_task, (path,), callback=finished, **options)
+        pending[task] = path
+
+    def collect():
+        """Returns the next summaries to report: the next finished task's, or once every pending task must have been
+        lost with a worker that died, an error for each of them."""
+        while True:
+            try:
+                task, summary = results.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                watch.check()
+                if pending and len(pending) <= watch.died:
+                    lost = [error_summary(path, 'WorkerDied', 'The worker process inspecting the file died.')
+                            for path in pending.values()]
+                    watch.died -= len(pending)
+                    pending.clear()
+                    return lost
+                continue
+
+            del pending[task]
+            return [summary]
+
+    try:
+        for task, path in enumerate(iter_paths(paths)):
+            submit(task, path)
+
+            while len(pending) >= max_pending:
+                for summary in collect():
+                    yield summary
+
+        while pending:
+            for summary in collect():
+                yield summary
+    finally:
+        pool.terminate()
+        pool.join()
+
+def main(argv=None, stdin=None, stdout=None):
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+
+    parser = argparse.ArgumentParser(description='Summarizes ISO base media files as JSON lines.')
+    parser.add_argument('paths', nargs='*', help='files, or directories to search for files')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='worker processes to use (default: one per CPU)')
+    parser.add_argument('--stdin', action='store_true', help='also read paths from standard input, one per line')
+    args = parser.parse_args(argv)
+
+    paths = args.paths
+    if args.stdin:
+        paths = list(paths) + [line.rstrip('\n') for line in stdin if line.strip()]
+
+    for summary in inspect_files(paths, processes=args.processes):
+        stdout.write(json.dumps(summary, sort_keys=True) + '\n')
+        stdout.flush()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import os
+
+DEFAULT_BLOCK_SIZE = 64 * 1024
+
+class BlockReader(object):
+    """A read-only file-like object that reads fp in aligned blocks of block_size bytes, so that the many small reads of
+    parsing (headers and fields) are served from memory.
+
+    Seeking only moves the position: fp itself is sought when the next block is fetched, so skipping over a payload
+    costs at most one seek. Reads of a block or more go straight to fp.
+    """
+    def __init__(self, fp, block_size=DEFAULT_BLOCK_SIZE):
+        self._fp = fp
+        self.block_size = block_size
+        self._block = b''
+        self._block_start = 0
+        self._position = fp.tell()
+
+    def _fetch(self, offset, length):
+        self._fp.seek(offset)
+        return self._fp.read(length)
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            self._fp.seek(self._position)
+            data = self._fp.read()
+            self._position += len(data)
+            return data
+
+        start = self._position - self._block_start
+        if start >= 0 and start + n <= len(self._block):
+            data = self._block[start:start + n]
+        elif n >= self.block_size:
+            data = self._fetch(self._position, n)
+        else:
+            block_start = self._position - self._position % self.block_size
+            blocks = (self._position + n - block_start + self.block_size - 1) // self.block_size
+
+            self._block = self._fetch(block_start, blocks * self.block_size)
+            self._block_start = block_start
+
+            start = self._position - block_start
+            data = self._block[start:start + n]
+
+        self._position += len(data)
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            self._fp.seek(offset, os.SEEK_END)
+            offset = self._fp.tell()
+
+        self._position = offset
+        return self._position
+
+    def tell(self):
+        return self._position
@@ -0,0 +1,208 @@
+"""An on-disk cache of parsed files, so that reopening a file doesn't have to parse it again.
+
+An entry records a file's whole atom tree, decoded: every container's children are parsed before the tree is stored, so
+a document loaded from an entry has nothing left to parse and only reads payloads from the file, on demand. Entries are
+keyed by the file's path, size, modification time and inode, so a changed file simply misses. An edit that keeps the
+size may not move a coarse modification time, so save_in_place discards the entry of the file it writes to.
+"""
+from io import BytesIO
+import hashlib
+import os
+import struct
+import tempfile
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from isomedia.atom import ContainerMixin
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+ENTRY_SUFFIX = '.isoc'
+ENTRY_MAGIC = b'ISOC'
+ENTRY_VERSION = 2
+
+# magic, version, file size, mtime (ns), inode, device; followed by the pickled atom tree
+ENTRY_HEADER = struct.Struct('>4sBQqQQ')
+
+# Payloads of a mapped file are views into the map, which can't be pickled. They are stored as bytes instead.
+try:
+    VIEW_TYPES = (memoryview, buffer)
+except NameError:
+    VIEW_TYPES = (memoryview,)
+
+class FileIdentity(object):
+    """What a cache entry is keyed by. Any change to the file changes at least its size or modification time."""
+    __slots__ = ('path', 'size', 'mtime', 'inode', 'device')
+
+    def __init__(self, path, size, mtime, inode, device):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.inode = inode
+        self.device = device
+
+    def key(self):
+        return (self.size, self.mtime, self.inode, self.device)
+
+    def __eq__(self, other):
+        return self.path == other.path and self.key() == other.key()
+
+    def __ne__(self, other):
+        return not self == other
+
+def identify(fp):
+    """Returns the FileIdentity of the open file fp, or None if it isn't a file on disk."""
+    try:
+        path = os.path.abspath(fp.name)
+        stat = os.fstat(fp.fileno())
+    except (AttributeError, EnvironmentError, TypeError, ValueError):
+        return None
+
+    mtime = getattr(stat, 'st_mtime_ns', None)
+    if mtime is None:
+        mtime = int(stat.st_mtime * 1000000000)
+
+    return FileIdentity(path, stat.st_size, mtime, stat.st_ino, stat.st_dev)
+
+def load_tree(atoms):
+    """Parses the children of every container in atoms, and theirs, so that nothing is left deferred."""
+    for atom in atoms:
+        if isinstance(atom, ContainerMixin):
+            load_tree(atom.children)
+
+class CacheEntry(object):
+    def __init__(self, data, offset):
+        # The pickled atom tree, at offset in data.
+        self.data = data
+        self.offset = offset
+
+    def build_atoms(self, document):
+        """Returns the document's top-level atoms, with every descendant already parsed, or None if the tree can't be
+        loaded (such as one pickled by another version of Python)."""
+        def load_reference(reference):
+            if reference == 'document':
+                return document
+            return reference[1]
+
+        input_data = BytesIO(self.data)
+        input_data.seek(self.offset)
+        unpickler = pickle.Unpickler(input_data)
+        unpickler.persistent_load = load_reference
+
+        try:
+            return unpickler.load()
+        except Exception:
+            return None
+
+def encode_entry(identity, document):
+    """Encodes the document's atom tree, parsing whatever it hasn't parsed yet."""
+    load_tree(document.atoms)
+
+    def reference(obj):
+        # The document is the one the tree is loaded into.
+        if obj is document:
+            return 'document'
+        if isinstance(obj, VIEW_TYPES):
+            return ('data', bytes(obj))
+        return None
+
+    output = BytesIO()
+    output.write(ENTRY_HEADER.pack(ENTRY_MAGIC, ENTRY_VERSION, identity.size, identity.mtime, identity.inode,
+                                   identity.device))
+    pickler = pickle.Pickler(output, pickle.HIGHEST_PROTOCOL)
+    pickler.persistent_id = reference
+    pickler.dump(document.atoms)
+    return output.getvalue()
+
+def decode_entry(identity, data):
+    """Returns the CacheEntry encoded in data, or None if it is damaged or belongs to a different version of the file."""
+    if len(data) < ENTRY_HEADER.size:
+        return None
+
+    magic, version, size, mtime, inode, device = ENTRY_HEADER.unpack_from(data, 0)
+    if magic != ENTRY_MAGIC or version != ENTRY_VERSION or (size, mtime, inode, device) != identity.key():
+        return None
+
+    return CacheEntry(data, ENTRY_HEADER.size)
+
+class ParseCache(object):
+    """A directory of cache entries, evicting the least recently used once they total more than max_size bytes.
+
+    Entries are written atomically, so any number of processes can share one directory.
+    """
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def entry_path(self, identity):
+        name = repr((identity.path,) + identity.key()).encode('utf-8')
+        return os.path.join(self.directory, hashlib.sha1(name).hexdigest() + ENTRY_SUFFIX)
+
+    def lookup(self, identity):
+        """Returns the CacheEntry for the file with the given identity, or None."""
+        entry_path = self.entry_path(identity)
+
+        try:
+            with open(entry_path, 'rb') as entry_fp:
+                data = entry_fp.read()
+            # Reading doesn't reliably update access times, so entries are ordered by modification time instead.
+            os.utime(entry_path, None)
+        except EnvironmentError:
+            return None
+
+        entry = decode_entry(identity, data)
+        if entry is None:
+            self.discard(entry_path)
+        return entry
+
+    def invalidate(self, identity):
+        """Discards the entry of the file with the given identity, if there is one."""
+        self.discard(self.entry_path(identity))
+
+    def store(self, identity, document):
+        """Records document, freshly parsed from the file with the given identity, then evicts old entries."""
+        data = encode_entry(identity, document)
+        if len(data) > self.max_size:
+            return
+
+        handle, temporary_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(handle, 'wb') as entry_fp:
+                entry_fp.write(data)
+            os.rename(temporary_path, self.entry_path(identity))
+        except EnvironmentError:
+            self.discard(temporary_path)
+            raise
+
+        self.evict()
+
+    def discard(self, entry_path):
+        try:
+            os.remove(entry_path)
+        except EnvironmentError:
+            pass
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(ENTRY_SUFFIX):
+                entry_path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(entry_path)
+                except EnvironmentError:
+                    # Evicted by another process.
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry_path))
+
+        total_size = sum(entry[1] for entry in entries)
+        for mtime, size, entry_path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            self.discard(entry_path)
+            total_size -= size
@@ -0,0 +1,27 @@
+import sys
+
+try:
+    from itertools import accumulate
+except ImportError:
+    def accumulate(iterable):
+        total = None
+        for value in iterable:
+            total = value if total is None else total + value
+            yield total
+
+PY3 = sys.version_info[0] >= 3
+
+# Atom types are native strings on both Python 2 and 3. On Python 3 they are decoded from the file as latin-1 so that
+# every byte value (such as the 0xa9 that begins iTunes metadata types) maps to one character and back again.
+if PY3:
+    def type_from_bytes(data):
+        return bytes(data).decode('latin-1')
+
+    def type_to_bytes(atom_type):
+        return atom_type.encode('latin-1')
+else:
+    def type_from_bytes(data):
+        return bytes(data)
+
+    def type_to_bytes(atom_type):
+        return atom_type
@@ -3,3 +3,9 @@ class MalformedIsomFile(Exception):
 
 class AtomSpecificationError(Exception):
     pass
+
+class AtomSizeChangedError(Exception):
+    pass
+
+class ParseLimitExceeded(Exception):
+    pass
@@ -0,0 +1,150 @@
+import array
+from bisect import bisect_left, bisect_right
+from functools import partial
+from io import BytesIO
+from operator import add
+import struct
+
+from isomedia.atom import FULL_ATOM_DEFINITION, MAX_UINT32, STANDARD_HEADER_LENGTH, UINT_BYTES_TO_FORMAT, \
+    write_atom, write_int_array
+from isomedia.exceptions import MalformedIsomFile
+from isomedia.isom_atoms import Co64Atom, StcoAtom
+from isomedia.parser import parse_atom
+from isomedia.sample_index import find_sample_table
+
+class OffsetMap(object):
+    """Maps file offsets in the input to file offsets in the output, given where each top-level atom moved to."""
+    def __init__(self, old_starts, shifts):
+        self.old_starts = old_starts
+        self.shifts = shifts
+
+    def region(self, offset):
+        return max(0, bisect_right(self.old_starts, offset) - 1)
+
+    def shift_ranges(self, offsets):
+        """Splits offsets into contiguous ranges that each move by a single shift, as [start, stop, shift]."""
+        if not offsets:
+            return []
+
+        # Chunk offsets nearly always all point into the same mdat, in which case a single shift applies to all of them.
+        first_region = self.region(min(offsets))
+        if first_region == self.region(max(offsets)):
+            return [[0, len(offsets), self.shifts[first_region]]]
+
+        if list(offsets) == sorted(offsets):
+            # Each region's offsets are a slice of the table, found by bisecting at the region's bounds.
+            bounds = [0] + [bisect_left(offsets, start) for start in self.old_starts[1:]] + [len(offsets)]
+            return [[start, stop, shift] for start, stop, shift in zip(bounds, bounds[1:], self.shifts) if start < stop]
+
+        ranges = []
+        for index, offset in enumerate(offsets):
+            shift = self.shifts[self.region(offset)]
+            if ranges and ranges[-1][2] == shift:
+                ranges[-1][1] = index + 1
+            else:
+                ranges.append([index, index + 1, shift])
+        return ranges
+
+    def max_shifted(self, offsets):
+        return max([max(offsets[start:stop]) + shift for start, stop, shift in self.shift_ranges(offsets)] or [0])
+
+    def shift_offsets(self, offsets):
+        """Shifts a column of offsets in place, one range at a time."""
+        for start, stop, shift in self.shift_ranges(offsets):
+            if shift:
+                shifted = map(partial(add, shift), offsets[start:stop])
+                if isinstance(offsets, array.array):
+                    offsets[start:stop] = array.array(offsets.typecode, shifted)
+                else:
+                    offsets[start:stop] = list(shifted)
+
+def chunk_offset_tables(moov):
+    tables = []
+
+    for trak in [atom for atom in moov.children if atom.type == 'trak']:
+        stbl = find_sample_table(trak)
+
+        for table in stbl.children:
+            if table.type in ('stco', 'co64'):
+                # A table that fell back to a GenericAtom can't be rewritten.
+                if not isinstance(table, (StcoAtom, Co64Atom)):
+                    raise MalformedIsomFile
+                tables.append(table)
+
+    return tables
+
+def promote_to_co64(stco):
+    """Replaces an stco atom in its parent with an equivalent co64 atom and returns the co64 atom."""
+    offsets = stco.properties['chunk_offset']
+    body = b''.join([
+        write_atom(stco.properties, FULL_ATOM_DEFINITION),
+        write_atom({'entry_count': len(offsets)}, [('entry_count', (4, int))]),
+        write_int_array(offsets, 8)
+    ])
+
+    atom_bytes = struct.pack(UINT_BYTES_TO_FORMAT[4], STANDARD_HEADER_LENGTH + len(body)) + b'co64' + body
+
+    stbl = stco.parent_atom
+    co64, _ = parse_atom(BytesIO(atom_bytes), None, document=stco.document, parent=stbl)
+    stbl.children[stbl.children.index(stco)] = co64
+
+    # Every ancestor grows by as much as the table did.
+    delta = co64.size - stco.size
+    ancestor = stbl
+    while ancestor is not None:
+        ancestor.size += delta
+        ancestor = ancestor.parent_atom
+
+    return co64
+
+def top_level_layout(atoms):
+    starts = []
+    offset = 0
+    for atom in atoms:
+        starts.append(offset)
+        offset += atom.size
+    return starts
+
+def move_moov_before_mdat(document):
+    """Reorders the document's top-level atoms so that moov comes before the first mdat and rewrites every chunk offset
+    to match, promoting stco tables to co64 where the shifted offsets no longer fit in 32 bits.
+
+    Returns False, leaving the document untouched, if moov already precedes all mdat atoms.
+    """
+    atoms = document.atoms
+    atom_types = [atom.type for atom in atoms]
+
+    if 'moov' not in atom_types:
+        raise MalformedIsomFile
+    if 'mdat' not in atom_types or atom_types.index('moov') < atom_types.index('mdat'):
+        return False
+
+    moov = atoms[atom_types.index('moov')]
+    new_atoms = [atom for atom in atoms if atom is not moov]
+    new_atoms.insert(atom_types.index('mdat'), moov)
+
+    tables = chunk_offset_tables(moov)
+
+    while True:
+        new_start_by_atom = dict((id(atom), start) for atom, start in zip(new_atoms, top_level_layout(new_atoms)))
+        offset_map = OffsetMap([atom._input_file_offset for atom in atoms],
+                               [new_start_by_atom[id(atom)] - atom._input_file_offset for atom in atoms])
+
+        promoted = False
+
+        # Offsets are only rewritten once the layout is settled, so a promoted table starts from the input's offsets.
+        for index, table in enumerate(tables):
+            if table.type == 'stco' and offset_map.max_shifted(table.properties['chunk_offset']) > MAX_UINT32:
+                tables[index] = promote_to_co64(table)
+                promoted = True
+                break
+
+        # Promotion grows moov, which moves everything after it again.
+        if not promoted:
+            break
+
+    for table in tables:
+        offset_map.shift_offsets(table.properties['chunk_offset'])
+
+    document.atoms = new_atoms
+    return True
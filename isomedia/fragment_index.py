@@ -0,0 +1,232 @@
+from bisect import bisect_right
+from io import BytesIO
+import struct
+
+from isomedia.atom import new_int_array
+from isomedia.exceptions import MalformedIsomFile
+from isomedia.isom_atoms import MfroAtom, SidxAtom, TfdtAtom, TfhdAtom, TfraAtom, TrunAtom
+from isomedia.parser import parse_atom
+
+# An mfro box is always a full box with a single 32 bit field.
+MFRO_SIZE = 16
+
+class FragmentIndex(object):
+    """Maps presentation time to the file offset of the fragment holding it, for one track of a fragmented file.
+
+    times are the start times of the fragments, in the track's timescale, and offsets where they start in the file: a
+    moof, or for an index built from sidx, the first byte of a subsegment. built_from is 'mfra', 'sidx' or 'moof'.
+
+    timescale is the number of time units per second, or None if the track's mdhd couldn't be read. An index built from
+    sidx without the track's timescale is left in the sidx's own timescale.
+    """
+    def __init__(self, track_ID, times, offsets, built_from, timescale=None):
+        self.track_ID = track_ID
+        self.times = times
+        self.offsets = offsets
+        self.built_from = built_from
+        self.timescale = timescale
+
+    def __len__(self):
+        return len(self.times)
+
+    def __repr__(self):
+        return str({
+            'track_ID': self.track_ID,
+            'fragments': len(self),
+            'built_from': self.built_from,
+            'timescale': self.timescale
+        })
+
+    def fragment_at(self, time):
+        """Returns the index of the fragment playing at time: the last one starting at or before it. Raises IndexError
+        if time is before the first fragment."""
+        fragment = bisect_right(self.times, time) - 1
+        if fragment < 0:
+            raise IndexError(time)
+        return fragment
+
+    def offset_at(self, time):
+        """Returns the file offset to start reading from to play from time."""
+        return self.offsets[self.fragment_at(time)]
+
+def read_mfra(document):
+    """Returns the document's mfra atom, located through the mfro box at the end of the file without walking the rest of
+    the file, or None if the file doesn't end with one."""
+    for atom in document.atoms.of_type('mfra'):
+        return atom
+
+    file_size = document.source.size()
+    if file_size < MFRO_SIZE:
+        return None
+
+    try:
+        mfro, _ = parse_atom(BytesIO(bytes(document.read_range(file_size - MFRO_SIZE, MFRO_SIZE))),
+                             file_size - MFRO_SIZE, document=document)
+        if not isinstance(mfro, MfroAtom) or not MFRO_SIZE <= mfro.properties['size'] <= file_size:
+            return None
+
+        mfra_offset = file_size - mfro.properties['size']
+        data = bytes(document.read_range(mfra_offset, mfro.properties['size']))
+        mfra, _ = parse_atom(BytesIO(data), mfra_offset, document=document)
+    except MalformedIsomFile:
+        return None
+
+    if mfra.type != 'mfra' or mfra.size != len(data):
+        return None
+    return mfra
+
+def full_box_body(atom):
+    """Returns the body of a full box whether or not its type is decoded, with its version."""
+    data = atom.to_bytes()[atom.header_length:]
+    if len(data) < 4:
+        raise MalformedIsomFile
+    return bytearray(data)[0], data
+
+def track_timescale(document, track_ID):
+    """Returns the timescale of the track with track_ID, from its mdhd, or None if it can't be found."""
+    for trak in document.find_all('moov/trak'):
+        tkhd = trak.find('tkhd')
+        mdhd = trak.find('mdia/mdhd')
+        if tkhd is None or mdhd is None:
+            continue
+
+        try:
+            # Both come after creation and modification times, of 32 bits in version 0 and 64 bits in version 1.
+            version, data = full_box_body(tkhd)
+            if struct.unpack_from('>I', data, 20 if version == 1 else 12)[0] != track_ID:
+                continue
+            version, data = full_box_body(mdhd)
+            return struct.unpack_from('>I', data, 20 if version == 1 else 12)[0]
+        except (MalformedIsomFile, struct.error):
+            return None
+
+    return None
+
+def index_from_tfra(tfra, timescale=None):
+    return FragmentIndex(tfra.properties['track_ID'], tfra.properties['time'], tfra.properties['moof_offset'], 'mfra',
+                         timescale)
+
+def index_from_sidx(sidx_atoms, timescale=None):
+    """Builds an index from a track's consecutive sidx boxes. Each box's offsets are relative to the end of the box.
+
+    References to other sidx boxes (reference_type 1), rather than to media, are skipped: the sidx boxes they point to
+    are expected among sidx_atoms. Times are converted to timescale, if given, from each box's own.
+    """
+    times = new_int_array(8)
+    offsets = new_int_array(8)
+
+    for sidx in sidx_atoms:
+        sidx_timescale = sidx.properties['timescale']
+        if timescale is not None and not sidx_timescale:
+            raise MalformedIsomFile
+
+        time = sidx.properties['earliest_presentation_time']
+        offset = sidx._input_file_offset + sidx.size + sidx.properties['first_offset']
+
+        for reference_type, size, duration in zip(sidx.properties['reference_type'], sidx.properties['referenced_size'],
+                                                  sidx.properties['subsegment_duration']):
+            if reference_type == 0:
+                times.append(time if timescale is None else time * timescale // sidx_timescale)
+                offsets.append(offset)
+            time += duration
+            offset += size
+
+    if timescale is None:
+        timescale = sidx_atoms[0].properties['timescale']
+    return FragmentIndex(sidx_atoms[0].properties['reference_ID'], times, offsets, 'sidx', timescale)
+
+def trex_sample_durations(document):
+    """Returns the default sample duration of each track, by track_ID, from the trex boxes in moov."""
+    durations = {}
+    for trex in document.find_all('moov/mvex/trex'):
+        # version and flags, track_ID, default_sample_description_index, default_sample_duration, ...
+        data = bytes(trex.get_data())
+        if len(data) >= 16:
+            track_ID, _, duration = struct.unpack_from('>III', data, 4)
+            durations[track_ID] = duration
+    return durations
+
+def traf_duration(traf, default_duration):
+    """Returns the total duration of a traf's samples, or None if it can't be told."""
+    duration = 0
+    for trun in traf.children.of_type('trun'):
+        if not isinstance(trun, TrunAtom):
+            return None
+        if 'sample_duration' in trun.properties:
+            duration += sum(trun.properties['sample_duration'])
+        elif default_duration is not None:
+            duration += default_duration * trun.properties['sample_count']
+        else:
+            return None
+    return duration
+
+def index_from_moofs(document, track_ID=None):
+    """Builds an index by walking every moof, from the tfhd and tfdt of each of the track's traf boxes.
+
+    tfdt is optional: a fragment without one starts where the track's previous fragment ended, worked out from its
+    samples' durations (given in trun, or by default in tfhd or trex).
+    """
+    times = new_int_array(8)
+    offsets = new_int_array(8)
+    default_durations = None
+    # Where the track's next fragment starts, if known.
+    time = 0
+
+    for moof in document.atoms.of_type('moof'):
+        start = None
+
+        for traf in moof.children.of_type('traf'):
+            tfhd = traf.find('tfhd')
+            if not isinstance(tfhd, TfhdAtom):
+                raise MalformedIsomFile
+
+            if track_ID is None:
+                track_ID = tfhd.properties['track_ID']
+            if tfhd.properties['track_ID'] != track_ID:
+                continue
+
+            tfdt = traf.find('tfdt')
+            if isinstance(tfdt, TfdtAtom):
+                time = tfdt.properties['base_media_decode_time']
+            elif tfdt is not None or time is None:
+                raise MalformedIsomFile
+
+            if start is None:
+                start = time
+
+            default_duration = tfhd.properties.get('default_sample_duration')
+            if default_duration is None:
+                if default_durations is None:
+                    default_durations = trex_sample_durations(document)
+                default_duration = default_durations.get(track_ID)
+
+            duration = traf_duration(traf, default_duration)
+            time = None if duration is None else time + duration
+
+        if start is not None:
+            times.append(start)
+            offsets.append(moof._input_file_offset)
+
+    return FragmentIndex(track_ID, times, offsets, 'moof', track_timescale(document, track_ID))
+
+def seek_index(document, track_ID=None):
+    """Returns a FragmentIndex for the track with track_ID, or the first track found, of a fragmented document.
+
+    The index comes from the mfra box if the file has one, otherwise from top-level sidx boxes, and only failing both
+    from walking every moof.
+    """
+    mfra = read_mfra(document)
+    if mfra is not None:
+        for tfra in mfra.children.of_type('tfra'):
+            if isinstance(tfra, TfraAtom) and track_ID in (None, tfra.properties['track_ID']):
+                return index_from_tfra(tfra, track_timescale(document, tfra.properties['track_ID']))
+
+    sidx_atoms = [atom for atom in document.atoms.of_type('sidx') if isinstance(atom, SidxAtom)]
+    if sidx_atoms:
+        if track_ID is None:
+            track_ID = sidx_atoms[0].properties['reference_ID']
+        sidx_atoms = [atom for atom in sidx_atoms if atom.properties['reference_ID'] == track_ID]
+        if sidx_atoms:
+            return index_from_sidx(sidx_atoms, track_timescale(document, track_ID))
+
+    return index_from_moofs(document, track_ID)
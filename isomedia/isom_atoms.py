@@ -1,4 +1,8 @@
-from isomedia.atom import Atom, ContainerMixin, FullAtom, LazyLoadAtom, interpret_atom, write_atom
+import struct
+
+from isomedia.atom import CONTAINER_SLOTS, Atom, ContainerMixin, FullAtom, LazyLoadAtom, compile_definition, \
+    interpret_atom, interpret_int_array, interpret_int8, interpret_int32, new_int_array, write_atom, write_int_array
+from isomedia.exceptions import AtomSpecificationError
 
 ISOM_ATOMS = [
     'bxml',
@@ -92,115 +96,657 @@ ISOM_ATOMS = [
 ]
 
 class FreeAtom(LazyLoadAtom):
-    pass
+    __slots__ = ()
 
 class SkipAtom(LazyLoadAtom):
-    pass
+    __slots__ = ()
 
 class MdatAtom(LazyLoadAtom):
-    pass
+    __slots__ = ()
 
 class UserExtendedAtom(Atom):
+    __slots__ = ('_user_type', '_data')
+
+    OPAQUE = True
+
     # TODO: How should I surface both uuid and the extended types
     def __init__(self, atom_header, atom_body, document, parent_atom, file_offset):
         super(UserExtendedAtom, self).__init__(atom_header, atom_body, document, parent_atom, file_offset)
 
-        self._user_type = atom_body[0:16]
-        self._data = atom_body
+        # The body is the 16 byte extended type, then the data.
+        data = atom_body.read(atom_header.size - atom_header.header_length)
+        if len(data) < 16:
+            raise AtomSpecificationError
+
+        self._user_type = bytes(data[0:16])
+        self._data = data
 
     def get_data(self):
         return self._data
 
     def to_bytes(self):
         written = super(UserExtendedAtom, self).to_bytes()
-        return ''.join([written, self.get_data()])
+        return b''.join([written, bytes(self.get_data())])
+
+FTYP_DEFINITION = [
+    ('major_brand', (4, None)),
+    ('minor_version', (4, int)),
+    ('compatible_brands', (list, (4, None), None))
+]
 
 class FtypAtom(Atom):
+    __slots__ = ()
+
     def __init__(self, atom_header, atom_body, document, parent_atom, file_offset):
         super(FtypAtom, self).__init__(atom_header, atom_body, document, parent_atom, file_offset)
-
-        definition = [
-            ('major_brand', (4, None)),
-            ('minor_version', (4, int)),
-            ('compatible_brands', (list, (4, None), None))
-        ]
-
-        self.properties.update(interpret_atom(atom_header, atom_body, definition))
-        self._definition['FtypAtom'] = definition
+        self.properties.update(interpret_atom(atom_header, atom_body, FTYP_DEFINITION))
 
     def to_bytes(self):
         written = super(FtypAtom, self).to_bytes()
-        return ''.join([written, write_atom(self.properties, self._definition['FtypAtom'])])
+        return b''.join([written, write_atom(self.properties, FTYP_DEFINITION)])
+
+ILST_DEFINITION = [
+    ('tag_name', (4, None)),
+]
 
 class IlstAtom(ContainerMixin, Atom):
+    __slots__ = CONTAINER_SLOTS
+
     def __init__(self, atom_header, atom_body, document, parent_atom, file_offset):
         super(IlstAtom, self).__init__(atom_header, atom_body, document, parent_atom, file_offset)
-
-        definition = [
-            ('tag_name', (4, None)),
-        ]
-
-        self.properties.update(interpret_atom(atom_header, atom_body, definition))
-        self._definition['IlstAtom'] = definition
+        self.properties.update(interpret_atom(atom_header, atom_body, ILST_DEFINITION))
 
     def to_bytes(self):
         written = super(IlstAtom, self).to_bytes()
-        return ''.join([written, write_atom(self.properties, self._definition['IlstAtom'])])
+        return b''.join([written, write_atom(self.properties, ILST_DEFINITION)])
 
+MVHD_COMMON_DEFINITION = [
+    ('rate', (4, int)),
+    ('volume', (2, int)),
+    ('reserved', (2, int)),
+    ('preferred_long', (list, (4, int), 2)),
+    ('matrix', (list, (4, int), 9)),
+    ('preview_time', (4, int)),
+    ('preview_duration', (4, int)),
+    ('poster_time', (4, int)),
+    ('selection_time', (4, int)),
+    ('selection_duration', (4, int)),
+    ('current_time', (4, int)),
+    ('next_track_ID', (4, int))
+]
+
+MVHD_DEFINITIONS = {
+    0: [
+        ('creation_time', (4, int)),
+        ('modification_time', (4, int)),
+        ('timescale', (4, int)),
+        ('duration', (4, int))
+    ] + MVHD_COMMON_DEFINITION,
+    1: [
+        ('creation_time', (8, int)),
+        ('modification_time', (8, int)),
+        ('timescale', (4, int)),
+        ('duration', (8, int))
+    ] + MVHD_COMMON_DEFINITION
+}
 
 class MvhdAtom(FullAtom):
+    __slots__ = ()
+
     def __init__(self, atom_header, atom_body, document, parent_atom, file_offset):
         super(MvhdAtom, self).__init__(atom_header, atom_body, document, parent_atom, file_offset)
+        self.properties.update(interpret_atom(atom_header, atom_body, self.get_definition()))
+
+    def get_definition(self):
+        return MVHD_DEFINITIONS[1 if self.properties['version'] == 1 else 0]
+
+    def to_bytes(self):
+        written = super(MvhdAtom, self).to_bytes()
+        return b''.join([written, write_atom(self.properties, self.get_definition())])
+
+class MetaAtom(ContainerMixin, FullAtom):
+    __slots__ = CONTAINER_SLOTS
+
+# Bytes consumed by FullAtom's version and flags before a box's own fields start.
+FULL_ATOM_FIELDS_LENGTH = 4
+
+def full_atom_body_length(atom_header):
+    return atom_header.size - atom_header.header_length - FULL_ATOM_FIELDS_LENGTH
+
+def read_full_atom_body(atom_header, atom_body, consumed=0):
+    """Reads the rest of a full atom's body, after consumed bytes of fields already read."""
+    body_length = full_atom_body_length(atom_header) - consumed
+    if body_length < 0:
+        raise AtomSpecificationError
+
+    data = atom_body.read(body_length)
+
+    if len(data) != body_length:
+        raise AtomSpecificationError
+
+    return data
+
+def interpret_fields(atom_header, atom_body, definition, whole_body=False):
+    """Like interpret_atom, but raises AtomSpecificationError rather than read past the end of a full atom whose body is
+    shorter than the definition, or, if whole_body, whose body isn't exactly as long as the definition."""
+    definition_size = compile_definition(definition).size
+    body_length = full_atom_body_length(atom_header)
+    if definition_size > body_length or (whole_body and definition_size != body_length):
+        raise AtomSpecificationError
+    return interpret_atom(atom_header, atom_body, definition)
+
+def flags_value(properties):
+    return interpret_int32(b'\x00' + bytes(properties['flags']))
+
+_optional_definitions = {}
+
+def optional_definition(flags, fields):
+    """Returns the definition of the optional fields, given as (flag, field_name, length), present in flags."""
+    # Only the flags of defined fields count, so whatever else a file sets, there is one entry per combination of them.
+    flags &= sum(flag for flag, _, _ in fields)
+    key = (flags, id(fields))
+
+    definition = _optional_definitions.get(key)
+    if definition is None:
+        definition = [(field_name, (length, int)) for flag, field_name, length in fields if flags & flag]
+        _optional_definitions[key] = definition
+
+    return definition
+
+def to_signed32(value):
+    return value - (1 << 32) if value & 0x80000000 else value
+
+class TableAtom(FullAtom):
+    __slots__ = ()
+
+    # Sample tables can hold millions of entries, so rather than going through interpret_atom per entry the whole
+    # table is decoded with one bulk unpack and split into one array per column.
+    COLUMNS = ()
+    FIELD_SIZE = 4
+
+    def __init__(self, atom_header, atom_body, document, parent_atom, file_offset):
+        super(TableAtom, self).__init__(atom_header, atom_body, document, parent_atom, file_offset)
 
-        definition = []
+        data = read_full_atom_body(atom_header, atom_body)
+        if len(data) < 4:
+            raise AtomSpecificationError
 
-        if self.properties['version'] == 1:
-            definition.extend([
-                ('creation_time', (8, int)),
-                ('modification_time', (8, int)),
-                ('timescale', (4, int)),
-                ('duration', (8, int))
-            ])
+        entry_count = interpret_int32(data, 0)
+        column_count = len(self.COLUMNS)
+
+        if len(data) != 4 + entry_count * column_count * self.FIELD_SIZE:
+            raise AtomSpecificationError
+
+        values = interpret_int_array(data, self.FIELD_SIZE, self.is_signed(), offset=4)
+
+        self.properties['entry_count'] = entry_count
+        for index, column in enumerate(self.COLUMNS):
+            if column_count == 1:
+                self.properties[column] = values
+            else:
+                self.properties[column] = values[index::column_count]
+
+    def is_signed(self):
+        return False
+
+    def to_bytes(self):
+        written = super(TableAtom, self).to_bytes()
+
+        column_count = len(self.COLUMNS)
+        columns = [self.properties[column] for column in self.COLUMNS]
+        entry_count = len(columns[0])
+
+        if column_count == 1:
+            values = columns[0]
         else:
-            definition.extend([
-                ('creation_time', (4, int)),
-                ('modification_time', (4, int)),
-                ('timescale', (4, int)),
-                ('duration', (4, int))
-            ])
-
-        definition.extend([
-            ('rate', (4, int)),
-            ('volume', (2, int)),
-            ('reserved', (2, int)),
-            ('preferred_long', (list, (4, int), 2)),
-            ('matrix', (list, (4, int), 9)),
-            ('preview_time', (4, int)),
-            ('preview_duration', (4, int)),
-            ('poster_time', (4, int)),
-            ('selection_time', (4, int)),
-            ('selection_duration', (4, int)),
-            ('current_time', (4, int)),
-            ('next_track_ID', (4, int))
+            values = new_int_array(self.FIELD_SIZE, [0], self.is_signed()) * (entry_count * column_count)
+            for index, column in enumerate(columns):
+                values[index::column_count] = new_int_array(self.FIELD_SIZE, column, self.is_signed())
+
+        return b''.join([
+            written,
+            write_atom({'entry_count': entry_count}, [('entry_count', (4, int))]),
+            write_int_array(values, self.FIELD_SIZE, self.is_signed())
         ])
 
-        self.properties.update(interpret_atom(atom_header, atom_body, definition))
-        self._definition['MvhdAtom'] = definition
+class SttsAtom(TableAtom):
+    __slots__ = ()
+
+    COLUMNS = ('sample_count', 'sample_delta')
+
+class CttsAtom(TableAtom):
+    __slots__ = ()
+
+    COLUMNS = ('sample_count', 'sample_offset')
+
+    def is_signed(self):
+        # Version 1 allows negative composition offsets.
+        return self.properties['version'] == 1
+
+class StscAtom(TableAtom):
+    __slots__ = ()
+
+    COLUMNS = ('first_chunk', 'samples_per_chunk', 'sample_description_index')
+
+class StssAtom(TableAtom):
+    __slots__ = ()
+
+    COLUMNS = ('sample_number',)
+
+class StcoAtom(TableAtom):
+    __slots__ = ()
+
+    COLUMNS = ('chunk_offset',)
+
+class Co64Atom(TableAtom):
+    __slots__ = ()
+
+    COLUMNS = ('chunk_offset',)
+    FIELD_SIZE = 8
+
+class StszAtom(FullAtom):
+    __slots__ = ()
+
+    def __init__(self, atom_header, atom_body, document, parent_atom, file_offset):
+        super(StszAtom, self).__init__(atom_header, atom_body, document, parent_atom, file_offset)
+
+        data = read_full_atom_body(atom_header, atom_body)
+        if len(data) < 8:
+            raise AtomSpecificationError
+
+        sample_size = interpret_int32(data, 0)
+        sample_count = interpret_int32(data, 4)
+
+        # Per-sample sizes are only present when the samples are not all the same size.
+        if len(data) != 8 + (4 * sample_count if sample_size == 0 else 0):
+            raise AtomSpecificationError
+
+        self.properties.update({
+            'sample_size': sample_size,
+            'sample_count': sample_count,
+            'entry_size': interpret_int_array(data, 4, offset=8)
+        })
 
     def to_bytes(self):
-        written = super(MvhdAtom, self).to_bytes()
-        return ''.join([written, write_atom(self.properties, self._definition['MvhdAtom'])])
+        written = super(StszAtom, self).to_bytes()
 
-class MetaAtom(ContainerMixin, FullAtom):
-    pass
+        definition = [
+            ('sample_size', (4, int)),
+            ('sample_count', (4, int))
+        ]
+
+        return b''.join([
+            written,
+            write_atom(self.properties, definition),
+            write_int_array(self.properties['entry_size'], 4)
+        ])
+
+class Stz2Atom(FullAtom):
+    __slots__ = ()
+
+    def __init__(self, atom_header, atom_body, document, parent_atom, file_offset):
+        super(Stz2Atom, self).__init__(atom_header, atom_body, document, parent_atom, file_offset)
+
+        data = read_full_atom_body(atom_header, atom_body)
+        if len(data) < 8:
+            raise AtomSpecificationError
+
+        field_size = interpret_int8(data, 3)
+        sample_count = interpret_int32(data, 4)
+
+        if field_size == 4:
+            packed = interpret_int_array(data, 1, offset=8)
+            entry_size = new_int_array(1, [0]) * (2 * len(packed))
+            entry_size[0::2] = new_int_array(1, [value >> 4 for value in packed])
+            entry_size[1::2] = new_int_array(1, [value & 0x0f for value in packed])
+            del entry_size[sample_count:]
+            expected_length = (sample_count + 1) // 2
+        elif field_size in (8, 16):
+            entry_size = interpret_int_array(data, field_size // 8, offset=8)
+            expected_length = sample_count * field_size // 8
+        else:
+            raise AtomSpecificationError
+
+        if len(data) != 8 + expected_length:
+            raise AtomSpecificationError
+
+        self.properties.update({
+            'reserved': bytes(data[0:3]),
+            'field_size': field_size,
+            'sample_count': sample_count,
+            'entry_size': entry_size
+        })
+
+    def to_bytes(self):
+        written = super(Stz2Atom, self).to_bytes()
+
+        definition = [
+            ('reserved', (3, None)),
+            ('field_size', (1, int)),
+            ('sample_count', (4, int))
+        ]
+
+        field_size = self.properties['field_size']
+        entry_size = self.properties['entry_size']
+
+        if field_size == 4:
+            high = entry_size[0::2]
+            low = list(entry_size[1::2]) + [0] * (len(high) - len(entry_size[1::2]))
+            entries = write_int_array([(h << 4) | l for h, l in zip(high, low)], 1)
+        else:
+            entries = write_int_array(entry_size, field_size // 8)
+
+        return b''.join([written, write_atom(self.properties, definition), entries])
+
+class MfroAtom(FullAtom):
+    __slots__ = ()
+
+    DEFINITION = [
+        ('size', (4, int))
+    ]
+
+    def __init__(self, atom_header, atom_body, document, parent_atom, file_offset):
+        super(MfroAtom, self).__init__(atom_header, atom_body, document, parent_atom, file_offset)
+        self.properties.update(interpret_fields(atom_header, atom_body, self.DEFINITION, whole_body=True))
+
+    def to_bytes(self):
+        written = super(MfroAtom, self).to_bytes()
+        return b''.join([written, write_atom(self.properties, self.DEFINITION)])
+
+TFDT_DEFINITIONS = {
+    0: [('base_media_decode_time', (4, int))],
+    1: [('base_media_decode_time', (8, int))]
+}
+
+class TfdtAtom(FullAtom):
+    __slots__ = ()
+
+    def __init__(self, atom_header, atom_body, document, parent_atom, file_offset):
+        super(TfdtAtom, self).__init__(atom_header, atom_body, document, parent_atom, file_offset)
+        self.properties.update(interpret_fields(atom_header, atom_body, self.get_definition(), whole_body=True))
+
+    def get_definition(self):
+        return TFDT_DEFINITIONS[1 if self.properties['version'] == 1 else 0]
+
+    def to_bytes(self):
+        written = super(TfdtAtom, self).to_bytes()
+        return b''.join([written, write_atom(self.properties, self.get_definition())])
+
+# (flag, field_name, length) of the fields that are only present when their flag is set.
+TFHD_OPTIONAL_FIELDS = [
+    (0x000001, 'base_data_offset', 8),
+    (0x000002, 'sample_description_index', 4),
+    (0x000008, 'default_sample_duration', 4),
+    (0x000010, 'default_sample_size', 4),
+    (0x000020, 'default_sample_flags', 4)
+]
+
+TFHD_OPTIONAL_FLAGS = sum(flag for flag, _, _ in TFHD_OPTIONAL_FIELDS)
+
+_tfhd_definitions = {}
+
+class TfhdAtom(FullAtom):
+    __slots__ = ()
+
+    def __init__(self, atom_header, atom_body, document, parent_atom, file_offset):
+        super(TfhdAtom, self).__init__(atom_header, atom_body, document, parent_atom, file_offset)
+        self.properties.update(interpret_fields(atom_header, atom_body, self.get_definition(), whole_body=True))
+
+    def get_definition(self):
+        flags = flags_value(self.properties) & TFHD_OPTIONAL_FLAGS
+
+        definition = _tfhd_definitions.get(flags)
+        if definition is None:
+            definition = [('track_ID', (4, int))] + optional_definition(flags, TFHD_OPTIONAL_FIELDS)
+            _tfhd_definitions[flags] = definition
+
+        return definition
+
+    def to_bytes(self):
+        written = super(TfhdAtom, self).to_bytes()
+        return b''.join([written, write_atom(self.properties, self.get_definition())])
+
+TRUN_DATA_OFFSET_PRESENT = 0x000001
+TRUN_FIRST_SAMPLE_FLAGS_PRESENT = 0x000004
+
+# (flag, column, length) of the per-sample fields, in the order they are stored in each sample's entry.
+TRUN_SAMPLE_FIELDS = [
+    (0x000100, 'sample_duration', 4),
+    (0x000200, 'sample_size', 4),
+    (0x000400, 'sample_flags', 4),
+    (0x000800, 'sample_composition_time_offset', 4)
+]
+
+class TrunAtom(FullAtom):
+    __slots__ = ()
+
+    # Like the sample tables, per-sample fields are decoded with one bulk unpack into one array per present field.
+    def __init__(self, atom_header, atom_body, document, parent_atom, file_offset):
+        super(TrunAtom, self).__init__(atom_header, atom_body, document, parent_atom, file_offset)
+
+        data = read_full_atom_body(atom_header, atom_body)
+        flags = flags_value(self.properties)
+        if len(data) < 4:
+            raise AtomSpecificationError
+
+        self.properties['sample_count'] = interpret_int32(data, 0)
+        position = 4
+
+        if flags & TRUN_DATA_OFFSET_PRESENT:
+            if len(data) < position + 4:
+                raise AtomSpecificationError
+            self.properties['data_offset'] = to_signed32(interpret_int32(data, position))
+            position += 4
+        if flags & TRUN_FIRST_SAMPLE_FLAGS_PRESENT:
+            if len(data) < position + 4:
+                raise AtomSpecificationError
+            self.properties['first_sample_flags'] = interpret_int32(data, position)
+            position += 4
+
+        columns = self.get_columns(flags)
+        if len(data) != position + self.properties['sample_count'] * 4 * len(columns):
+            raise AtomSpecificationError
+
+        values = interpret_int_array(data, 4, offset=position)
+        for index, column in enumerate(columns):
+            column_values = values
+            if column == 'sample_composition_time_offset' and self.properties['version'] == 1:
+                # Version 1 allows negative composition offsets.
+                column_values = interpret_int_array(data, 4, signed=True, offset=position)
+            self.properties[column] = column_values[index::len(columns)] if len(columns) > 1 else column_values
+
+    def get_columns(self, flags):
+        return [column for column, _ in optional_definition(flags, TRUN_SAMPLE_FIELDS)]
+
+    def to_bytes(self):
+        written = super(TrunAtom, self).to_bytes()
+        flags = flags_value(self.properties)
+
+        columns = self.get_columns(flags)
+        if columns:
+            sample_count = len(self.properties[columns[0]])
+        else:
+            sample_count = self.properties['sample_count']
+
+        fields = [struct.pack('>I', sample_count)]
+        if flags & TRUN_DATA_OFFSET_PRESENT:
+            fields.append(struct.pack('>i', self.properties['data_offset']))
+        if flags & TRUN_FIRST_SAMPLE_FLAGS_PRESENT:
+            fields.append(struct.pack('>I', self.properties['first_sample_flags']))
+
+        values = new_int_array(4, [0]) * (sample_count * len(columns))
+        for index, column in enumerate(columns):
+            column_values = self.properties[column]
+            if column == 'sample_composition_time_offset' and self.properties['version'] == 1:
+                column_values = [value & 0xffffffff for value in column_values]
+            values[index::len(columns)] = new_int_array(4, column_values)
+        fields.append(write_int_array(values, 4))
+
+        return b''.join([written] + fields)
+
+SIDX_DEFINITIONS = {
+    0: [
+        ('reference_ID', (4, int)),
+        ('timescale', (4, int)),
+        ('earliest_presentation_time', (4, int)),
+        ('first_offset', (4, int)),
+        ('reserved', (2, int)),
+        ('reference_count', (2, int))
+    ],
+    1: [
+        ('reference_ID', (4, int)),
+        ('timescale', (4, int)),
+        ('earliest_presentation_time', (8, int)),
+        ('first_offset', (8, int)),
+        ('reserved', (2, int)),
+        ('reference_count', (2, int))
+    ]
+}
+
+SIDX_REFERENCE_LENGTH = 12
+
+class SidxAtom(FullAtom):
+    """A segment index. Each reference's bit fields are split into their own columns: reference_type and
+    referenced_size, subsegment_duration, and starts_with_SAP, SAP_type and SAP_delta_time."""
+    __slots__ = ()
+
+    def __init__(self, atom_header, atom_body, document, parent_atom, file_offset):
+        super(SidxAtom, self).__init__(atom_header, atom_body, document, parent_atom, file_offset)
+
+        definition = self.get_definition()
+        self.properties.update(interpret_fields(atom_header, atom_body, definition))
+
+        data = read_full_atom_body(atom_header, atom_body, compile_definition(definition).size)
+        if len(data) != self.properties['reference_count'] * SIDX_REFERENCE_LENGTH:
+            raise AtomSpecificationError
+
+        values = interpret_int_array(data, 4)
+        sizes, durations, saps = values[0::3], values[1::3], values[2::3]
+
+        self.properties.update({
+            'reference_type': new_int_array(1, [value >> 31 for value in sizes]),
+            'referenced_size': new_int_array(4, [value & 0x7fffffff for value in sizes]),
+            'subsegment_duration': durations,
+            'starts_with_SAP': new_int_array(1, [value >> 31 for value in saps]),
+            'SAP_type': new_int_array(1, [(value >> 28) & 0x7 for value in saps]),
+            'SAP_delta_time': new_int_array(4, [value & 0x0fffffff for value in saps])
+        })
+
+    def get_definition(self):
+        return SIDX_DEFINITIONS[1 if self.properties['version'] == 1 else 0]
+
+    def to_bytes(self):
+        written = super(SidxAtom, self).to_bytes()
+        properties = self.properties
+
+        reference_count = len(properties['referenced_size'])
+        values = new_int_array(4, [0]) * (reference_count * 3)
+        values[0::3] = new_int_array(4, [(reference_type << 31) | size for reference_type, size
+                                         in zip(properties['reference_type'], properties['referenced_size'])])
+        values[1::3] = new_int_array(4, properties['subsegment_duration'])
+        values[2::3] = new_int_array(4, [(starts << 31) | (sap_type << 28) | delta for starts, sap_type, delta
+                                         in zip(properties['starts_with_SAP'], properties['SAP_type'],
+                                                properties['SAP_delta_time'])])
+
+        fields = dict(properties, reference_count=reference_count)
+        return b''.join([written, write_atom(fields, self.get_definition()), write_int_array(values, 4)])
+
+TFRA_DEFINITION = [
+    ('track_ID', (4, int)),
+    ('length_sizes', (4, int)),
+    ('number_of_entry', (4, int))
+]
+
+# Formats of the fields of a tfra entry, by length. Three byte fields are unpacked as bytes and converted afterwards.
+TFRA_FIELD_FORMATS = {1: 'B', 2: 'H', 3: '3s', 4: 'I', 8: 'Q'}
+
+TFRA_COLUMNS = ('time', 'moof_offset', 'traf_number', 'trun_number', 'sample_number')
+
+_tfra_entry_structs = {}
+
+def tfra_entry_struct(field_lengths):
+    """Returns the struct.Struct of a single tfra entry whose fields have the given lengths."""
+    key = tuple(field_lengths)
+
+    entry_struct = _tfra_entry_structs.get(key)
+    if entry_struct is None:
+        entry_struct = struct.Struct('>' + ''.join(TFRA_FIELD_FORMATS[length] for length in key))
+        _tfra_entry_structs[key] = entry_struct
+
+    return entry_struct
+
+class TfraAtom(FullAtom):
+    """A track fragment random access box. length_sizes packs the sizes of traf_number, trun_number and sample_number,
+    less one, into its last six bits; the entries are decoded into one array per column."""
+    __slots__ = ()
+
+    def __init__(self, atom_header, atom_body, document, parent_atom, file_offset):
+        super(TfraAtom, self).__init__(atom_header, atom_body, document, parent_atom, file_offset)
+        self.properties.update(interpret_fields(atom_header, atom_body, TFRA_DEFINITION))
+
+        data = read_full_atom_body(atom_header, atom_body, compile_definition(TFRA_DEFINITION).size)
+
+        entry_count = self.properties['number_of_entry']
+        entry_struct = tfra_entry_struct(self.get_field_lengths())
+        if len(data) != entry_struct.size * entry_count:
+            raise AtomSpecificationError
+
+        data = bytes(data)
+        if hasattr(entry_struct, 'iter_unpack'):
+            entries = entry_struct.iter_unpack(data)
+        else:
+            entries = (entry_struct.unpack_from(data, offset) for offset in range(0, len(data), entry_struct.size))
+        columns = list(zip(*entries)) or [()] * len(TFRA_COLUMNS)
+
+        for column, length, column_values in zip(TFRA_COLUMNS, self.get_field_lengths(), columns):
+            if length == 3:
+                column_values = [interpret_int32(b'\x00' + value) for value in column_values]
+            self.properties[column] = new_int_array(length if length != 3 else 4, column_values)
+
+    def get_field_lengths(self):
+        time_length = 8 if self.properties['version'] == 1 else 4
+        length_sizes = self.properties['length_sizes']
+        return [time_length, time_length,
+                ((length_sizes >> 4) & 0x3) + 1, ((length_sizes >> 2) & 0x3) + 1, (length_sizes & 0x3) + 1]
+
+    def to_bytes(self):
+        written = super(TfraAtom, self).to_bytes()
+        properties = self.properties
+
+        field_lengths = self.get_field_lengths()
+        columns = []
+        for column, length in zip(TFRA_COLUMNS, field_lengths):
+            column_values = properties[column]
+            if length == 3:
+                column_values = [struct.pack('>I', value)[1:] for value in column_values]
+            columns.append(column_values)
+
+        entry_struct = tfra_entry_struct(field_lengths)
+        fields = dict(properties, number_of_entry=len(properties['time']))
+        return b''.join([written, write_atom(fields, TFRA_DEFINITION)] +
+                        [entry_struct.pack(*entry) for entry in zip(*columns)])
 
 ATOM_TYPE_TO_CLASS = {
+    'co64': Co64Atom,
+    'ctts': CttsAtom,
     'free': FreeAtom,
     'ftyp': FtypAtom,
     'ilst': IlstAtom,
     'mdat': MdatAtom,
     'meta': MetaAtom,
+    'mfro': MfroAtom,
     'mvhd': MvhdAtom,
+    'sidx': SidxAtom,
     'skip': SkipAtom,
+    'stco': StcoAtom,
+    'stsc': StscAtom,
+    'stss': StssAtom,
+    'stsz': StszAtom,
+    'stts': SttsAtom,
+    'stz2': Stz2Atom,
+    'tfdt': TfdtAtom,
+    'tfhd': TfhdAtom,
+    'tfra': TfraAtom,
+    'trun': TrunAtom,
     'uuid': UserExtendedAtom,
 }
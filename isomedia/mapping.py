@@ -0,0 +1,60 @@
+import mmap
+import os
+
+try:
+    _buffer = buffer
+except NameError:
+    _buffer = None
+
+def make_view(data, offset=0, length=None):
+    """Returns a zero-copy view of length bytes of data starting at offset."""
+    if length is None:
+        length = len(data) - offset
+
+    if _buffer is not None:
+        # Python 2's mmap only exposes the old-style buffer interface, which memoryview can't wrap.
+        return _buffer(data, offset, length)
+
+    return memoryview(data)[offset:offset + length]
+
+def map_file(fp):
+    fp.seek(0, os.SEEK_END)
+    size = fp.tell()
+    fp.seek(0, os.SEEK_SET)
+
+    # Empty files can't be mapped.
+    if size == 0:
+        return b''
+
+    return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+class MappedReader(object):
+    """A read-only file-like object over a memory map (or any buffer) whose reads return views rather than copies."""
+    def __init__(self, data):
+        self._data = data
+        self._size = len(data)
+        self._position = 0
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            n = self._size - self._position
+        n = max(0, min(n, self._size - self._position))
+
+        view = make_view(self._data, self._position, n)
+        self._position += n
+        return view
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self._size
+
+        self._position = offset
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def view(self, offset, length):
+        return make_view(self._data, offset, length)
@@ -0,0 +1,75 @@
+from isomedia.atom import STANDARD_HEADER_LENGTH, ContainerMixin, create_atom
+
+PADDING_ATOMS = ['free', 'skip']
+
+def is_padding(atom):
+    return atom.type in PADDING_ATOMS
+
+def make_padding(atom_type, size, document, parent):
+    padding = create_atom(atom_type, b'\x00' * (size - STANDARD_HEADER_LENGTH))
+    padding.document = document
+    padding.parent_atom = parent
+    return padding
+
+def update_sizes(atoms):
+    """Recomputes the sizes of parsed atoms from their contents, innermost first."""
+    for atom in atoms:
+        if isinstance(atom, ContainerMixin):
+            if atom.children_loaded():
+                update_sizes(atom.children)
+                atom.size = len(atom.fields_to_bytes()) + sum(child.size for child in atom.children)
+        elif atom.LOAD_DATA:
+            atom.size = len(atom.to_bytes())
+
+def snapshot_layout(atoms):
+    """Records every parsed list of siblings and every atom's size, for restore_layout to put back."""
+    lists = []
+    sizes = []
+
+    def record(siblings):
+        lists.append((siblings, list(siblings)))
+        for atom in siblings:
+            sizes.append((atom, atom.size))
+            if isinstance(atom, ContainerMixin) and atom.children_loaded():
+                record(atom.children)
+
+    record(atoms)
+    return lists, sizes
+
+def restore_layout(layout):
+    """Undoes update_sizes and absorb_size_changes, given the snapshot_layout taken before them."""
+    lists, sizes = layout
+    for siblings, contents in lists:
+        siblings[:] = contents
+    for atom, size in sizes:
+        atom.size = size
+
+def absorb_size_changes(atoms, document=None, parent=None):
+    """Keeps each list of siblings the same total size by borrowing from or donating to adjacent free/skip atoms.
+
+    A sibling that grew takes its growth out of a free atom next to it; one that shrank gives the difference to a free
+    atom next to it, or to a new free atom if there is none and the difference is large enough for one. Changes that
+    can't be absorbed are left for the parent's siblings to absorb. Sizes must be up to date (see update_sizes).
+    """
+    for atom in atoms:
+        if isinstance(atom, ContainerMixin) and atom.children_loaded():
+            absorb_size_changes(atom.children, document, atom)
+            atom.size = len(atom.fields_to_bytes()) + sum(child.size for child in atom.children)
+
+    index = 0
+    while index < len(atoms):
+        atom = atoms[index]
+        delta = atom.size - atom._input_size
+
+        if delta != 0 and not is_padding(atom):
+            for neighbour in (index + 1, index - 1):
+                if 0 <= neighbour < len(atoms) and is_padding(atoms[neighbour]):
+                    padding = atoms[neighbour]
+                    if padding.size - delta >= STANDARD_HEADER_LENGTH:
+                        atoms[neighbour] = make_padding(padding.type, padding.size - delta, document, parent)
+                        break
+            else:
+                if delta <= -STANDARD_HEADER_LENGTH:
+                    atoms.insert(index + 1, make_padding('free', -delta, document, parent))
+
+        index += 1
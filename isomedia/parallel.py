@@ -0,0 +1,117 @@
+"""Parses the children of a file's top-level containers (the moof of every fragment, moov) across a pool of workers."""
+from io import BytesIO
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from isomedia.atom import ContainerMixin
+from isomedia.parser import parse_children
+from isomedia.transfer import pread
+
+# Tasks per worker: enough to even out fragments of different sizes without paying much per task.
+TASKS_PER_WORKER = 4
+
+# Stand in for the document and the parent container while parsing in another process. They are pickled by reference and
+# replaced by the real ones when the children are loaded.
+WORKER_DOCUMENT = object()
+WORKER_PARENT = object()
+
+def worker_reference(obj):
+    if obj is WORKER_DOCUMENT:
+        return 'document'
+    if obj is WORKER_PARENT:
+        return 'parent'
+    return None
+
+def dump_subtree(children):
+    output = BytesIO()
+    pickler = pickle.Pickler(output, pickle.HIGHEST_PROTOCOL)
+    pickler.persistent_id = worker_reference
+    pickler.dump(children)
+    return output.getvalue()
+
+def load_subtree(data, document, parent):
+    """Returns the children pickled by dump_subtree, as children of parent in document."""
+    references = {'document': document, 'parent': parent}
+    unpickler = pickle.Unpickler(BytesIO(data))
+    unpickler.persistent_load = references.__getitem__
+    return unpickler.load()
+
+def parse_batch(task):
+    """Parses the children at each (offset, length) in ranges, reading the file at path with positional reads.
+
+    Threads parse straight into document, as children of parents. Processes have neither, and return each container's
+    children pickled instead.
+    """
+    path, ranges, document, parents = task
+    results = []
+
+    with open(path, 'rb') as fp:
+        for index, (offset, length) in enumerate(ranges):
+            data = pread(fp, offset, length)
+            if document is None:
+                children = parse_children(BytesIO(data), offset, length, document=WORKER_DOCUMENT, parent=WORKER_PARENT)
+                results.append(dump_subtree(children))
+            else:
+                results.append(parse_children(BytesIO(data), offset, length, document=document,
+                                              parent=parents[index]))
+
+    return results
+
+def split_batches(containers, count):
+    """Splits containers, in file order, into at most count runs of roughly equal total size."""
+    target = sum(container.size for container in containers) / float(max(count, 1))
+
+    batches = []
+    batch = []
+    batch_size = 0
+    for container in containers:
+        batch.append(container)
+        batch_size += container.size
+        if batch_size >= target:
+            batches.append(batch)
+            batch = []
+            batch_size = 0
+
+    if batch:
+        batches.append(batch)
+    return batches
+
+def parse_containers(document, path, processes=None, threads=False):
+    """Parses the children of every top-level container of document whose children are still deferred, in a pool of
+    processes (or threads, if threads) reading the file at path.
+
+    Threads attach the children straight away. Children parsed in another process come back pickled and are only
+    unpickled when first accessed, so that the cost left in this process is not much more than receiving them; errors
+    are raised here either way.
+    """
+    containers = [atom for atom in document.atoms
+                  if isinstance(atom, ContainerMixin) and not atom.children_loaded()]
+    if not containers:
+        return
+
+    processes = processes or multiprocessing.cpu_count()
+    batches = split_batches(containers, processes * TASKS_PER_WORKER)
+
+    if threads:
+        tasks = [(path, [container._children_range for container in batch], document, batch) for batch in batches]
+        pool = ThreadPool(processes)
+    else:
+        tasks = [(path, [container._children_range for container in batch], None, None) for batch in batches]
+        pool = multiprocessing.Pool(processes)
+
+    try:
+        for batch, results in zip(batches, pool.imap(parse_batch, tasks)):
+            for container, result in zip(batch, results):
+                if threads:
+                    container.children = result
+                else:
+                    document.defer_parsed_children(container._children_range[0], result)
+    finally:
+        # Every result has been received unless parsing failed, in which case the remaining tasks are abandoned.
+        pool.terminate()
+        pool.join()
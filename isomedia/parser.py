@@ -1,9 +1,18 @@
 import os
-import StringIO
+from io import BytesIO
 
 from isomedia import atom, isom_atoms
-from isomedia.atom import AtomHeader, ContainerAtom, ContainerMixin, GenericAtom, interpret_int32, interpret_int64
+from isomedia.atom import (AtomHeader, ContainerAtom, ContainerMixin, GenericAtom, ReferencedAtom, interpret_int32,
+                           interpret_int64)
+from isomedia.atom_list import AtomList
+from isomedia.compat import type_from_bytes
 from isomedia.exceptions import MalformedIsomFile, AtomSpecificationError
+from isomedia.mapping import MappedReader
+from isomedia.selection import PARSE, SKIP, UnparsedAtom, UnparsedRegion, atom_path
+
+# Opaque bodies (see Atom.OPAQUE) larger than this are left in the file as ReferencedAtoms rather than read into memory,
+# when there is a document to read them from later.
+MAX_OPAQUE_BODY_SIZE = 1024 * 1024
 
 def get_ptr_size(ptr):
     ptr.seek(0, os.SEEK_END)
@@ -17,9 +26,15 @@ def need_read(ptr, n):
         raise EOFError
     return data
 
+def wrap_body(data):
+    # Bodies read from a memory map are views; keep them that way instead of copying them into a BytesIO.
+    if isinstance(data, bytes):
+        return BytesIO(data)
+    return MappedReader(data)
+
 def interpret_atom_header(data):
     atom_size = interpret_int32(data, 0)
-    atom_type = data[4:8]
+    atom_type = type_from_bytes(data[4:8])
 
     if atom_size == 1:
         atom_size = interpret_int64(data, 8)
@@ -29,25 +44,55 @@ def interpret_atom_header(data):
 
     return (atom_type, atom_size, header_length)
 
-def parse_file(ptr, document):
-    atoms = []
+def is_container_type(atom_type):
+    if atom_type in atom.CONTAINER_ATOMS:
+        return True
+    atom_class = isom_atoms.ATOM_TYPE_TO_CLASS.get(atom_type)
+    return atom_class is not None and issubclass(atom_class, ContainerMixin)
+
+def parse_file(ptr, document, eager=True, stats=None, selection=None):
+    atoms = AtomList()
 
     current_offset = 0
     filesize = get_ptr_size(ptr)
 
     while current_offset < filesize:
-        new_atom, atom_size = parse_atom(ptr, current_offset, document=document, parent=None)
+        if selection is not None and selection.stopped:
+            atoms.append(UnparsedRegion(document, None, current_offset, filesize - current_offset))
+            break
+
+        new_atom, atom_size = parse_atom(ptr, current_offset, document=document, parent=None, eager=eager,
+                                         stats=stats, selection=selection)
         atoms.append(new_atom)
         current_offset += atom_size
 
     return atoms
 
-def parse_atom(ptr, offset, document=None, parent=None):
+def load_children(container, ptr, offset, total_bytes, document, eager, stats, selection):
+    # Deferring needs a document to come back to; atoms parsed on their own are always parsed eagerly.
+    if eager or document is None:
+        container.children = parse_children(ptr, offset, total_bytes, document=document, parent=container,
+                                            eager=eager, stats=stats, selection=selection)
+    else:
+        container.defer_children(offset, total_bytes)
+        ptr.seek(total_bytes, os.SEEK_CUR)
+
+def parse_atom(ptr, offset, document=None, parent=None, eager=True, stats=None, selection=None):
+    """Parses the atom at ptr's position, which is offset in the file. Returns (atom, its size).
+
+    With stats (see stats.ParseStats), the parse is measured; ptr should then be one returned by stats.wrap(). With
+    selection (see selection.SelectiveParse), only the selected parts of the atom are parsed.
+    """
+    if stats is not None:
+        return stats.measure_parse(_parse_atom, ptr, offset, document, parent, eager, selection)
+    return _parse_atom(ptr, offset, document, parent, eager, None, selection)
+
+def _parse_atom(ptr, offset, document, parent, eager, stats, selection):
     def parse_atom_header(ptr):
-        data = need_read(ptr, 8)
+        data = bytes(need_read(ptr, 8))
         atom_size = interpret_int32(data, 0)
         if atom_size == 1:
-            data += need_read(ptr, 8)
+            data += bytes(need_read(ptr, 8))
 
         return data
 
@@ -62,16 +107,29 @@ def parse_atom(ptr, offset, document=None, parent=None):
     atom_body_length = atom_size - header_length
     atom_body_start = ptr.tell()
 
+    if selection is not None:
+        decision, targets = selection.decide(atom_path(parent, atom_type), is_container_type(atom_type))
+        if decision == SKIP:
+            new_atom = UnparsedAtom(atom_header, ptr, document, parent, offset)
+            ptr.seek(atom_body_length, os.SEEK_CUR)
+            return (new_atom, atom_size)
+        selection.enter(decision)
+
     # TODO: Clearly distinguish different atom specifications
     new_atom = None
+    reference = document is not None and atom_body_length > MAX_OPAQUE_BODY_SIZE
 
     if atom_type in atom.CONTAINER_ATOMS:
         new_atom = ContainerAtom(atom_header, ptr, document, parent, offset)
-        new_atom.children = parse_children(ptr, offset + header_length, atom_body_length, parent=new_atom)
+        load_children(new_atom, ptr, offset + header_length, atom_body_length, document, eager, stats,
+                      selection)
     elif atom_type in isom_atoms.ATOM_TYPE_TO_CLASS:
         new_atom_class = isom_atoms.ATOM_TYPE_TO_CLASS[atom_type]
 
-        if new_atom_class.LOAD_DATA:
+        if new_atom_class.OPAQUE and reference:
+            # Left in the file below.
+            pass
+        elif new_atom_class.LOAD_DATA:
             # If the atom is the right size but doesn't match the definition, we can still parse the rest of the file and
             # just default this atom to a GenericAtom and let the caller munge the bits.
             try:
@@ -80,7 +138,8 @@ def parse_atom(ptr, offset, document=None, parent=None):
                 children_bytes = atom_size - header_length - parent_fragment_bytes
 
                 if isinstance(new_atom, ContainerMixin):
-                    new_atom.children = parse_children(ptr, offset + header_length, children_bytes, parent=new_atom)
+                    load_children(new_atom, ptr, offset + header_length + parent_fragment_bytes, children_bytes,
+                                  document, eager, stats, selection)
             except AtomSpecificationError:
                 new_atom = None
                 ptr.seek(atom_body_start, os.SEEK_SET)
@@ -88,9 +147,12 @@ def parse_atom(ptr, offset, document=None, parent=None):
             new_atom = new_atom_class(atom_header, ptr, document, parent, offset)
             ptr.seek(atom_body_length, os.SEEK_CUR)
 
-    if new_atom is None:
+    if new_atom is None and reference:
+        new_atom = ReferencedAtom(atom_header, ptr, document, parent, offset)
+        ptr.seek(atom_body_length, os.SEEK_CUR)
+    elif new_atom is None:
         generic_data = ptr.read(atom_body_length)
-        new_atom = GenericAtom(atom_header, StringIO.StringIO(generic_data), document, parent, offset)
+        new_atom = GenericAtom(atom_header, wrap_body(generic_data), document, parent, offset)
 
     atom_body_end = ptr.tell()
     atom_bytes_read = header_length + (atom_body_end - atom_body_start)
@@ -98,14 +160,29 @@ def parse_atom(ptr, offset, document=None, parent=None):
     if atom_bytes_read != atom_size:
         raise MalformedIsomFile
 
+    if selection is not None:
+        selection.leave(decision, targets)
+
     return (new_atom, atom_size)
 
-def parse_children(ptr, offset, total_bytes, parent=None):
-    children = []
+def parse_children(ptr, offset, total_bytes, document=None, parent=None, eager=True, stats=None, selection=None):
+    children = AtomList()
     bytes_read = 0
 
+    # Readers over high-latency sources fetch the whole range concurrently rather than header by header.
+    prefetch = getattr(ptr, 'prefetch', None)
+    if prefetch is not None:
+        prefetch(offset, total_bytes)
+
     while bytes_read < total_bytes:
-        new_atom, atom_size = parse_atom(ptr, offset + bytes_read, parent=parent)
+        if selection is not None and selection.stopped:
+            children.append(UnparsedRegion(document, parent, offset + bytes_read, total_bytes - bytes_read))
+            ptr.seek(total_bytes - bytes_read, os.SEEK_CUR)
+            bytes_read = total_bytes
+            break
+
+        new_atom, atom_size = parse_atom(ptr, offset + bytes_read, document=document, parent=parent, eager=eager,
+                                         stats=stats, selection=selection)
         children.append(new_atom)
         bytes_read += atom_size
 
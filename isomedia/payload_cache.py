@@ -0,0 +1,79 @@
+"""An LRU cache of the payloads loaded by get_data (mdat, free, ...), holding at most a set number of bytes.
+
+Every document has one, so that loading a large payload once doesn't keep it in memory for as long as the document
+lives. A cache can be shared by several documents to put a single budget on all of them.
+"""
+from collections import OrderedDict
+import threading
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+class PayloadCache(object):
+    """Keeps the most recently loaded payloads up to max_bytes in total; 0 caches nothing. Payloads larger than
+    max_bytes are never cached.
+
+    hits and misses count the payloads served from the cache and the payloads that had to be read, evictions the
+    payloads dropped to make room, and size is the number of bytes currently held.
+    """
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+
+        # (owner, offset, length) to payload, least recently used first.
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return str({
+            'max_bytes': self.max_bytes,
+            'size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        })
+
+    def get(self, owner, offset, length, load):
+        """Returns the payload at offset and length of owner's file, calling load() to read it if it isn't cached.
+
+        owner is any object identifying the file, normally a document's payload_owner.
+        """
+        key = (owner, offset, length)
+
+        with self._lock:
+            data = self._entries.pop(key, None)
+            if data is not None:
+                self._entries[key] = data
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        # Read without holding the lock, so that other threads aren't held up by a large payload.
+        data = load()
+        if len(data) > self.max_bytes:
+            return data
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = data
+                self.size += len(data)
+
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+        return data
+
+    def discard(self, owner):
+        """Drops every payload of owner's file, for when the file has changed or is closed."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] is owner]:
+                self.size -= len(self._entries.pop(key))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
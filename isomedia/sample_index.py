@@ -0,0 +1,164 @@
+from itertools import chain
+
+from isomedia.atom import new_int_array
+from isomedia.compat import accumulate
+from isomedia.exceptions import MalformedIsomFile
+from isomedia.isom_atoms import Co64Atom, CttsAtom, StcoAtom, StscAtom, StssAtom, SttsAtom, Stz2Atom, StszAtom
+
+SAMPLE_TABLE_PATH = ['mdia', 'minf', 'stbl']
+
+def find_child(atom, atom_type):
+    for child in atom.children:
+        if child.type == atom_type:
+            return child
+    return None
+
+def find_sample_table(trak):
+    stbl = trak
+    for atom_type in SAMPLE_TABLE_PATH:
+        stbl = find_child(stbl, atom_type)
+        if stbl is None:
+            raise MalformedIsomFile
+
+    return stbl
+
+class SampleIndex(object):
+    """Per-sample columns for a single track.
+
+    Every column is indexed by sample number (zero-based): decode_times and composition_offsets are in the track's
+    timescale, offsets are absolute file offsets and sync holds 1 for sync samples and 0 otherwise.
+    """
+    def __init__(self, decode_times, composition_offsets, offsets, sizes, sync):
+        self.decode_times = decode_times
+        self.composition_offsets = composition_offsets
+        self.offsets = offsets
+        self.sizes = sizes
+        self.sync = sync
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def __repr__(self):
+        return str({
+            'samples': len(self)
+        })
+
+def _get_table(stbl, atom_types, atom_classes, required=True):
+    for atom_type in atom_types:
+        table = find_child(stbl, atom_type)
+        if table is not None:
+            # A table that fell back to a GenericAtom can't be indexed.
+            if not isinstance(table, atom_classes):
+                raise MalformedIsomFile
+            return table
+
+    if required:
+        raise MalformedIsomFile
+    return None
+
+def expand_sizes(stsz):
+    if stsz.type == 'stsz' and stsz.properties['sample_size'] != 0:
+        return new_int_array(4, [stsz.properties['sample_size']]) * stsz.properties['sample_count']
+    return stsz.properties['entry_size']
+
+def expand_decode_times(stts, sample_count):
+    decode_times = new_int_array(8)
+    time = 0
+
+    for count, delta in zip(stts.properties['sample_count'], stts.properties['sample_delta']):
+        # Each run is an arithmetic progression, so it can be expanded without a per-sample Python loop.
+        if delta:
+            decode_times.extend(range(time, time + count * delta, delta))
+        else:
+            decode_times.extend(new_int_array(8, [time]) * count)
+        time += count * delta
+
+    if len(decode_times) < sample_count:
+        raise MalformedIsomFile
+    del decode_times[sample_count:]
+
+    return decode_times
+
+def expand_composition_offsets(ctts, sample_count):
+    if ctts is None:
+        return new_int_array(8, [0], signed=True) * sample_count
+
+    composition_offsets = new_int_array(8, signed=True)
+    for count, offset in zip(ctts.properties['sample_count'], ctts.properties['sample_offset']):
+        composition_offsets.extend(new_int_array(8, [offset], signed=True) * count)
+
+    if len(composition_offsets) < sample_count:
+        raise MalformedIsomFile
+    del composition_offsets[sample_count:]
+
+    return composition_offsets
+
+def expand_offsets(stsc, chunk_offsets, sizes, uniform_size):
+    sample_count = len(sizes)
+    offsets = new_int_array(8)
+
+    first_chunks = stsc.properties['first_chunk']
+    samples_per_chunk = stsc.properties['samples_per_chunk']
+    chunk_count = len(chunk_offsets)
+
+    sample = 0
+    for run, first_chunk in enumerate(first_chunks):
+        if run + 1 < len(first_chunks):
+            last_chunk = first_chunks[run + 1] - 1
+        else:
+            last_chunk = chunk_count
+        run_samples = samples_per_chunk[run]
+
+        for chunk in range(first_chunk - 1, min(last_chunk, chunk_count)):
+            if sample >= sample_count:
+                break
+
+            offset = chunk_offsets[chunk]
+            if uniform_size:
+                offsets.extend(range(offset, offset + run_samples * uniform_size, uniform_size))
+            elif run_samples:
+                # Each sample starts where the previous one ends: a running sum over the chunk's sizes, less the last.
+                offsets.extend(accumulate(chain([offset], sizes[sample:sample + run_samples - 1])))
+            sample += run_samples
+
+    if len(offsets) < sample_count:
+        raise MalformedIsomFile
+    del offsets[sample_count:]
+
+    return offsets
+
+def expand_sync(stss, sample_count):
+    # Without an stss box every sample is a sync sample.
+    if stss is None:
+        return bytearray(b'\x01') * sample_count
+
+    sync = bytearray(sample_count)
+    for sample_number in stss.properties['sample_number']:
+        if 0 < sample_number <= sample_count:
+            sync[sample_number - 1] = 1
+
+    return sync
+
+def build_sample_index(atom):
+    """Builds a SampleIndex from a trak atom or directly from its stbl atom."""
+    stbl = atom if atom.type == 'stbl' else find_sample_table(atom)
+
+    stsz = _get_table(stbl, ['stsz', 'stz2'], (StszAtom, Stz2Atom))
+    stts = _get_table(stbl, ['stts'], SttsAtom)
+    stsc = _get_table(stbl, ['stsc'], StscAtom)
+    stco = _get_table(stbl, ['stco', 'co64'], (StcoAtom, Co64Atom))
+    ctts = _get_table(stbl, ['ctts'], CttsAtom, required=False)
+    stss = _get_table(stbl, ['stss'], StssAtom, required=False)
+
+    sizes = expand_sizes(stsz)
+    sample_count = len(sizes)
+
+    uniform_size = stsz.properties['sample_size'] if stsz.type == 'stsz' else 0
+
+    return SampleIndex(
+        expand_decode_times(stts, sample_count),
+        expand_composition_offsets(ctts, sample_count),
+        expand_offsets(stsc, stco.properties['chunk_offset'], sizes, uniform_size),
+        sizes,
+        expand_sync(stss, sample_count)
+    )
@@ -0,0 +1,157 @@
+from isomedia.atom import AtomHeader, LazyLoadAtom
+from isomedia.atom_list import WILDCARD
+from isomedia.exceptions import ParseLimitExceeded
+
+# What a parse does with an atom.
+SKIP = 0
+# Parse the atom's own fields, but only the selected parts of its children.
+DESCEND = 1
+# Parse the atom and everything in it.
+PARSE = 2
+
+class UnparsedAtom(LazyLoadAtom):
+    """An atom a Selection left unparsed. Its body is read on demand and written back unchanged."""
+    __slots__ = ()
+
+class UnparsedRegion(LazyLoadAtom):
+    """The remaining siblings in a list of atoms, left unread once a Selection found everything it was looking for.
+
+    It stands in for the atoms it covers without being one: its type is None and it is written as the original bytes.
+    """
+    __slots__ = ()
+
+    def __init__(self, document, parent_atom, file_offset, length):
+        super(UnparsedRegion, self).__init__(AtomHeader(None, length, 0), None, document, parent_atom, file_offset)
+
+    def to_bytes(self):
+        return bytes(self.get_data())
+
+def split_path(path):
+    return tuple(path.strip('/').split('/'))
+
+def path_matches(pattern, path):
+    if len(pattern) != len(path):
+        return False
+    return all(part == WILDCARD or part == atom_type for part, atom_type in zip(pattern, path))
+
+def atom_path(parent, atom_type):
+    path = [atom_type]
+    while parent is not None:
+        path.append(parent.type)
+        parent = parent.parent_atom
+
+    path.reverse()
+    return tuple(path)
+
+class Selection(object):
+    """Restricts what load() parses.
+
+    types are atom types to parse wherever they occur, and paths are paths to parse, e.g. 'moov/mvhd' ('*' matches any
+    type). A selected atom is parsed with everything in it, as are the containers on the way to it; with neither types
+    nor paths every atom is selected. Atoms nested deeper than max_depth (top-level atoms are at depth 0) are never
+    parsed.
+
+    With first_only, each type and path is only parsed once, and parsing stops as soon as all of them have been found.
+    With max_bytes, parsing raises ParseLimitExceeded rather than read more than that many bytes of the file.
+
+    Atoms that aren't parsed are kept as UnparsedAtoms, and whatever follows the point where parsing stopped as
+    UnparsedRegions, both of which are written back unchanged.
+    """
+    def __init__(self, types=None, paths=None, max_depth=None, first_only=False, max_bytes=None):
+        self.types = frozenset(types) if types is not None else None
+        self.paths = [split_path(path) for path in paths] if paths is not None else None
+        self.max_depth = max_depth
+        self.first_only = first_only
+        self.max_bytes = max_bytes
+
+    def begin(self):
+        """Returns the state of a new parse with this selection."""
+        return SelectiveParse(self)
+
+class SelectiveParse(object):
+    """Tracks a single parse with a Selection: what has been found, how deep in a selected atom the parse is and how
+    many bytes it has read."""
+    def __init__(self, selection):
+        self.selection = selection
+        self.select_all = selection.types is None and selection.paths is None
+
+        # Types and paths still being looked for; with first_only, they are removed as they are found.
+        self.pending_types = set(selection.types or ())
+        self.pending_paths = list(selection.paths or ())
+
+        self.bytes_read = 0
+        self.done = False
+        self._selected_depth = 0
+
+    @property
+    def stopped(self):
+        """Whether the rest of the file can be left unparsed. A selected atom is always parsed to its end."""
+        return self.done and self._selected_depth == 0
+
+    def wrap(self, ptr):
+        if self.selection.max_bytes is None:
+            return ptr
+        return LimitedReader(ptr, self)
+
+    def count(self, length):
+        self.bytes_read += length
+        if self.bytes_read > self.selection.max_bytes:
+            raise ParseLimitExceeded
+
+    def decide(self, path, is_container):
+        """Returns what to do with the atom at path, and the types and paths it satisfies."""
+        max_depth = self.selection.max_depth
+        if max_depth is not None and len(path) > max_depth + 1:
+            return SKIP, ()
+
+        targets = [path[-1]] if path[-1] in self.pending_types else []
+        targets.extend(pattern for pattern in self.pending_paths if path_matches(pattern, path))
+
+        if targets or self.select_all or self._selected_depth > 0:
+            return PARSE, targets
+
+        # Selected types can be anywhere below a container; selected paths only below the containers on their way.
+        if is_container and (self.pending_types or any(len(pattern) > len(path) and
+                                                       path_matches(pattern[:len(path)], path)
+                                                       for pattern in self.pending_paths)):
+            return DESCEND, ()
+
+        return SKIP, ()
+
+    def enter(self, decision):
+        if decision == PARSE:
+            self._selected_depth += 1
+
+    def leave(self, decision, targets):
+        if decision == PARSE:
+            self._selected_depth -= 1
+
+        if not self.selection.first_only or not targets:
+            return
+
+        for target in targets:
+            if target in self.pending_types:
+                self.pending_types.discard(target)
+            elif target in self.pending_paths:
+                self.pending_paths.remove(target)
+
+        if not self.pending_types and not self.pending_paths:
+            self.done = True
+
+class LimitedReader(object):
+    """Wraps a file-like object, refusing reads that would take a SelectiveParse over its byte budget."""
+    def __init__(self, ptr, parse):
+        self._ptr = ptr
+        self._parse = parse
+
+    def read(self, *args):
+        if args and args[0] is not None and args[0] >= 0:
+            self._parse.count(args[0])
+            return self._ptr.read(*args)
+
+        data = self._ptr.read(*args)
+        self._parse.count(len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._ptr, name)
@@ -0,0 +1,283 @@
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+import os
+import threading
+import time
+
+from isomedia.transfer import positional_reads, pread, preadinto, preadv_ranges, split_ranges
+
+DEFAULT_BLOCK_SIZE = 64 * 1024
+DEFAULT_MAX_BLOCKS = 1024
+# Blocks fetched past the end of a sequential read, in the same request.
+DEFAULT_READ_AHEAD = 4
+DEFAULT_PREFETCH_WORKERS = 8
+# Most blocks fetched by a single prefetch request.
+DEFAULT_PREFETCH_BLOCKS = 16
+
+class FileSource(object):
+    """A source reading from the file-like object fp.
+
+    A source is anything with read_at(offset, length), returning up to length bytes at offset (fewer only at the end),
+    and size(). Sources must be safe to read from several threads. Sources may also have readinto_at(offset, buffer)
+    and readv_at(offset, lengths), which documents use in place of read_at where present.
+
+    Real files are read with positional reads (os.pread), which neither take a lock nor move fp's position; other
+    file-like objects are sought and read under a lock.
+    """
+    def __init__(self, fp):
+        self.fp = fp
+        self._positional = positional_reads(fp)
+        self._lock = threading.Lock()
+
+    def read_at(self, offset, length):
+        if self._positional:
+            return pread(self.fp, offset, length)
+
+        with self._lock:
+            self.fp.seek(offset)
+            return self.fp.read(length)
+
+    def readinto_at(self, offset, buffer_data):
+        """Fills buffer_data with the bytes at offset, returning the number of bytes read."""
+        if self._positional:
+            return preadinto(self.fp, buffer_data, offset)
+
+        with self._lock:
+            return preadinto(self.fp, buffer_data, offset)
+
+    def readv_at(self, offset, lengths):
+        """Reads consecutive ranges of the given lengths starting at offset, returning one buffer per range. Raises
+        MalformedIsomFile if the file ends first."""
+        if self._positional:
+            buffers = preadv_ranges(self.fp.fileno(), offset, lengths)
+            if buffers is not None:
+                return buffers
+
+        return split_ranges(self.read_at(offset, sum(lengths)), lengths)
+
+    def size(self):
+        if self._positional:
+            return os.fstat(self.fp.fileno()).st_size
+
+        with self._lock:
+            position = self.fp.tell()
+            self.fp.seek(0, os.SEEK_END)
+            size = self.fp.tell()
+            self.fp.seek(position)
+            return size
+
+class LatencySource(object):
+    """Wraps a source, sleeping for latency seconds on every read, to stand in for remote storage. requests records the
+    (offset, length) of every read."""
+    def __init__(self, source, latency):
+        self.source = source
+        self.latency = latency
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def read_at(self, offset, length):
+        with self._lock:
+            self.requests.append((offset, length))
+        time.sleep(self.latency)
+        return self.source.read_at(offset, length)
+
+    def size(self):
+        return self.source.size()
+
+def block_runs(indexes, max_blocks=None):
+    """Groups sorted block indexes into (first, count) runs of consecutive blocks, of at most max_blocks each."""
+    runs = []
+    for index in indexes:
+        if runs and runs[-1][0] + runs[-1][1] == index and (max_blocks is None or runs[-1][1] < max_blocks):
+            runs[-1][1] += 1
+        else:
+            runs.append([index, 1])
+    return runs
+
+class CachingSource(object):
+    """Wraps a source with an LRU cache of up to max_blocks aligned blocks of block_size bytes, so that parsing a file
+    in high-latency storage takes a handful of range reads rather than one per header.
+
+    A read that continues the previous one also fetches the read_ahead blocks after it, in the same request. prefetch()
+    fetches a range in concurrent requests of up to prefetch_blocks blocks, using prefetch_workers threads; reads of
+    blocks being prefetched wait for them instead of fetching them again.
+
+    hits, misses and requests count the blocks read from the cache, the blocks that had to be fetched and the requests
+    made to the source. close() must be called once the source is no longer needed, to stop the prefetch threads.
+    """
+    def __init__(self, source, block_size=DEFAULT_BLOCK_SIZE, max_blocks=DEFAULT_MAX_BLOCKS,
+                 read_ahead=DEFAULT_READ_AHEAD, prefetch_workers=DEFAULT_PREFETCH_WORKERS,
+                 prefetch_blocks=DEFAULT_PREFETCH_BLOCKS):
+        self.source = source
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+        self.read_ahead = read_ahead
+        self.prefetch_workers = prefetch_workers
+        self.prefetch_blocks = prefetch_blocks
+
+        self.hits = 0
+        self.misses = 0
+        self.requests = 0
+
+        self._blocks = OrderedDict()
+        # Block index to the AsyncResult of the prefetch request fetching it.
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        self._size = None
+        self._last_block = None
+
+    def size(self):
+        if self._size is None:
+            self._size = self.source.size()
+        return self._size
+
+    def _clear_pending(self, first, count):
+        with self._lock:
+            for index in range(first, first + count):
+                self._pending.pop(index, None)
+
+    def _fetch(self, first, count):
+        """Fetches count blocks from first in one request, caches them and returns them by index."""
+        try:
+            data = self.source.read_at(first * self.block_size, count * self.block_size)
+        except Exception:
+            self._clear_pending(first, count)
+            raise
+
+        blocks = OrderedDict()
+        for index in range(first, first + count):
+            start = (index - first) * self.block_size
+            block = data[start:start + self.block_size]
+            if not block:
+                break
+            blocks[index] = block
+
+        with self._lock:
+            self.requests += 1
+            for index in range(first, first + count):
+                self._pending.pop(index, None)
+            for index, block in blocks.items():
+                self._blocks.pop(index, None)
+                self._blocks[index] = block
+            while len(self._blocks) > self.max_blocks:
+                self._blocks.popitem(last=False)
+
+        return blocks
+
+    def read_at(self, offset, length):
+        length = min(length, self.size() - offset)
+        if length <= 0:
+            return b''
+
+        first = offset // self.block_size
+        last = (offset + length - 1) // self.block_size
+
+        # Reads this large (whole payloads) would only flush the cache.
+        if last + 1 - first > max(1, self.max_blocks // 4):
+            with self._lock:
+                self.requests += 1
+            return self.source.read_at(offset, length)
+
+        found = {}
+        waiting = []
+        missing = []
+
+        with self._lock:
+            for index in range(first, last + 1):
+                block = self._blocks.pop(index, None)
+                if block is not None:
+                    self._blocks[index] = block
+                    found[index] = block
+                elif index in self._pending:
+                    waiting.append(self._pending[index])
+                else:
+                    missing.append(index)
+
+            self.hits += last + 1 - first - len(missing)
+            self.misses += len(missing)
+
+            sequential = self._last_block is not None and self._last_block <= first <= self._last_block + 1
+            self._last_block = last
+
+        runs = block_runs(missing)
+        if sequential and runs and runs[-1][0] + runs[-1][1] == last + 1:
+            end_block = (self.size() + self.block_size - 1) // self.block_size
+            runs[-1][1] = max(runs[-1][1], min(runs[-1][1] + self.read_ahead, end_block - runs[-1][0]))
+
+        for run_first, run_count in runs:
+            found.update(self._fetch(run_first, run_count))
+        for result in waiting:
+            found.update(result.get())
+
+        chunks = []
+        for index in range(first, last + 1):
+            if index not in found:
+                break
+            chunks.append(found[index])
+
+        start = offset - first * self.block_size
+        return b''.join(chunks)[start:start + length]
+
+    def prefetch(self, offset, length):
+        """Starts fetching the blocks of a range that aren't cached, in the background. Ranges that take a single request
+        are left for the read that needs them."""
+        if self.prefetch_workers <= 0 or length <= 0:
+            return
+
+        first = offset // self.block_size
+        last = min(offset + length - 1, self.size() - 1) // self.block_size
+
+        with self._lock:
+            missing = [index for index in range(first, last + 1)
+                       if index not in self._blocks and index not in self._pending]
+            runs = block_runs(missing, self.prefetch_blocks)
+            if len(runs) < 2:
+                return
+
+            if self._pool is None:
+                self._pool = ThreadPool(self.prefetch_workers)
+
+            # Registered while holding the lock, so that a request can't finish before its blocks are marked pending.
+            for run_first, run_count in runs:
+                result = self._pool.apply_async(self._fetch, (run_first, run_count))
+                for index in range(run_first, run_first + run_count):
+                    self._pending[index] = result
+
+    def close(self):
+        """Stops the prefetch threads. The wrapped source is left open."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+class SourceReader(object):
+    """A read-only file-like object over a source, for parsing. prefetch() is passed on to sources that have it."""
+    def __init__(self, source):
+        self.source = source
+        self._position = 0
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            n = max(0, self.source.size() - self._position)
+
+        data = self.source.read_at(self._position, n)
+        self._position += len(data)
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self.source.size()
+
+        self._position = offset
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def prefetch(self, offset, length):
+        prefetch = getattr(self.source, 'prefetch', None)
+        if prefetch is not None:
+            prefetch(offset, length)
@@ -0,0 +1,146 @@
+"""Optional instrumentation of parsing and writing, per atom type.
+
+Pass a ParseStats to isomedia.load (or load_path) to collect it. Nothing is measured, and nothing costs anything
+beyond a check per atom, without one.
+"""
+import time
+
+from isomedia import atom, isom_atoms
+from isomedia.atom import GenericAtom
+
+timer = getattr(time, 'perf_counter', time.time)
+
+class AtomTypeStats(object):
+    """Totals for one atom type. Figures for a container exclude those of its children, which are counted under their
+    own types."""
+    __slots__ = ('count', 'seconds', 'bytes', 'reads', 'seeks', 'fallbacks')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        self.reads = 0
+        self.seeks = 0
+        # Atoms of a known type that didn't match their specification and were parsed as a GenericAtom instead.
+        self.fallbacks = 0
+
+    def add(self, other):
+        self.count += other.count
+        self.seconds += other.seconds
+        self.bytes += other.bytes
+        self.reads += other.reads
+        self.seeks += other.seeks
+        self.fallbacks += other.fallbacks
+
+    def as_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    def __repr__(self):
+        return str(self.as_dict())
+
+class CountingReader(object):
+    """Wraps a file-like object, counting the reads, seeks and bytes read through it into a ParseStats."""
+    def __init__(self, ptr, stats):
+        self._ptr = ptr
+        self._stats = stats
+
+    def read(self, *args):
+        data = self._ptr.read(*args)
+        self._stats.reads += 1
+        self._stats.bytes_read += len(data)
+        return data
+
+    def seek(self, *args):
+        self._stats.seeks += 1
+        return self._ptr.seek(*args)
+
+    def tell(self):
+        return self._ptr.tell()
+
+    def __getattr__(self, name):
+        return getattr(self._ptr, name)
+
+def is_fallback(new_atom):
+    return type(new_atom) is GenericAtom and (new_atom.type in isom_atoms.ATOM_TYPE_TO_CLASS or
+                                              new_atom.type in atom.CONTAINER_ATOMS)
+
+class ParseStats(object):
+    """Counts, times and I/O of the atoms parsed and written by a document, by atom type.
+
+    parsed and written map atom types to AtomTypeStats. For writes, bytes are the bytes output and reads/seeks aren't
+    counted. callback, if given, is called as callback(event, atom_type, atom_stats) for every atom measured, where event
+    is 'parse' or 'write' and atom_stats (an AtomTypeStats) holds that atom's figures alone.
+    """
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.parsed = {}
+        self.written = {}
+
+        # Running totals for everything read through readers from wrap().
+        self.reads = 0
+        self.seeks = 0
+        self.bytes_read = 0
+
+        # Totals of the children measured so far for each atom being measured, innermost last.
+        self._children = []
+
+    def wrap(self, ptr):
+        return CountingReader(ptr, self)
+
+    def _record(self, totals, event, atom_type, measured):
+        type_stats = totals.get(atom_type)
+        if type_stats is None:
+            type_stats = totals[atom_type] = AtomTypeStats()
+        type_stats.add(measured)
+
+        if self.callback is not None:
+            self.callback(event, atom_type, measured)
+
+    def _measure(self, function, args):
+        """Calls function(*args) and returns (its result, its AtomTypeStats, less those of atoms measured within it)."""
+        children = AtomTypeStats()
+        self._children.append(children)
+
+        start_time = timer()
+        start_reads, start_seeks, start_bytes = self.reads, self.seeks, self.bytes_read
+        try:
+            result = function(*args)
+        finally:
+            self._children.pop()
+
+        measured = AtomTypeStats()
+        measured.count = 1
+        measured.seconds = timer() - start_time
+        measured.reads = self.reads - start_reads
+        measured.seeks = self.seeks - start_seeks
+        measured.bytes = self.bytes_read - start_bytes
+
+        # The enclosing atom's figures exclude this one's.
+        if self._children:
+            self._children[-1].add(measured)
+
+        measured.seconds -= children.seconds
+        measured.reads -= children.reads
+        measured.seeks -= children.seeks
+        measured.bytes -= children.bytes
+
+        return result, measured
+
+    def measure_parse(self, parse_function, ptr, offset, document, parent, eager, selection=None):
+        (new_atom, atom_size), measured = self._measure(parse_function,
+                                                        (ptr, offset, document, parent, eager, self, selection))
+
+        measured.fallbacks = int(is_fallback(new_atom))
+        self._record(self.parsed, 'parse', new_atom.type, measured)
+        return new_atom, atom_size
+
+    def measure_write(self, write_function, atom_to_write, output):
+        """Measures write_function(atom_to_write, output), which writes the atom (and its children) to output."""
+        _, measured = self._measure(write_function, (atom_to_write, output))
+
+        # Output isn't counted by a reader: an atom's own bytes are its size, less any children written separately.
+        measured.bytes = atom_to_write.size
+        if isinstance(atom_to_write, atom.ContainerMixin) and atom_to_write.children_loaded():
+            measured.bytes -= sum(child.size for child in atom_to_write.children)
+
+        self._record(self.written, 'write', atom_to_write.type, measured)
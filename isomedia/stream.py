@@ -0,0 +1,185 @@
+from io import BytesIO
+
+from isomedia import isom_atoms
+from isomedia.atom import EXTENDED_HEADER_LENGTH, STANDARD_HEADER_LENGTH, AtomHeader, interpret_int32
+from isomedia.atom_list import AtomList, find, find_all
+from isomedia.exceptions import MalformedIsomFile, ParseLimitExceeded
+from isomedia.parser import interpret_atom_header, parse_atom
+
+DEFAULT_MAX_BUFFER_SIZE = 64 * 1024 * 1024
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+class AtomBuffer(object):
+    """Stands in for the document of an atom parsed from a complete, buffered copy of its bytes."""
+    def __init__(self, data, offset):
+        self.data = data
+        self.offset = offset
+
+    def read_range(self, offset, length):
+        start = offset - self.offset
+        return self.data[start:start + length]
+
+    # The whole atom is in memory already, so there is nothing to cache.
+    read_payload = read_range
+
+class StreamedPayload(object):
+    """Stands in for the document of atoms whose payload was passed through rather than kept."""
+    def read_range(self, offset, length):
+        raise IOError('The payload of a streamed atom is not kept.')
+
+    read_payload = read_range
+
+STREAMED_PAYLOAD = StreamedPayload()
+
+class StreamedFile(object):
+    """The top-level atoms of a parsed stream. Streamed payloads aren't kept, so unlike ISOBaseMediaFile it can't be
+    written back out."""
+    def __init__(self, atoms):
+        self.atoms = AtomList(atoms)
+
+    def find(self, path):
+        return find(self.atoms, path)
+
+    def find_all(self, path):
+        return find_all(self.atoms, path)
+
+    def __repr__(self):
+        return str(self.atoms)
+
+def is_payload_type(atom_type):
+    atom_class = isom_atoms.ATOM_TYPE_TO_CLASS.get(atom_type)
+    return atom_class is not None and not atom_class.LOAD_DATA
+
+def header_length_needed(data):
+    """Returns how many bytes the header starting data is, given at least its first 8 bytes."""
+    if interpret_int32(bytes(data[0:4])) == 1:
+        return EXTENDED_HEADER_LENGTH
+    return STANDARD_HEADER_LENGTH
+
+def read_stream_header(data):
+    atom_type, atom_size, header_length = interpret_atom_header(bytes(data[0:EXTENDED_HEADER_LENGTH]))
+    if atom_size < header_length:
+        raise MalformedIsomFile
+
+    return (atom_type, atom_size, header_length)
+
+def new_streamed_atom(atom_header, offset):
+    """Creates a payload atom whose body is being passed through, from its header alone."""
+    atom_class = isom_atoms.ATOM_TYPE_TO_CLASS[atom_header.type]
+    return atom_class(atom_header, None, STREAMED_PAYLOAD, None, offset)
+
+def parse_complete_atom(data, offset):
+    """Parses an atom, and all of its children, from data holding exactly its bytes."""
+    new_atom, _ = parse_atom(BytesIO(data), offset, document=AtomBuffer(data, offset), eager=True)
+    return new_atom
+
+class StreamParser(object):
+    """Parses top-level atoms incrementally from bytes pushed in with feed(), for streams that can't be seeked.
+
+    Atoms are returned as soon as all of their bytes have arrived. At most max_buffer_size bytes of any one atom are
+    held; a larger atom raises ParseLimitExceeded. With stream_payloads, the bodies of payload atoms (mdat, free, skip)
+    are never buffered: each piece is passed to on_payload(atom, data) as it arrives (or dropped if on_payload is None)
+    and the atom is returned once its body has gone by, without its data.
+    """
+    def __init__(self, max_buffer_size=DEFAULT_MAX_BUFFER_SIZE, stream_payloads=False, on_payload=None):
+        self.max_buffer_size = max_buffer_size
+        self.stream_payloads = stream_payloads
+        self.on_payload = on_payload
+
+        self._buffer = bytearray()
+        # Stream offset of the first byte in _buffer.
+        self._offset = 0
+        self._header = None
+        self._streaming_atom = None
+        self._streaming_remaining = 0
+
+    def _read_header(self):
+        if len(self._buffer) < STANDARD_HEADER_LENGTH or len(self._buffer) < header_length_needed(self._buffer):
+            return None
+        return read_stream_header(self._buffer)
+
+    def _consume(self, length):
+        data = bytes(self._buffer[:length])
+        del self._buffer[:length]
+        self._offset += length
+        return data
+
+    def _start_streaming(self):
+        atom_type, atom_size, header_length = self._header
+
+        self._streaming_atom = new_streamed_atom(AtomHeader(atom_type, atom_size, header_length), self._offset)
+        self._streaming_remaining = atom_size - header_length
+        self._consume(header_length)
+
+    def _stream_payload(self):
+        data = self._consume(min(self._streaming_remaining, len(self._buffer)))
+        self._streaming_remaining -= len(data)
+
+        if data and self.on_payload is not None:
+            self.on_payload(self._streaming_atom, data)
+
+        if self._streaming_remaining > 0:
+            return None
+
+        atom = self._streaming_atom
+        self._streaming_atom = None
+        self._header = None
+        return atom
+
+    def _parse_buffered(self):
+        atom_size = self._header[1]
+        if len(self._buffer) < atom_size:
+            return None
+
+        offset = self._offset
+        data = self._consume(atom_size)
+        self._header = None
+
+        return parse_complete_atom(data, offset)
+
+    def feed(self, data):
+        """Adds the next bytes of the stream and returns the list of top-level atoms they completed."""
+        self._buffer.extend(data)
+        atoms = []
+
+        while True:
+            if self._header is None:
+                self._header = self._read_header()
+                if self._header is None:
+                    break
+
+                atom_type, atom_size, header_length = self._header
+                if self.stream_payloads and is_payload_type(atom_type):
+                    self._start_streaming()
+                elif atom_size > self.max_buffer_size:
+                    raise ParseLimitExceeded
+
+            if self._streaming_atom is not None:
+                new_atom = self._stream_payload()
+            else:
+                new_atom = self._parse_buffered()
+
+            if new_atom is None:
+                break
+            atoms.append(new_atom)
+
+        return atoms
+
+    def close(self):
+        """Signals the end of the stream, which must not end part way through an atom."""
+        if self._buffer or self._header is not None:
+            raise MalformedIsomFile
+
+def iter_atoms(fp, chunk_size=DEFAULT_CHUNK_SIZE, **kwargs):
+    """Yields top-level atoms from fp, which only needs a read() method, as each one completes."""
+    parser = StreamParser(**kwargs)
+
+    while True:
+        data = fp.read(chunk_size)
+        if not data:
+            break
+
+        for new_atom in parser.feed(data):
+            yield new_atom
+
+    parser.close()
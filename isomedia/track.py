@@ -0,0 +1,72 @@
+from bisect import bisect_right
+
+from isomedia.exceptions import MalformedIsomFile
+from isomedia.sample_index import build_sample_index
+
+# Largest single read that read_samples merges adjacent samples into.
+MAX_COALESCED_READ = 16 * 1024 * 1024
+
+class Track(object):
+    """Random access to the samples of one trak, through a SampleIndex built when the Track is created.
+
+    Samples are returned as buffer-protocol objects (bytes, bytearray or a view into a mapped file); use bytes() for a
+    copy. Samples that lie past the end of the file raise MalformedIsomFile.
+    """
+    def __init__(self, trak):
+        self.trak = trak
+        self.document = trak.document
+        self.index = build_sample_index(trak)
+
+    def __len__(self):
+        return len(self.index)
+
+    def read_sample(self, sample):
+        """Returns the bytes of the sample with the given (zero-based) number."""
+        size = self.index.sizes[sample]
+        data = self.document.read_range(self.index.offsets[sample], size)
+        if len(data) != size:
+            raise MalformedIsomFile
+        return data
+
+    def read_samples(self, samples):
+        """Returns the bytes of each of the given samples, e.g. a range of sample numbers, in the same order.
+
+        Runs of samples that lie next to each other in the file are read together, with one read per run.
+        """
+        offsets = self.index.offsets
+        sizes = self.index.sizes
+
+        results = []
+        run = []
+        run_end = None
+        run_length = 0
+
+        for sample in samples:
+            offset = offsets[sample]
+            size = sizes[sample]
+
+            if run and (offset != run_end or run_length + size > MAX_COALESCED_READ):
+                results.extend(self.document.read_ranges(offsets[run[0]], [sizes[index] for index in run]))
+                run = []
+                run_length = 0
+
+            run.append(sample)
+            run_end = offset + size
+            run_length += size
+
+        if run:
+            results.extend(self.document.read_ranges(offsets[run[0]], [sizes[index] for index in run]))
+
+        return results
+
+    def sample_at(self, time):
+        """Returns the number of the sample being decoded at time, in the track's timescale: the last sample whose decode
+        time is at or before it. Raises IndexError if time is before the first sample."""
+        sample = bisect_right(self.index.decode_times, time) - 1
+        if sample < 0 or len(self.index) == 0:
+            raise IndexError(time)
+        return sample
+
+def tracks(document):
+    """Returns a Track for every trak in the document's moov."""
+    return [Track(trak) for trak in document.find_all('moov/trak')]
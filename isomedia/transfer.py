@@ -0,0 +1,212 @@
+import errno
+import os
+
+from isomedia.exceptions import MalformedIsomFile
+from isomedia.mapping import make_view
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Largest count handed to a single copy_file_range/sendfile call.
+MAX_KERNEL_COPY = 1024 * 1024 * 1024
+
+# Errors meaning the kernel can't copy between these two descriptors, rather than that the copy failed.
+KERNEL_COPY_UNSUPPORTED = set([errno.EINVAL, errno.ENOSYS, errno.EXDEV, errno.EBADF, errno.ESPIPE,
+                               getattr(errno, 'EOPNOTSUPP', errno.EINVAL), getattr(errno, 'ENOTSUP', errno.EINVAL)])
+
+def _copy_file_range(src_fd, dst_fd, offset, count):
+    return os.copy_file_range(src_fd, dst_fd, count, offset)
+
+def _sendfile(src_fd, dst_fd, offset, count):
+    return os.sendfile(dst_fd, src_fd, offset, count)
+
+KERNEL_COPIES = [function for name, function in [('copy_file_range', _copy_file_range), ('sendfile', _sendfile)]
+                 if hasattr(os, name)]
+
+def get_fileno(fp):
+    try:
+        return fp.fileno()
+    except (AttributeError, EnvironmentError, ValueError):
+        return None
+
+def kernel_copy(src_fd, dst_fd, offset, length):
+    """Copies from src_fd at offset to dst_fd's current position without passing the bytes through Python.
+
+    Returns the number of bytes copied, which is less than length (possibly 0) if the kernel can't copy between these
+    descriptors or the source ends early.
+    """
+    copied = 0
+
+    for function in KERNEL_COPIES:
+        try:
+            while copied < length:
+                count = function(src_fd, dst_fd, offset + copied, min(length - copied, MAX_KERNEL_COPY))
+                if count == 0:
+                    return copied
+                copied += count
+            return copied
+        except OSError as e:
+            if e.errno not in KERNEL_COPY_UNSUPPORTED:
+                raise
+
+    return copied
+
+def positional_reads(fp):
+    """Whether fp can be read at an offset without seeking it, so that several threads can read it at once."""
+    return hasattr(os, 'pread') and get_fileno(fp) is not None
+
+def pread(fp, offset, length):
+    """Reads up to length bytes of fp at offset, fewer only at the end of the file, without moving (or depending on)
+    fp's position where the platform allows it."""
+    if not positional_reads(fp):
+        fp.seek(offset)
+        return fp.read(length)
+
+    fileno = fp.fileno()
+    chunks = []
+    while length > 0:
+        chunk = os.pread(fileno, length, offset)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        offset += len(chunk)
+        length -= len(chunk)
+
+    return chunks[0] if len(chunks) == 1 else b''.join(chunks)
+
+def preadinto(fp, buffer_data, offset):
+    """Fills buffer_data with the bytes of fp at offset, like pread, returning the number of bytes read."""
+    target = memoryview(buffer_data)
+    if not positional_reads(fp):
+        fp.seek(offset)
+        readinto = getattr(fp, 'readinto', None)
+        if readinto is not None:
+            return readinto(target) or 0
+        data = fp.read(len(target))
+        target[:len(data)] = data
+        return len(data)
+
+    fileno = fp.fileno()
+    count = 0
+    while count < len(target):
+        if hasattr(os, 'preadv'):
+            read = os.preadv(fileno, [target[count:]], offset + count)
+        else:
+            data = os.pread(fileno, len(target) - count, offset + count)
+            read = len(data)
+            target[count:count + read] = data
+        if not read:
+            break
+        count += read
+
+    return count
+
+# Most buffers a single preadv call accepts.
+try:
+    MAX_IOVECS = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    MAX_IOVECS = 1024
+if MAX_IOVECS <= 0:
+    MAX_IOVECS = 1024
+
+def preadv_ranges(fd, offset, lengths):
+    """Reads consecutive ranges of the given lengths from fd, starting at offset, into one new buffer each, with as
+    few system calls as possible. Returns None if os.preadv isn't available."""
+    if not hasattr(os, 'preadv'):
+        return None
+
+    buffers = [bytearray(length) for length in lengths]
+
+    for start in range(0, len(buffers), MAX_IOVECS):
+        batch = buffers[start:start + MAX_IOVECS]
+        wanted = sum(len(buffer_data) for buffer_data in batch)
+
+        # Reads from regular files only come up short at the end of the file.
+        if os.preadv(fd, batch, offset) != wanted:
+            raise MalformedIsomFile
+        offset += wanted
+
+    return buffers
+
+def split_ranges(data, lengths):
+    """Splits data into views of consecutive ranges of the given lengths, raising MalformedIsomFile if it is short."""
+    if len(data) != sum(lengths):
+        raise MalformedIsomFile
+
+    buffers = []
+    position = 0
+    for length in lengths:
+        buffers.append(make_view(data, position, length))
+        position += length
+    return buffers
+
+def buffered_copy(src, dst, offset, length):
+    buffer_data = bytearray(min(length, COPY_BUFFER_SIZE))
+    target = memoryview(buffer_data)
+
+    while length > 0:
+        wanted = min(length, len(buffer_data))
+        count = preadinto(src, target[:wanted], offset)
+        if not count:
+            raise MalformedIsomFile
+
+        dst.write(make_view(buffer_data, 0, count))
+        offset += count
+        length -= count
+
+def copy_range(src, dst, offset, length):
+    """Copies length bytes of src starting at offset to dst's current position.
+
+    When both ends are real files the copy is done by the kernel (copy_file_range, then sendfile), otherwise through a
+    single large reusable buffer, as it is for destinations that can't be positioned such as pipes. Either way src is
+    read at offset rather than from its position, where the platform allows it.
+    """
+    src_fd = get_fileno(src)
+    dst_fd = get_fileno(dst)
+
+    position = None
+    if KERNEL_COPIES and src_fd is not None and dst_fd is not None:
+        dst.flush()
+        try:
+            position = dst.tell()
+            os.lseek(dst_fd, position, os.SEEK_SET)
+        except (IOError, OSError):
+            position = None
+
+    if position is not None:
+        copied = kernel_copy(src_fd, dst_fd, offset, length)
+
+        # Resynchronise the file object with the descriptor the kernel wrote through.
+        dst.seek(position + copied)
+        offset += copied
+        length -= copied
+
+    if length > 0:
+        buffered_copy(src, dst, offset, length)
+
+class RangeWriter(object):
+    """Writes to fp, merging copies of adjacent source ranges into a single range copy.
+
+    copy_function(offset, length, fp) performs the actual copy of a source range.
+    """
+    def __init__(self, fp, copy_function):
+        self.fp = fp
+        self._copy_function = copy_function
+        self._pending = None
+
+    def write(self, data):
+        self.flush()
+        self.fp.write(data)
+
+    def copy(self, offset, length):
+        if self._pending is not None and self._pending[0] + self._pending[1] == offset:
+            self._pending[1] += length
+            return
+
+        self.flush()
+        self._pending = [offset, length]
+
+    def flush(self):
+        if self._pending is not None:
+            offset, length = self._pending
+            self._pending = None
+            self._copy_function(offset, length, self.fp)
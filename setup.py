@@ -11,6 +11,9 @@ setup(
     url='https://github.com/flxf/isomedia',
     packages=find_packages(exclude=['tests']),
     install_requires=[],
+    entry_points={
+        'console_scripts': ['isomedia-inspect = isomedia.batch:main'],
+    },
 
     keywords=['mp4', 'isom'],
 )
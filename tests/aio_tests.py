@@ -0,0 +1,75 @@
+import os
+import unittest
+
+import isomedia
+from isomedia.compat import PY3
+from isomedia.exceptions import MalformedIsomFile
+
+if PY3:
+    import asyncio
+    from isomedia.aio import iter_atoms
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+class ReadOnly(object):
+    """Exposes nothing but the reader's coroutine read(), like an async file object."""
+    def __init__(self, reader):
+        self.read = reader.read
+
+@unittest.skipUnless(PY3, 'asyncio parsing needs Python 3')
+class TestAsyncParsing(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def make_reader(self, data):
+        reader = asyncio.StreamReader(loop=self.loop)
+        reader.feed_data(data)
+        reader.feed_eof()
+        return reader
+
+    def read_testdata(self, filename):
+        with open(os.path.join(TESTDATA, filename), 'rb') as infile:
+            return infile.read()
+
+    def test_aload(self):
+        data = self.read_testdata('meta_with_children.mp4')
+        with open(os.path.join(TESTDATA, 'meta_with_children.mp4'), 'rb') as infile:
+            expected = isomedia.load(infile, eager=True)
+            expected_moov = [atom for atom in expected.atoms if atom.type == 'moov'][0]
+
+            for reader in [self.make_reader(data), ReadOnly(self.make_reader(data))]:
+                isofile = self.loop.run_until_complete(isomedia.aload(reader))
+
+                self.assertEqual([atom.type for atom in isofile.atoms], [atom.type for atom in expected.atoms])
+                moov = [atom for atom in isofile.atoms if atom.type == 'moov'][0]
+                self.assertEqual(moov.to_bytes(), expected_moov.to_bytes())
+
+    def test_payloads_streamed(self):
+        data = self.read_testdata('loop_circle.mp4')
+        payload_length = [0]
+
+        def on_payload(atom, chunk):
+            payload_length[0] += len(chunk)
+
+        atoms = []
+        iterator = iter_atoms(self.make_reader(data), max_buffer_size=64 * 1024, on_payload=on_payload)
+        while True:
+            try:
+                atoms.append(self.loop.run_until_complete(iterator.__anext__()))
+            except StopAsyncIteration:
+                break
+
+        mdat = [atom for atom in atoms if atom.type == 'mdat'][0]
+        self.assertEqual(payload_length[0], mdat.size - mdat.header_length)
+        self.assertEqual(sum(atom.size for atom in atoms), len(data))
+
+    def test_truncated_stream(self):
+        data = self.read_testdata('loop_circle.mp4')
+        with self.assertRaises(MalformedIsomFile):
+            self.loop.run_until_complete(isomedia.aload(self.make_reader(data[:-1])))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import json
+import multiprocessing
+import os
+import time
+import unittest
+
+import isomedia.batch
+from isomedia.batch import inspect_files, main, summarize
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+class Output(object):
+    def __init__(self):
+        self.lines = []
+
+    def write(self, data):
+        self.lines.append(data)
+
+    def flush(self):
+        pass
+
+def dying_summarize(path):
+    if os.path.basename(path) == 'guitar.mp4':
+        os._exit(1)
+    return summarize(path)
+
+def interrupted_summarize(path):
+    if os.path.basename(path) == 'guitar.mp4':
+        raise KeyboardInterrupt('interrupted')
+    return summarize(path)
+
+def slow_summarize(path):
+    time.sleep(0.5)
+    return summarize(path)
+
+class TestBatch(unittest.TestCase):
+    def test_summarize(self):
+        summary = summarize(os.path.join(TESTDATA, 'loop_circle.mp4'))
+
+        self.assertEqual([entry[0] for entry in summary['layout']], ['ftyp', 'wide', 'mdat', 'moov'])
+        self.assertEqual(summary['major_brand'], 'mp42')
+        self.assertEqual(summary['timescale'], 44100)
+        self.assertEqual([track['sample_count'] for track in summary['tracks']], [74, 109])
+        self.assertFalse('error' in summary)
+
+    def test_errors_reported(self):
+        summary = summarize(os.path.join(TESTDATA, 'missing.mp4'))
+        self.assertEqual(summary['error']['type'], 'IOError' if str is bytes else 'FileNotFoundError')
+
+    def test_inspect_directory(self):
+        summaries = list(inspect_files([TESTDATA], processes=2))
+
+        self.assertEqual(sorted(os.path.basename(summary['path']) for summary in summaries),
+                         sorted(os.listdir(TESTDATA)))
+
+    def check_failing_worker(self, summarize_function, error_type):
+        # Workers are forked after the patch, so they run the replacement.
+        original = isomedia.batch.summarize
+        isomedia.batch.summarize = summarize_function
+        try:
+            paths = [os.path.join(TESTDATA, name) for name in ['loop_circle.mp4', 'guitar.mp4', 'loop_circle.mp4']]
+            summaries = list(inspect_files(paths, processes=1))
+        finally:
+            isomedia.batch.summarize = original
+
+        self.assertEqual(sorted(os.path.basename(summary['path']) for summary in summaries),
+                         ['guitar.mp4', 'loop_circle.mp4', 'loop_circle.mp4'])
+        errors = [summary['error']['type'] for summary in summaries if 'error' in summary]
+        self.assertEqual(errors, [error_type])
+
+    def test_unrelated_child_exits(self):
+        # A child of this process that isn't one of the pool's workers exits while the files are inspected.
+        child = multiprocessing.Process(target=time.sleep, args=(0.1,))
+        original = isomedia.batch.summarize, isomedia.batch.POLL_INTERVAL
+        isomedia.batch.summarize, isomedia.batch.POLL_INTERVAL = slow_summarize, 0.05
+        child.start()
+        try:
+            summaries = list(inspect_files([os.path.join(TESTDATA, 'loop_circle.mp4')], processes=1))
+        finally:
+            isomedia.batch.summarize, isomedia.batch.POLL_INTERVAL = original
+            child.join()
+
+        self.assertFalse('error' in summaries[0])
+
+    def test_worker_raises(self):
+        self.check_failing_worker(interrupted_summarize, 'KeyboardInterrupt')
+
+    def test_worker_dies(self):
+        self.check_failing_worker(dying_summarize, 'WorkerDied')
+
+    def test_main(self):
+        stdout = Output()
+        stdin = [os.path.join(TESTDATA, 'guitar.mp4') + '\n']
+        main(['--stdin', '-j', '1', os.path.join(TESTDATA, 'loop_circle.mp4')], stdin=stdin, stdout=stdout)
+
+        summaries = [json.loads(line) for line in stdout.lines]
+        self.assertEqual(sorted(os.path.basename(summary['path']) for summary in summaries),
+                         ['guitar.mp4', 'loop_circle.mp4'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+from io import BytesIO
+import os
+import random
+import unittest
+
+import isomedia
+from isomedia.block_reader import BlockReader
+from isomedia.stats import ParseStats
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+class TestBlockReader(unittest.TestCase):
+    def test_matches_file(self):
+        data = bytes(bytearray(random.Random(1).randrange(256) for _ in range(10000)))
+        expected = BytesIO(data)
+        reader = BlockReader(BytesIO(data), block_size=512)
+
+        rng = random.Random(2)
+        for _ in range(2000):
+            if rng.random() < 0.3:
+                offset = rng.randrange(len(data) + 10)
+                self.assertEqual(reader.seek(offset), expected.seek(offset))
+            elif rng.random() < 0.1:
+                self.assertEqual(reader.seek(rng.randrange(-100, 100), os.SEEK_CUR) >= 0, True)
+                expected.seek(reader.tell())
+            else:
+                n = rng.choice([4, 8, 16, 100, 511, 512, 1500])
+                self.assertEqual(reader.read(n), expected.read(n))
+            self.assertEqual(reader.tell(), expected.tell())
+
+        self.assertEqual(reader.seek(-10, os.SEEK_END), len(data) - 10)
+        self.assertEqual(reader.read(), data[-10:])
+
+    def test_fewer_reads(self):
+        mp4filename = os.path.join(TESTDATA, 'meta_with_children.mp4')
+
+        with open(mp4filename, 'rb') as infile:
+            unbuffered_stats = ParseStats()
+            unbuffered = isomedia.load(infile, eager=True, stats=unbuffered_stats, block_size=None)
+
+            buffered_stats = ParseStats()
+            buffered = isomedia.load(infile, eager=True, stats=buffered_stats)
+
+            self.assertEqual([atom.to_bytes() for atom in buffered.atoms if atom.type != 'mdat'],
+                             [atom.to_bytes() for atom in unbuffered.atoms if atom.type != 'mdat'])
+            self.assertTrue(buffered_stats.reads * 10 < unbuffered_stats.reads)
+            self.assertTrue(buffered_stats.seeks < unbuffered_stats.seeks)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import filecmp
+import os
+import shutil
+import tempfile
+import unittest
+
+import isomedia
+from isomedia.cache import ParseCache
+from isomedia.stats import ParseStats
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+class CountingCache(ParseCache):
+    def __init__(self, directory, max_size):
+        super(CountingCache, self).__init__(directory, max_size)
+        self.hits = 0
+
+    def lookup(self, identity):
+        entry = super(CountingCache, self).lookup(identity)
+        if entry is not None:
+            self.hits += 1
+        return entry
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = CountingCache(os.path.join(self.directory, 'cache'), 1024 * 1024)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def copy_testdata(self, filename):
+        path = os.path.join(self.directory, filename)
+        shutil.copyfile(os.path.join(TESTDATA, filename), path)
+        return path
+
+    def test_rebuilt_from_cache(self):
+        path = self.copy_testdata('meta_with_children.mp4')
+
+        with open(path, 'rb') as infile:
+            expected = isomedia.load(infile, eager=True)
+            expected_bytes = [atom.to_bytes() for atom in expected.atoms]
+
+            isomedia.load(infile, cache=self.cache)
+            self.assertEqual(self.cache.hits, 0)
+
+            isofile = isomedia.load(infile, cache=self.cache)
+            self.assertEqual(self.cache.hits, 1)
+
+            # Nothing is parsed from the file.
+            stats = ParseStats()
+            isofile = isomedia.load(infile, cache=self.cache, stats=stats)
+            self.assertTrue(isofile.find('moov/trak/mdia/minf/stbl/stsz') is not None)
+            self.assertEqual((stats.reads, stats.bytes_read), (0, 0))
+
+            self.assertEqual([atom.to_bytes() for atom in isofile.atoms], expected_bytes)
+            self.assertEqual(isofile.find('moov/udta/meta/hdlr')._input_file_offset,
+                             expected.find('moov/udta/meta/hdlr')._input_file_offset)
+
+            outpath = os.path.join(self.directory, 'out.mp4')
+            with open(outpath, 'wb') as outfile:
+                isofile.write(outfile)
+        self.assertTrue(filecmp.cmp(path, outpath))
+
+    def test_changed_file_misses(self):
+        path = self.copy_testdata('guitar.mp4')
+
+        with open(path, 'r+b') as isofp:
+            isomedia.load(isofp, cache=self.cache)
+
+            stat = os.stat(path)
+            isofile = isomedia.load(isofp, cache=self.cache)
+            self.assertEqual(self.cache.hits, 1)
+            isofile.find('moov/mvhd').properties['duration'] = 424242
+            isofile.save_in_place()
+
+        # The edit keeps the file's size; on a filesystem with coarse timestamps it keeps its modification time too.
+        if hasattr(stat, 'st_mtime_ns'):
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        else:
+            os.utime(path, (stat.st_atime, stat.st_mtime))
+
+        isofile = isomedia.load_path(path, cache=self.cache)
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(isofile.find('moov/mvhd').properties['duration'], 424242)
+        isofile.close()
+
+    def test_eviction(self):
+        self.cache.max_size = 10000
+        for age, filename in [(100, 'loop_circle.mp4'), (0, 'guitar.mp4')]:
+            path = self.copy_testdata(filename)
+            with open(path, 'rb') as infile:
+                isomedia.load(infile, cache=self.cache)
+
+            # Age the entry so that eviction order doesn't depend on timestamp resolution.
+            for name in os.listdir(self.cache.directory):
+                entry_path = os.path.join(self.cache.directory, name)
+                stat = os.stat(entry_path)
+                os.utime(entry_path, (stat.st_atime - age, stat.st_mtime - age))
+
+        entries = os.listdir(self.cache.directory)
+        self.assertEqual(len(entries), 1)
+
+        with open(os.path.join(self.directory, 'guitar.mp4'), 'rb') as infile:
+            isomedia.load(infile, cache=self.cache)
+        self.assertEqual(self.cache.hits, 1)
+
+if __name__ == '__main__':
+    unittest.main()
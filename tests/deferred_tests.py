@@ -0,0 +1,56 @@
+import filecmp
+from io import BytesIO
+import os
+import tempfile
+import unittest
+
+import isomedia
+from isomedia.exceptions import MalformedIsomFile
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+# A moov whose only child claims to be larger than the moov itself.
+BROKEN_CHILD = b'\x00\x00\x00\x14moov' + b'\x00\x00\x00\x20free' + b'\x00' * 4
+
+class TestDeferredParsing(unittest.TestCase):
+    def test_children_parsed_on_access(self):
+        mp4filename = os.path.join(TESTDATA, 'meta_with_children.mp4')
+
+        with open(mp4filename, 'rb') as infile:
+            isofile = isomedia.load(infile)
+
+            moov = [atom for atom in isofile.atoms if atom.type == 'moov'][0]
+            self.assertFalse(moov.children_loaded())
+
+            udta = [atom for atom in moov.children if atom.type == 'udta'][0]
+            self.assertTrue(moov.children_loaded())
+            self.assertFalse(udta.children_loaded())
+
+            meta = [atom for atom in udta.children if atom.type == 'meta'][0]
+            hdlr = [atom for atom in meta.children if atom.type == 'hdlr'][0]
+
+            # Children of atoms with their own fields start after those fields.
+            infile.seek(hdlr._input_file_offset + 4)
+            self.assertEqual(infile.read(4), b'hdlr')
+
+    def test_eager_validation(self):
+        isofile = isomedia.load(BytesIO(BROKEN_CHILD))
+        with self.assertRaises(MalformedIsomFile):
+            isofile.atoms[0].children
+
+        with self.assertRaises(MalformedIsomFile):
+            isomedia.load(BytesIO(BROKEN_CHILD), eager=True)
+
+    def test_lossless_write_eager(self):
+        mp4filename = os.path.join(TESTDATA, 'meta_with_children.mp4')
+
+        with open(mp4filename, 'rb') as infile, tempfile.NamedTemporaryFile(delete=False) as outfile:
+            isofile = isomedia.load(infile, eager=True)
+            isofile.write(outfile)
+
+        self.assertTrue(filecmp.cmp(infile.name, outfile.name))
+
+        os.remove(outfile.name)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+from io import BytesIO
+import unittest
+
+from isomedia.atom import AtomHeader, compile_definition, interpret_atom, write_atom
+from isomedia.exceptions import AtomSpecificationError
+
+DEFINITION = [
+    ('version', (1, int)),
+    ('flags', (3, None)),
+    ('pair', (list, (2, int), 2)),
+    ('entries', (list, (4, int), None))
+]
+
+class TestDefinitions(unittest.TestCase):
+    def test_round_trip(self):
+        body = b'\x01' + b'\x00\x00\x02' + b'\x00\x03\x00\x04' + b'\x00\x00\x00\x05\x00\x00\x00\x06'
+        header = AtomHeader('test', 8 + len(body), 8)
+
+        properties = interpret_atom(header, BytesIO(body), DEFINITION)
+
+        self.assertEqual(properties, {
+            'version': 1,
+            'flags': b'\x00\x00\x02',
+            'pair': [3, 4],
+            'entries': [5, 6]
+        })
+        self.assertEqual(write_atom(properties, DEFINITION), body)
+        self.assertTrue(compile_definition(list(DEFINITION)) is compile_definition(DEFINITION))
+
+    def test_partial_trailing_item(self):
+        body = b'\x01' + b'\x00\x00\x02' + b'\x00\x03\x00\x04' + b'\x00\x00\x00'
+        header = AtomHeader('test', 8 + len(body), 8)
+
+        with self.assertRaises(AtomSpecificationError):
+            interpret_atom(header, BytesIO(body), DEFINITION)
+
+if __name__ == '__main__':
+    unittest.main()
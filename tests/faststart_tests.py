@@ -0,0 +1,83 @@
+import os
+from io import BytesIO
+import unittest
+
+import isomedia
+from isomedia.atom import new_int_array
+from isomedia.faststart import OffsetMap, chunk_offset_tables, promote_to_co64
+from isomedia.isom_atoms import Co64Atom
+from isomedia.sample_index import build_sample_index
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+def sample_data(isofile, fp):
+    moov = [atom for atom in isofile.atoms if atom.type == 'moov'][0]
+
+    samples = []
+    for trak in [atom for atom in moov.children if atom.type == 'trak']:
+        index = build_sample_index(trak)
+        for offset, size in zip(index.offsets, index.sizes):
+            fp.seek(offset)
+            samples.append(fp.read(size))
+    return samples
+
+class TestFaststart(unittest.TestCase):
+    def test_moov_moved_before_mdat(self):
+        mp4filename = os.path.join(TESTDATA, 'guitar.mp4')
+        outfile = BytesIO()
+
+        with open(mp4filename, 'rb') as infile:
+            self.assertTrue(isomedia.faststart(infile, outfile))
+
+            infile.seek(0)
+            expected_samples = sample_data(isomedia.load(infile), infile)
+
+        outfile.seek(0)
+        isofile = isomedia.load(outfile)
+
+        self.assertEqual([atom.type for atom in isofile.atoms], ['ftyp', 'wide', 'moov', 'mdat'])
+        self.assertEqual(len(outfile.getvalue()), os.path.getsize(mp4filename))
+        self.assertEqual(sample_data(isofile, outfile), expected_samples)
+
+    def test_already_faststart(self):
+        outfile = BytesIO()
+        moved_file = BytesIO()
+
+        with open(os.path.join(TESTDATA, 'guitar.mp4'), 'rb') as infile:
+            isomedia.faststart(infile, outfile)
+
+        outfile.seek(0)
+        self.assertFalse(isomedia.faststart(outfile, moved_file))
+        self.assertEqual(moved_file.getvalue(), outfile.getvalue())
+
+    def test_promote_to_co64(self):
+        with open(os.path.join(TESTDATA, 'guitar.mp4'), 'rb') as infile:
+            isofile = isomedia.load(infile)
+
+            moov = [atom for atom in isofile.atoms if atom.type == 'moov'][0]
+            moov_size = moov.size
+            stco = chunk_offset_tables(moov)[0]
+            offsets = list(stco.properties['chunk_offset'])
+
+            co64 = promote_to_co64(stco)
+
+            self.assertTrue(isinstance(co64, Co64Atom))
+            self.assertEqual(list(co64.properties['chunk_offset']), offsets)
+            self.assertEqual(moov.size, moov_size + 4 * len(offsets))
+            self.assertEqual(len(moov.to_bytes()), moov.size)
+
+    def test_shift_offsets(self):
+        offset_map = OffsetMap([0, 100, 1000], [50, -100, 2 ** 32])
+
+        for offsets in [[10, 20, 150, 160, 999, 1000, 5000], [150, 10, 1000, 160, 20]]:
+            expected = [offset + offset_map.shifts[offset_map.region(offset)] for offset in offsets]
+            column = new_int_array(8, offsets)
+
+            self.assertEqual(offset_map.max_shifted(column), max(expected))
+            offset_map.shift_offsets(column)
+            self.assertEqual(list(column), expected)
+
+        self.assertEqual(offset_map.shift_ranges(new_int_array(8, [10, 20, 150, 160, 999])), [[0, 2, 50], [2, 5, -100]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import unittest
+
+import isomedia
+from isomedia.atom import create_atom
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+class TestFind(unittest.TestCase):
+    def test_find(self):
+        mp4filename = os.path.join(TESTDATA, 'loop_circle.mp4')
+
+        with open(mp4filename, 'rb') as infile:
+            isofile = isomedia.load(infile)
+
+            moov = [atom for atom in isofile.atoms if atom.type == 'moov'][0]
+            mvhd = [atom for atom in moov.children if atom.type == 'mvhd'][0]
+            traks = [atom for atom in moov.children if atom.type == 'trak']
+
+            self.assertTrue(isofile.find('moov/mvhd') is mvhd)
+            self.assertTrue(moov.find('mvhd') is mvhd)
+            self.assertEqual(isofile.find('moov/nope'), None)
+            self.assertEqual(isofile.find_all('moov/trak'), traks)
+            self.assertEqual(len(isofile.find_all('moov/trak/mdia/mdhd')), 2)
+            self.assertEqual(isofile.find_all('moov/*/mdia/mdhd'), isofile.find_all('moov/trak/mdia/mdhd'))
+            self.assertEqual(isofile.find_all('*'), list(isofile.atoms))
+
+    def test_fragments_in_file_order(self):
+        mp4filename = os.path.join(TESTDATA, 'meta_with_children.mp4')
+
+        with open(mp4filename, 'rb') as infile:
+            isofile = isomedia.load(infile)
+
+            truns = isofile.find_all('moof/traf/trun')
+            expected = [trun for moof in isofile.atoms if moof.type == 'moof'
+                        for traf in moof.children if traf.type == 'traf'
+                        for trun in traf.children if trun.type == 'trun']
+            self.assertEqual(truns, expected)
+            offsets = [trun._input_file_offset for trun in truns]
+            self.assertEqual(offsets, sorted(offsets))
+
+    def test_index_follows_changes(self):
+        mp4filename = os.path.join(TESTDATA, 'loop_circle.mp4')
+
+        with open(mp4filename, 'rb') as infile:
+            isofile = isomedia.load(infile)
+            moov = isofile.find('moov')
+            self.assertEqual(moov.find('junk'), None)
+
+            junk = create_atom('junk', b'')
+            moov.children.append(junk)
+            self.assertTrue(moov.find('junk') is junk)
+
+            junk.parent_atom = moov
+            junk.type = 'jnk2'
+            self.assertEqual(moov.find('junk'), None)
+            self.assertTrue(moov.find('jnk2') is junk)
+
+            moov.children.remove(junk)
+            self.assertEqual(moov.find('jnk2'), None)
+
+            isofile.atoms = [atom for atom in isofile.atoms if atom.type != 'wide']
+            self.assertEqual(isofile.find('wide'), None)
+            self.assertTrue(isofile.find('moov') is moov)
+
+            # Python 2 lists have no clear(); emptying the list by slice is covered the same way.
+            if hasattr(isofile.atoms, 'clear'):
+                isofile.atoms.clear()
+            else:
+                del isofile.atoms[:]
+            self.assertEqual(isofile.find('moov'), None)
+            self.assertEqual(isofile.atoms.of_type('moov'), [])
+
+if __name__ == '__main__':
+    unittest.main()
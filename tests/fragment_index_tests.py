@@ -0,0 +1,148 @@
+from io import BytesIO
+import os
+import struct
+import unittest
+
+import isomedia
+from isomedia.atom import GenericAtom
+from isomedia.fragment_index import index_from_moofs, index_from_sidx, read_mfra, seek_index
+from isomedia import isom_atoms
+from isomedia.isom_atoms import MfroAtom, SidxAtom, TfdtAtom, TfhdAtom, TfraAtom, TrunAtom
+from isomedia.parser import parse_atom
+from isomedia.selection import Selection
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+def full_box(atom_type, version, flags, body):
+    return struct.pack('>I4sI', 12 + len(body), atom_type, (version << 24) | flags) + body
+
+class TestFragmentAtoms(unittest.TestCase):
+    def test_lossless(self):
+        expected_classes = {'sidx': SidxAtom, 'tfra': TfraAtom, 'mfro': MfroAtom, 'tfhd': TfhdAtom, 'tfdt': TfdtAtom,
+                            'trun': TrunAtom}
+
+        with open(os.path.join(TESTDATA, 'meta_with_children.mp4'), 'rb') as infile:
+            isofile = isomedia.load(infile, eager=True)
+
+            for path in ['sidx', 'mfra/tfra', 'mfra/mfro', 'moof/traf/tfhd', 'moof/traf/tfdt', 'moof/traf/trun']:
+                atoms = isofile.find_all(path)
+                self.assertTrue(atoms)
+                for atom in atoms:
+                    self.assertTrue(isinstance(atom, expected_classes[atom.type]))
+                    self.assertEqual(atom.to_bytes(), bytes(isofile.read_range(atom._input_file_offset, atom.size)))
+
+    def test_trun(self):
+        samples = struct.pack('>IIIi', 1000, 500, 0x2000000, -2000) + struct.pack('>IIIi', 1001, 600, 0x1010000, 3000)
+        data = full_box(b'trun', 1, 0x000f05, struct.pack('>IiI', 2, -16, 0x2000000) + samples)
+
+        trun, _ = parse_atom(BytesIO(data), 0)
+        self.assertTrue(isinstance(trun, TrunAtom))
+        self.assertEqual((trun.properties['data_offset'], trun.properties['first_sample_flags']), (-16, 0x2000000))
+        self.assertEqual(list(trun.properties['sample_duration']), [1000, 1001])
+        self.assertEqual(list(trun.properties['sample_size']), [500, 600])
+        self.assertEqual(list(trun.properties['sample_composition_time_offset']), [-2000, 3000])
+        self.assertEqual(trun.to_bytes(), data)
+
+        # A trun whose body doesn't match its flags falls back to a GenericAtom.
+        truncated = full_box(b'trun', 0, 0x000300, struct.pack('>I', 3) + struct.pack('>II', 1000, 500))
+        self.assertTrue(type(parse_atom(BytesIO(truncated), 0)[0]) is GenericAtom)
+
+    def test_undefined_flags(self):
+        # Flags no field is defined for don't change the decoding, nor add to the cached definitions.
+        for high_bits in range(0, 0x10000, 0x100):
+            tfhd, _ = parse_atom(BytesIO(full_box(b'tfhd', 0, (high_bits << 8) | 0x08, struct.pack('>II', 1, 1000))), 0)
+            self.assertEqual(tfhd.properties['default_sample_duration'], 1000)
+
+            data = full_box(b'trun', 0, (high_bits << 8) | 0x100, struct.pack('>III', 2, 1000, 1001))
+            trun, _ = parse_atom(BytesIO(data), 0)
+            self.assertEqual(list(trun.properties['sample_duration']), [1000, 1001])
+            self.assertEqual(trun.to_bytes(), data)
+
+        self.assertTrue(len(isom_atoms._tfhd_definitions) <= 2 ** len(isom_atoms.TFHD_OPTIONAL_FIELDS))
+        self.assertTrue(len(isom_atoms._optional_definitions) <=
+                        2 ** len(isom_atoms.TFHD_OPTIONAL_FIELDS) + 2 ** len(isom_atoms.TRUN_SAMPLE_FIELDS))
+
+    def test_tfra(self):
+        # Version 1, with three byte traf, trun and sample numbers.
+        entries = b''.join(struct.pack('>QQ', time, offset) + struct.pack('>I', number)[1:] * 3
+                           for time, offset, number in [(0, 100, 1), (2 ** 40, 2 ** 33, 70000)])
+        data = full_box(b'tfra', 1, 0, struct.pack('>III', 7, 0x2a, 2) + entries)
+
+        tfra, _ = parse_atom(BytesIO(data), 0)
+        self.assertTrue(isinstance(tfra, TfraAtom))
+        self.assertEqual(list(tfra.properties['time']), [0, 2 ** 40])
+        self.assertEqual(list(tfra.properties['moof_offset']), [100, 2 ** 33])
+        self.assertEqual(list(tfra.properties['sample_number']), [1, 70000])
+        self.assertEqual(tfra.to_bytes(), data)
+
+class TestSeekIndex(unittest.TestCase):
+    def test_sidx(self):
+        # Timescale 1000: a reference to another sidx, then two 2 second subsegments of media.
+        references = [(1, 500, 0), (0, 100, 2000), (0, 200, 2000)]
+        body = struct.pack('>IIIIHH', 1, 1000, 4000, 0, 0, len(references)) + b''.join(
+            struct.pack('>III', (reference_type << 31) | size, duration, 0x90000000)
+            for reference_type, size, duration in references)
+        sidx, _ = parse_atom(BytesIO(full_box(b'sidx', 0, 0, body)), 1000)
+        end = 1000 + sidx.size
+
+        index = index_from_sidx([sidx], 90000)
+        self.assertEqual(list(index.times), [360000, 540000])
+        self.assertEqual(list(index.offsets), [end + 500, end + 600])
+        self.assertEqual(index.timescale, 90000)
+
+        # Without the track's timescale, times stay in the sidx's.
+        index = index_from_sidx([sidx])
+        self.assertEqual((list(index.times), index.timescale), ([4000, 6000], 1000))
+
+    def test_sources_agree(self):
+        with open(os.path.join(TESTDATA, 'meta_with_children.mp4'), 'rb') as infile:
+            isofile = isomedia.load(infile)
+            moof_offsets = [moof._input_file_offset for moof in isofile.find_all('moof')]
+
+            for track_ID in (1, 2):
+                index = seek_index(isofile, track_ID)
+                self.assertEqual(index.built_from, 'mfra')
+                self.assertEqual(list(index.offsets), moof_offsets)
+
+                scanned = index_from_moofs(isofile, track_ID)
+                self.assertEqual(list(scanned.times), list(index.times))
+                self.assertEqual(list(scanned.offsets), moof_offsets)
+
+            # Without mfra, the sidx boxes are used.
+            mfra = isofile.find('mfra')
+            infile.seek(0)
+            without_mfra = isomedia.load(BytesIO(infile.read(mfra._input_file_offset)))
+
+            index = seek_index(without_mfra, 1)
+            self.assertEqual(index.built_from, 'sidx')
+            self.assertEqual(list(index.offsets), moof_offsets)
+            self.assertEqual(index.offset_at(1100), moof_offsets[2])
+            self.assertEqual(index.offset_at(10 ** 9), moof_offsets[-1])
+            with self.assertRaises(IndexError):
+                index.fragment_at(-1)
+
+    def test_moofs_without_tfdt(self):
+        with open(os.path.join(TESTDATA, 'meta_with_children.mp4'), 'rb') as infile:
+            isofile = isomedia.load(infile)
+            expected = dict((track_ID, list(index_from_moofs(isofile, track_ID).times)) for track_ID in (1, 2))
+
+            # tfdt is optional: track 1's fragments then start where the previous one ended.
+            for traf in isofile.find_all('moof/traf'):
+                if traf.find('tfhd').properties['track_ID'] == 1:
+                    traf.children.remove(traf.find('tfdt'))
+
+            for track_ID in (1, 2):
+                self.assertEqual(list(index_from_moofs(isofile, track_ID).times), expected[track_ID])
+
+    def test_mfra_from_file_end(self):
+        with open(os.path.join(TESTDATA, 'meta_with_children.mp4'), 'rb') as infile:
+            # Only moov is parsed: the fragments and mfra after it are left unread.
+            isofile = isomedia.load(infile, selection=Selection(paths=['moov'], first_only=True))
+            self.assertEqual(isofile.find('mfra'), None)
+
+            mfra = read_mfra(isofile)
+            self.assertEqual([atom.type for atom in mfra.children], ['tfra', 'tfra', 'mfro'])
+            self.assertEqual(seek_index(isofile, 2).offset_at(2048), 36536)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import isomedia
+from isomedia.exceptions import AtomSizeChangedError
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+class TestSaveInPlace(unittest.TestCase):
+    def setUp(self):
+        handle, self.filename = tempfile.mkstemp(suffix='.mp4')
+        os.close(handle)
+        shutil.copyfile(os.path.join(TESTDATA, 'guitar.mp4'), self.filename)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_same_size_edit(self):
+        faked_duration = 424242
+
+        with open(self.filename, 'r+b') as isofp:
+            isofile = isomedia.load(isofp)
+
+            moov = [atom for atom in isofile.atoms if atom.type == 'moov'][0]
+            mvhd = [atom for atom in moov.children if atom.type == 'mvhd'][0]
+            mvhd.properties['duration'] = faked_duration
+
+            isofile.save_in_place()
+
+        with open(self.filename, 'rb') as isofp:
+            isofile = isomedia.load(isofp)
+
+            moov = [atom for atom in isofile.atoms if atom.type == 'moov'][0]
+            mvhd = [atom for atom in moov.children if atom.type == 'mvhd'][0]
+            self.assertEqual(mvhd.properties['duration'], faked_duration)
+
+            isofp.seek(0)
+            patched = isofp.read()
+
+        with open(os.path.join(TESTDATA, 'guitar.mp4'), 'rb') as original:
+            differences = [i for i, (a, b) in enumerate(zip(original.read(), patched)) if a != b]
+
+        self.assertTrue(0 < len(differences) <= 4)
+
+    def test_size_change_is_refused(self):
+        with open(self.filename, 'r+b') as isofp:
+            isofile = isomedia.load(isofp)
+
+            ftyp = isofile.atoms[0]
+            ftyp.properties['compatible_brands'].append(b'mp42')
+            ftyp.properties['minor_version'] = 1
+
+            with self.assertRaises(AtomSizeChangedError):
+                isofile.save_in_place()
+
+        with open(self.filename, 'rb') as patched, open(os.path.join(TESTDATA, 'guitar.mp4'), 'rb') as original:
+            self.assertEqual(patched.read(), original.read())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import filecmp
+import os
+import tempfile
+import unittest
+
+import isomedia
+from isomedia.atom import GenericAtom
+from isomedia.compat import PY3
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+class TestMapping(unittest.TestCase):
+    def test_lossless_write(self):
+        for filename in ['loop_circle.mp4', 'meta_with_children.mp4']:
+            mp4filename = os.path.join(TESTDATA, filename)
+
+            with open(mp4filename, 'rb') as infile, tempfile.NamedTemporaryFile(delete=False) as outfile:
+                isofile = isomedia.load(infile, mmap=True)
+                isofile.write(outfile)
+                isofile.close()
+
+            self.assertTrue(filecmp.cmp(infile.name, outfile.name))
+
+            os.remove(outfile.name)
+
+    def test_load_path(self):
+        mp4filename = os.path.join(TESTDATA, 'guitar.mp4')
+
+        with open(mp4filename, 'rb') as infile:
+            expected = isomedia.load(infile)
+            expected_moov = [atom for atom in expected.atoms if atom.type == 'moov'][0]
+            expected_mvhd = [atom for atom in expected_moov.children if atom.type == 'mvhd'][0]
+
+        isofile = isomedia.load_path(mp4filename)
+
+        moov = [atom for atom in isofile.atoms if atom.type == 'moov'][0]
+        mvhd = [atom for atom in moov.children if atom.type == 'mvhd'][0]
+        self.assertEqual(mvhd.properties, expected_mvhd.properties)
+
+        # Unknown atoms keep a view into the map rather than a copy.
+        wide = [atom for atom in isofile.atoms if atom.type == 'wide'][0]
+        self.assertTrue(isinstance(wide, GenericAtom))
+        self.assertFalse(isinstance(wide.get_data(), bytes))
+
+        mdat = [atom for atom in isofile.atoms if atom.type == 'mdat'][0]
+        with open(mp4filename, 'rb') as infile:
+            infile.seek(mdat._input_file_offset + 8)
+            self.assertEqual(bytes(mdat.get_data()[:64]), infile.read(64))
+
+        # A view still held keeps the map alive, and close says so.
+        data = mdat.get_data()
+        del wide, mdat, moov, mvhd
+        self.assertEqual(isofile.close(), not PY3)
+
+        del data
+        self.assertTrue(isomedia.load_path(mp4filename).close())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import struct
+import tempfile
+import unittest
+
+import isomedia
+from isomedia.atom import create_atom
+from isomedia.compat import type_to_bytes
+from isomedia.exceptions import AtomSizeChangedError
+
+def box(atom_type, body):
+    return struct.pack('>I', 8 + len(body)) + type_to_bytes(atom_type) + body
+
+PAYLOAD = b'payload!' * 4
+ISOFILE = (box('ftyp', b'isom' + b'\x00\x00\x02\x00' + b'isomiso2mp41') +
+           box('moov', box('udta', box('titl', b'a title')) + box('free', b'\x00' * 92)) +
+           box('mdat', PAYLOAD))
+
+class TestPadding(unittest.TestCase):
+    def setUp(self):
+        handle, self.filename = tempfile.mkstemp(suffix='.mp4')
+        with os.fdopen(handle, 'wb') as isofp:
+            isofp.write(ISOFILE)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def edit_title(self, title):
+        with open(self.filename, 'r+b') as isofp:
+            isofile = isomedia.load(isofp)
+
+            udta = isofile.atoms[1].children[0]
+            udta.children[0] = create_atom('titl', title)
+
+            isofile.save_in_place()
+
+        with open(self.filename, 'rb') as isofp:
+            data = isofp.read()
+            isofp.seek(0)
+            isofile = isomedia.load(isofp)
+
+            moov = isofile.atoms[1]
+            udta, free = moov.children
+            return data, udta.children[0].get_data(), free.size
+
+    def test_growth_borrows_from_free(self):
+        data, title, free_size = self.edit_title(b'a much longer title')
+
+        self.assertEqual(len(data), len(ISOFILE))
+        self.assertTrue(data.endswith(box('mdat', PAYLOAD)))
+        self.assertEqual(title, b'a much longer title')
+        self.assertEqual(free_size, 100 - 12)
+
+    def test_shrink_donates_to_free(self):
+        data, title, free_size = self.edit_title(b'a')
+
+        self.assertEqual(len(data), len(ISOFILE))
+        self.assertTrue(data.endswith(box('mdat', PAYLOAD)))
+        self.assertEqual(free_size, 100 + 6)
+
+    def test_shrink_inserts_free(self):
+        with open(self.filename, 'r+b') as isofp:
+            isofile = isomedia.load(isofp)
+            del isofile.atoms[0].properties['compatible_brands'][1:]
+
+            isofile.save_in_place()
+
+        with open(self.filename, 'rb') as isofp:
+            isofile = isomedia.load(isofp)
+
+            self.assertEqual([atom.type for atom in isofile.atoms], ['ftyp', 'free', 'moov', 'mdat'])
+            self.assertEqual(isofile.atoms[1].size, 8)
+            self.assertEqual(isofile.atoms[3]._input_file_offset, len(ISOFILE) - 8 - len(PAYLOAD))
+
+    def test_refused_save_leaves_document(self):
+        with open(self.filename, 'r+b') as isofp:
+            isofile = isomedia.load(isofp)
+            ftyp, moov, mdat = isofile.atoms
+            udta, free = moov.children
+            sizes = [atom.size for atom in [ftyp, moov, udta, free]]
+
+            # The shorter title would donate to the free atom, but nothing can absorb ftyp's growth.
+            udta.children[0] = create_atom('titl', b'a')
+            ftyp.properties['compatible_brands'].append(b'mp42')
+
+            with self.assertRaises(AtomSizeChangedError):
+                isofile.save_in_place()
+
+            self.assertEqual(list(isofile.atoms), [ftyp, moov, mdat])
+            self.assertEqual(list(moov.children), [udta, free])
+            self.assertEqual([atom.size for atom in [ftyp, moov, udta, free]], sizes)
+
+        with open(self.filename, 'rb') as isofp:
+            self.assertEqual(isofp.read(), ISOFILE)
+
+if __name__ == '__main__':
+    unittest.main()
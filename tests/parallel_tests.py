@@ -0,0 +1,63 @@
+from io import BytesIO
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import isomedia
+from isomedia.exceptions import MalformedIsomFile
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+class TestLoadParallel(unittest.TestCase):
+    def setUp(self):
+        self.mp4filename = os.path.join(TESTDATA, 'meta_with_children.mp4')
+        with open(self.mp4filename, 'rb') as infile:
+            self.expected = infile.read()
+            self.eager = isomedia.load(BytesIO(self.expected), eager=True)
+
+    def check_matches_eager(self, threads):
+        isofile = isomedia.load_parallel(self.mp4filename, processes=2, threads=threads)
+        try:
+            truns = isofile.find_all('moof/traf/trun')
+            self.assertEqual([trun.to_bytes() for trun in truns],
+                             [trun.to_bytes() for trun in self.eager.find_all('moof/traf/trun')])
+
+            for moof in isofile.find_all('moof'):
+                for child in moof.children:
+                    self.assertTrue(child.parent_atom is moof)
+                    self.assertTrue(child.document is isofile)
+
+            output = BytesIO()
+            isofile.write(output)
+            self.assertEqual(output.getvalue(), self.expected)
+        finally:
+            isofile.close()
+
+    def test_processes(self):
+        self.check_matches_eager(threads=False)
+
+    def test_threads(self):
+        self.check_matches_eager(threads=True)
+
+    def test_malformed(self):
+        moof = self.eager.find('moof')
+        data = bytearray(self.expected)
+        # The first child of the first moof claims to run past the end of the file.
+        struct.pack_into('>I', data, moof._input_file_offset + moof.header_length, 0x7fffffff)
+
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'malformed.mp4')
+            with open(path, 'wb') as outfile:
+                outfile.write(bytes(data))
+
+            for threads in (False, True):
+                with self.assertRaises(MalformedIsomFile):
+                    isomedia.load_parallel(path, processes=2, threads=threads)
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    unittest.main()
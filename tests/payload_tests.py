@@ -0,0 +1,209 @@
+from io import BytesIO
+import os
+import random
+import shutil
+import struct
+import tempfile
+import threading
+import unittest
+
+import isomedia
+from isomedia.atom import GenericAtom, ReferencedAtom
+from isomedia.cache import ParseCache
+from isomedia.isom_atoms import UserExtendedAtom
+from isomedia.parser import MAX_OPAQUE_BODY_SIZE, parse_atom
+from isomedia.payload_cache import PayloadCache
+from isomedia.stats import ParseStats
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+class TestPayloadReads(unittest.TestCase):
+    def setUp(self):
+        self.mp4filename = os.path.join(TESTDATA, 'loop_circle.mp4')
+        with open(self.mp4filename, 'rb') as infile:
+            self.expected = infile.read()
+
+    def payload(self, atom):
+        start = atom._input_file_offset + atom.header_length
+        return self.expected[start:atom._input_file_offset + atom.size]
+
+    def check_ranges(self, isofile):
+        mdat = isofile.find('mdat')
+        payload = self.payload(mdat)
+
+        self.assertEqual(bytes(mdat.read_range(10, 100)), payload[10:110])
+        self.assertEqual(bytes(mdat.read_range(len(payload) - 5, 100)), payload[-5:])
+        self.assertEqual(bytes(mdat.read_range(len(payload) + 5, 100)), b'')
+
+        buffer_data = bytearray(64)
+        self.assertEqual(mdat.readinto(buffer_data, 3), 64)
+        self.assertEqual(bytes(buffer_data), payload[3:67])
+        self.assertEqual(mdat.readinto(buffer_data, len(payload) - 4), 4)
+        self.assertEqual(bytes(buffer_data[:4]), payload[-4:])
+
+    def test_read_range(self):
+        with open(self.mp4filename, 'rb') as infile:
+            self.check_ranges(isomedia.load(infile))
+            self.check_ranges(isomedia.load(infile, mmap=True))
+        self.check_ranges(isomedia.load(BytesIO(self.expected)))
+
+    def check_concurrent(self, infile):
+        isofile = isomedia.load(infile)
+        mdat = isofile.find('mdat')
+        payload = self.payload(mdat)
+        errors = []
+
+        def read(seed):
+            rng = random.Random(seed)
+            buffer_data = bytearray(1000)
+            try:
+                for _ in range(200):
+                    offset = rng.randrange(len(payload))
+                    if bytes(mdat.read_range(offset, 500)) != payload[offset:offset + 500]:
+                        errors.append(offset)
+                    count = mdat.readinto(buffer_data, offset)
+                    if bytes(buffer_data[:count]) != payload[offset:offset + 1000]:
+                        errors.append(offset)
+            except Exception as e:
+                errors.append(e)
+
+        def write():
+            for _ in range(5):
+                output = BytesIO()
+                isofile.write(output)
+                if output.getvalue() != self.expected:
+                    errors.append('write')
+
+        threads = [threading.Thread(target=read, args=(seed,)) for seed in range(4)]
+        threads.append(threading.Thread(target=write))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+
+    def test_concurrent_readers(self):
+        with open(self.mp4filename, 'rb') as infile:
+            self.check_concurrent(infile)
+
+            if hasattr(os, 'pread'):
+                # Positional reads leave the file's position alone.
+                mdat = isomedia.load(infile).find('mdat')
+                position = infile.tell()
+                mdat.read_range(0, 100)
+                self.assertEqual(infile.tell(), position)
+
+        # File-like objects without a descriptor are read under a lock instead.
+        self.check_concurrent(BytesIO(self.expected))
+
+def free_atoms(*payload_sizes):
+    return b''.join(struct.pack('>I4s', 8 + size, b'free') + bytes(bytearray([size % 256]) * size)
+                    for size in payload_sizes)
+
+class TestPayloadCache(unittest.TestCase):
+    def test_budget(self):
+        cache = PayloadCache(max_bytes=250)
+        isofile = isomedia.load(BytesIO(free_atoms(100, 100, 100, 300)), payload_cache=cache)
+        first, second, third, large = isofile.atoms
+
+        for atom in [first, second, first]:
+            self.assertEqual(bytes(atom.get_data()), bytes(bytearray([100]) * 100))
+        self.assertEqual((cache.hits, cache.misses, cache.size), (1, 2, 200))
+
+        # second was the least recently used when third came in.
+        third.get_data()
+        second.get_data()
+        self.assertEqual((cache.hits, cache.misses, cache.evictions, cache.size), (1, 4, 2, 200))
+
+        # Payloads over the budget are never kept.
+        self.assertEqual(len(large.get_data()), 300)
+        self.assertEqual(cache.size, 200)
+
+    def test_no_cache(self):
+        cache = PayloadCache(0)
+        isofile = isomedia.load(BytesIO(free_atoms(10)), payload_cache=cache)
+        isofile.atoms[0].get_data()
+        isofile.atoms[0].get_data()
+        self.assertEqual((cache.hits, cache.misses, cache.size), (0, 2, 0))
+
+    def test_shared(self):
+        cache = PayloadCache(max_bytes=1000)
+        data = free_atoms(100)
+        documents = [isomedia.load(BytesIO(data), payload_cache=cache) for _ in range(2)]
+
+        for document in documents:
+            document.atoms[0].get_data()
+        # The same offset in two documents is two payloads.
+        self.assertEqual((cache.misses, cache.size), (2, 200))
+
+        documents[0].close()
+        self.assertEqual(cache.size, 100)
+
+    def test_iter_data(self):
+        with open(os.path.join(TESTDATA, 'loop_circle.mp4'), 'rb') as infile:
+            cache = PayloadCache()
+            mdat = isomedia.load(infile, payload_cache=cache).find('mdat')
+
+            chunks = [bytes(chunk) for chunk in mdat.iter_data(chunk_size=4096)]
+            self.assertTrue(all(len(chunk) == 4096 for chunk in chunks[:-1]))
+            self.assertEqual(b''.join(chunks), bytes(mdat.get_data()))
+            self.assertEqual(cache.misses, 1)
+
+def opaque_atoms():
+    large = MAX_OPAQUE_BODY_SIZE + 1
+    return b''.join([
+        struct.pack('>I4s', 8 + 4, b'zzzz') + b'tiny',
+        struct.pack('>I4s', 8 + large, b'zzzz') + b'z' * large,
+        struct.pack('>I4s16s', 24 + 4, b'uuid', b'0123456789abcdef') + b'tiny',
+        struct.pack('>I4s16s', 24 + large, b'uuid', b'0123456789abcdef') + b'u' * large,
+    ])
+
+class TestReferencedAtoms(unittest.TestCase):
+    def test_large_opaque_atoms(self):
+        data = opaque_atoms()
+        stats = ParseStats()
+        isofile = isomedia.load(BytesIO(data), stats=stats, block_size=None)
+
+        self.assertEqual([type(atom) for atom in isofile.atoms],
+                         [GenericAtom, ReferencedAtom, UserExtendedAtom, ReferencedAtom])
+        self.assertEqual(isofile.atoms[2]._user_type, b'0123456789abcdef')
+        # Only the small atoms' bodies were read while parsing.
+        self.assertTrue(stats.bytes_read < MAX_OPAQUE_BODY_SIZE)
+
+        self.assertEqual(bytes(isofile.atoms[1].read_range(0, 4)), b'zzzz')
+        output = BytesIO()
+        isofile.write(output)
+        self.assertEqual(output.getvalue(), data)
+
+        # Without a document to read from later, bodies are read up front.
+        self.assertTrue(isinstance(parse_atom(BytesIO(data[12:]), 12)[0], GenericAtom))
+
+    def test_parse_cache(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'opaque.mp4')
+            with open(path, 'wb') as outfile:
+                outfile.write(opaque_atoms())
+
+            cache = ParseCache(os.path.join(directory, 'cache'), 1024 * 1024)
+            with open(path, 'rb') as infile:
+                isomedia.load(infile, cache=cache)
+                isofile = isomedia.load(infile, cache=cache)
+
+                self.assertEqual([type(atom) for atom in isofile.atoms],
+                                 [GenericAtom, ReferencedAtom, UserExtendedAtom, ReferencedAtom])
+                output = BytesIO()
+                isofile.write(output)
+                self.assertEqual(output.getvalue(), opaque_atoms())
+
+            # The large bodies aren't copied into the cache.
+            cache_directory = os.path.join(directory, 'cache')
+            self.assertTrue(os.listdir(cache_directory))
+            self.assertTrue(all(os.path.getsize(os.path.join(cache_directory, name)) < MAX_OPAQUE_BODY_SIZE
+                                for name in os.listdir(cache_directory)))
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+from io import BytesIO
+import unittest
+
+import isomedia
+from isomedia.isom_atoms import CttsAtom, StcoAtom, StszAtom, SttsAtom, Stz2Atom
+from isomedia.parser import parse_atom
+from isomedia.sample_index import build_sample_index
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+def find_path(atoms, path):
+    atom = None
+    for atom_type in path.split('/'):
+        atom = [child for child in atoms if child.type == atom_type][0]
+        atoms = getattr(atom, 'children', [])
+    return atom
+
+class TestSampleTables(unittest.TestCase):
+    def test_typed_tables(self):
+        mp4filename = os.path.join(TESTDATA, 'loop_circle.mp4')
+
+        with open(mp4filename, 'rb') as mp4file:
+            isofile = isomedia.load(mp4file)
+
+            stbl = find_path(isofile.atoms, 'moov/trak/mdia/minf/stbl')
+            tables = dict((atom.type, atom) for atom in stbl.children)
+
+            self.assertTrue(isinstance(tables['stts'], SttsAtom))
+            self.assertTrue(isinstance(tables['ctts'], CttsAtom))
+            self.assertTrue(isinstance(tables['stsz'], StszAtom))
+            self.assertTrue(isinstance(tables['stco'], StcoAtom))
+
+            stts = tables['stts']
+            self.assertEqual(stts.properties['entry_count'], len(stts.properties['sample_delta']))
+
+    def test_sample_index(self):
+        mp4filename = os.path.join(TESTDATA, 'loop_circle.mp4')
+
+        with open(mp4filename, 'rb') as mp4file:
+            isofile = isomedia.load(mp4file)
+
+            mdat = [atom for atom in isofile.atoms if atom.type == 'mdat'][0]
+            trak = find_path(isofile.atoms, 'moov/trak')
+            stsz = find_path(isofile.atoms, 'moov/trak/mdia/minf/stbl/stsz')
+
+            index = build_sample_index(trak)
+
+            self.assertEqual(len(index), stsz.properties['sample_count'])
+            self.assertEqual(len(index.decode_times), len(index))
+            self.assertEqual(len(index.offsets), len(index))
+            self.assertEqual(index.sync[0], 1)
+            self.assertEqual(list(index.decode_times), sorted(index.decode_times))
+
+            mdat_start = mdat._input_file_offset
+            mdat_end = mdat_start + mdat.size
+            for offset, size in zip(index.offsets, index.sizes):
+                self.assertTrue(mdat_start <= offset and offset + size <= mdat_end)
+
+    def test_stz2_nibbles(self):
+        body = b'\x00\x00\x00\x00' + b'\x00\x00\x00\x04' + b'\x00\x00\x00\x03' + b'\x12\x30'
+        atom_bytes = b'\x00\x00\x00\x16stz2' + body
+
+        atom, atom_size = parse_atom(BytesIO(atom_bytes), 0)
+
+        self.assertTrue(isinstance(atom, Stz2Atom))
+        self.assertEqual(list(atom.properties['entry_size']), [1, 2, 3])
+        self.assertEqual(atom.to_bytes(), atom_bytes)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import filecmp
+from io import BytesIO
+import os
+import struct
+import tempfile
+import unittest
+
+import isomedia
+from isomedia.exceptions import ParseLimitExceeded
+from isomedia.isom_atoms import FtypAtom, MvhdAtom
+from isomedia.selection import Selection, UnparsedAtom, UnparsedRegion
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+def nested_udta(depth):
+    data = b''
+    for _ in range(depth):
+        data = struct.pack('>I', 8 + len(data)) + b'udta' + data
+    return data
+
+class TestSelection(unittest.TestCase):
+    def assertRoundTrips(self, filename, selection):
+        mp4filename = os.path.join(TESTDATA, filename)
+
+        with open(mp4filename, 'rb') as infile, tempfile.NamedTemporaryFile(delete=False) as outfile:
+            isomedia.load(infile, selection=selection).write(outfile)
+
+        self.assertTrue(filecmp.cmp(mp4filename, outfile.name, shallow=False))
+        os.remove(outfile.name)
+
+    def test_paths_first_only(self):
+        selection = Selection(paths=['ftyp', 'moov/mvhd'], first_only=True)
+
+        with open(os.path.join(TESTDATA, 'loop_circle.mp4'), 'rb') as infile:
+            isofile = isomedia.load(infile, selection=selection)
+
+            self.assertTrue(isinstance(isofile.find('ftyp'), FtypAtom))
+            self.assertTrue(isinstance(isofile.find('wide'), UnparsedAtom))
+            self.assertTrue(isinstance(isofile.find('moov/mvhd'), MvhdAtom))
+
+            # Nothing after mvhd is read.
+            moov = isofile.find('moov')
+            self.assertEqual([atom.type for atom in moov.children], ['mvhd', None])
+            self.assertTrue(isinstance(moov.children[1], UnparsedRegion))
+
+        self.assertRoundTrips('loop_circle.mp4', selection)
+
+    def test_types(self):
+        selection = Selection(types=['mvhd', 'meta'])
+
+        with open(os.path.join(TESTDATA, 'meta_with_children.mp4'), 'rb') as infile:
+            isofile = isomedia.load(infile, selection=selection)
+
+            self.assertTrue(isinstance(isofile.find('moov/mvhd'), MvhdAtom))
+            self.assertEqual(isofile.find('moov/udta/meta/hdlr').type, 'hdlr')
+            self.assertFalse(isinstance(isofile.find('moov/udta/meta/hdlr'), UnparsedAtom))
+
+            tkhd = isofile.find('moov/trak/tkhd')
+            self.assertTrue(isinstance(tkhd, UnparsedAtom))
+            infile.seek(tkhd._input_file_offset + 8)
+            expected = infile.read(tkhd.size - 8)
+            self.assertEqual(bytes(tkhd.get_data()), expected)
+
+        self.assertRoundTrips('meta_with_children.mp4', selection)
+
+    def test_max_depth(self):
+        selection = Selection(max_depth=1)
+
+        with open(os.path.join(TESTDATA, 'meta_with_children.mp4'), 'rb') as infile:
+            isofile = isomedia.load(infile, selection=selection)
+
+        self.assertTrue(isinstance(isofile.find('moov/mvhd'), MvhdAtom))
+        self.assertTrue(isinstance(isofile.find('moov/trak/mdia'), UnparsedAtom))
+        self.assertTrue(isinstance(isofile.find('moov/udta/meta'), UnparsedAtom))
+
+        self.assertRoundTrips('meta_with_children.mp4', selection)
+
+    def test_deep_nesting(self):
+        data = nested_udta(5000)
+        isofile = isomedia.load(BytesIO(data), selection=Selection(max_depth=8))
+
+        self.assertTrue(isinstance(isofile.find('/'.join(['udta'] * 10)), UnparsedAtom))
+
+        output = BytesIO()
+        isofile.write(output)
+        self.assertEqual(output.getvalue(), data)
+
+    def test_max_bytes(self):
+        mp4filename = os.path.join(TESTDATA, 'loop_circle.mp4')
+
+        with open(mp4filename, 'rb') as infile:
+            with self.assertRaises(ParseLimitExceeded):
+                isomedia.load(infile, selection=Selection(max_bytes=1024))
+
+            # Unparsed atoms aren't read, so a selection can stay well within a budget the full parse exceeds.
+            selection = Selection(paths=['moov/mvhd'], first_only=True, max_bytes=1024)
+            isofile = isomedia.load(infile, selection=selection)
+            self.assertTrue(isinstance(isofile.find('moov/mvhd'), MvhdAtom))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import os
+import unittest
+
+import isomedia
+from isomedia.atom import AtomHeader, ContainerMixin
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+class TestCompactAtoms(unittest.TestCase):
+    def test_atoms_have_no_instance_dict(self):
+        def check(atoms):
+            for atom in atoms:
+                self.assertFalse(hasattr(atom, '__dict__'), '%s has an instance __dict__' % type(atom).__name__)
+                if isinstance(atom, ContainerMixin):
+                    check(atom.children)
+
+        for filename in ['guitar.mp4', 'loop_circle.mp4', 'meta_with_children.mp4']:
+            with open(os.path.join(TESTDATA, filename), 'rb') as mp4file:
+                check(isomedia.load(mp4file, eager=True).atoms)
+
+    def test_header(self):
+        with open(os.path.join(TESTDATA, 'guitar.mp4'), 'rb') as mp4file:
+            ftyp = isomedia.load(mp4file).atoms[0]
+
+            self.assertEqual((ftyp.header.type, ftyp.header.size, ftyp.header.header_length), ('ftyp', 28, 8))
+
+            # The header is a view of the atom: writes through it change the atom.
+            ftyp.header.size = 32
+            ftyp.header.type = 'ftyq'
+            self.assertEqual((ftyp.size, ftyp.type), (32, 'ftyq'))
+
+            ftyp.header = AtomHeader('ftyp', 28, 8)
+            self.assertEqual((ftyp.type, ftyp.size, ftyp.header_length), ('ftyp', 28, 8))
+
+if __name__ == '__main__':
+    unittest.main()
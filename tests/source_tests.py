@@ -0,0 +1,79 @@
+from io import BytesIO
+import os
+import random
+import unittest
+
+import isomedia
+from isomedia.source import CachingSource, FileSource, LatencySource
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+DATA = bytes(bytearray(random.Random(1).randrange(256) for _ in range(1000)))
+
+class TestCachingSource(unittest.TestCase):
+    def test_matches_data(self):
+        source = CachingSource(FileSource(BytesIO(DATA)), block_size=16, max_blocks=8)
+
+        rng = random.Random(2)
+        for _ in range(2000):
+            offset = rng.randrange(len(DATA) + 10)
+            length = rng.choice([1, 4, 15, 16, 17, 100])
+            self.assertEqual(source.read_at(offset, length), DATA[offset:offset + length])
+
+    def test_lru_eviction(self):
+        source = CachingSource(FileSource(BytesIO(DATA)), block_size=16, max_blocks=2, read_ahead=0)
+
+        for offset in [0, 40, 20, 40]:
+            source.read_at(offset, 4)
+        self.assertEqual((source.hits, source.misses), (1, 3))
+
+        # Block 0 was the least recently used when block 1 came in.
+        source.read_at(0, 4)
+        self.assertEqual((source.hits, source.misses), (1, 4))
+
+    def test_read_ahead(self):
+        source = CachingSource(FileSource(BytesIO(DATA)), block_size=16, read_ahead=4)
+
+        for offset in range(0, 96, 16):
+            self.assertEqual(source.read_at(offset, 16), DATA[offset:offset + 16])
+        self.assertEqual(source.requests, 2)
+
+    def test_prefetch(self):
+        latency = LatencySource(FileSource(BytesIO(DATA)), 0.01)
+        source = CachingSource(latency, block_size=16, prefetch_blocks=2, prefetch_workers=4)
+
+        source.prefetch(0, 160)
+        self.assertEqual(source.read_at(0, 160), DATA[:160])
+        source.close()
+
+        self.assertEqual(sorted(latency.requests), [(offset, 32) for offset in range(0, 160, 32)])
+        self.assertEqual(source.misses, 0)
+
+class TestLoadSource(unittest.TestCase):
+    def test_few_requests(self):
+        mp4filename = os.path.join(TESTDATA, 'meta_with_children.mp4')
+
+        with open(mp4filename, 'rb') as infile:
+            expected = infile.read()
+            latency = LatencySource(FileSource(infile), 0)
+            source = CachingSource(latency)
+            isofile = isomedia.load_source(source, eager=True)
+
+            self.assertTrue(len(latency.requests) <= 3)
+            self.assertEqual(isofile.find('moov/udta/meta/hdlr').type, 'hdlr')
+
+            # Payloads are read through the source too.
+            mdat = isofile.find('mdat')
+            start = mdat._input_file_offset + mdat.header_length
+            self.assertEqual(bytes(mdat.get_data()), expected[start:mdat._input_file_offset + mdat.size])
+
+            output = BytesIO()
+            isofile.write(output)
+            self.assertEqual(output.getvalue(), expected)
+
+            # There is no file to save in place.
+            self.assertRaises(IOError, isofile.save_in_place)
+            source.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+from io import BytesIO
+import os
+import unittest
+
+import isomedia
+from isomedia.source import FileSource, LatencySource
+from isomedia.stats import ParseStats
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+class TestParseStats(unittest.TestCase):
+    def test_parse_stats(self):
+        events = []
+        stats = ParseStats(callback=lambda event, atom_type, measured: events.append((event, atom_type)))
+
+        with open(os.path.join(TESTDATA, 'meta_with_children.mp4'), 'rb') as infile:
+            isofile = isomedia.load(infile, eager=True, stats=stats)
+
+            self.assertEqual(stats.parsed['moof'].count, len(isofile.find_all('moof')))
+            self.assertEqual(stats.parsed['trun'].count, len(isofile.find_all('moof/traf/trun')))
+            self.assertEqual(len(events), sum(type_stats.count for type_stats in stats.parsed.values()))
+            self.assertEqual(set(event for event, atom_type in events), set(['parse']))
+
+            # Each read is counted once, against the innermost atom being parsed.
+            self.assertEqual(sum(type_stats.bytes for type_stats in stats.parsed.values()), stats.bytes_read)
+            self.assertEqual(sum(type_stats.reads for type_stats in stats.parsed.values()), stats.reads)
+            self.assertTrue(stats.parsed['mdat'].bytes < isofile.find('mdat').size)
+
+    def test_deferred_children_measured(self):
+        stats = ParseStats()
+
+        with open(os.path.join(TESTDATA, 'loop_circle.mp4'), 'rb') as infile:
+            isofile = isomedia.load(infile, stats=stats)
+            self.assertFalse('mvhd' in stats.parsed)
+
+            isofile.find('moov/mvhd')
+            self.assertEqual(stats.parsed['mvhd'].count, 1)
+
+    def test_fallbacks(self):
+        stats = ParseStats()
+
+        with open(os.path.join(TESTDATA, 'broken_mvhd.mp4'), 'rb') as infile:
+            isomedia.load(infile, stats=stats)
+
+        self.assertEqual(stats.parsed['mvhd'].fallbacks, 1)
+
+    def test_write_stats(self):
+        stats = ParseStats()
+        mp4filename = os.path.join(TESTDATA, 'loop_circle.mp4')
+
+        with open(mp4filename, 'rb') as infile:
+            isofile = isomedia.load(infile, eager=True, stats=stats)
+            isofile.write(BytesIO())
+
+            self.assertEqual(stats.written['mdat'].bytes, isofile.find('mdat').size)
+            self.assertEqual(sum(type_stats.bytes for type_stats in stats.written.values()),
+                             os.path.getsize(mp4filename))
+
+    def test_copies_charged_to_their_atom(self):
+        stats = ParseStats()
+
+        with open(os.path.join(TESTDATA, 'loop_circle.mp4'), 'rb') as infile:
+            source = LatencySource(FileSource(BytesIO(infile.read())), 0)
+            isofile = isomedia.load_source(source, eager=True, stats=stats)
+
+            # Every read while writing, including the copy of mdat's range, takes at least the latency.
+            source.latency = 0.05
+            isofile.write(BytesIO())
+
+        self.assertTrue(stats.written['mdat'].seconds >= 0.05)
+        self.assertTrue(stats.written['moov'].seconds < 0.05)
+
+if __name__ == '__main__':
+    unittest.main()
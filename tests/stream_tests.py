@@ -0,0 +1,86 @@
+import os
+import struct
+import unittest
+
+import isomedia
+from isomedia.exceptions import MalformedIsomFile, ParseLimitExceeded
+from isomedia.stream import StreamParser, iter_atoms
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+class PipeReader(object):
+    """A file-like object with nothing but read(), like a pipe or socket."""
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+
+    def read(self, size):
+        chunk = self.data[self.position:self.position + size]
+        self.position += len(chunk)
+        return chunk
+
+def read_testdata(filename):
+    with open(os.path.join(TESTDATA, filename), 'rb') as infile:
+        return infile.read()
+
+class TestStreamParser(unittest.TestCase):
+    def test_feed_matches_load(self):
+        data = read_testdata('meta_with_children.mp4')
+        with open(os.path.join(TESTDATA, 'meta_with_children.mp4'), 'rb') as infile:
+            expected = isomedia.load(infile, eager=True)
+            expected_bytes = [atom.to_bytes() for atom in expected.atoms]
+
+        parser = StreamParser()
+        atoms = []
+        for position in range(0, len(data), 7):
+            atoms.extend(parser.feed(data[position:position + 7]))
+        parser.close()
+
+        self.assertEqual([atom.type for atom in atoms], [atom.type for atom in expected.atoms])
+        self.assertEqual([atom._input_file_offset for atom in atoms],
+                         [atom._input_file_offset for atom in expected.atoms])
+        self.assertEqual([atom.to_bytes() for atom in atoms], expected_bytes)
+
+        moov = [atom for atom in atoms if atom.type == 'moov'][0]
+        udta = [atom for atom in moov.children if atom.type == 'udta'][0]
+        self.assertEqual(udta.parent_atom, moov)
+
+    def test_atoms_returned_when_complete(self):
+        data = read_testdata('loop_circle.mp4')
+        ftyp_size = struct.unpack('>I', data[:4])[0]
+        parser = StreamParser()
+
+        self.assertEqual(parser.feed(data[:ftyp_size - 1]), [])
+        atoms = parser.feed(data[ftyp_size - 1:ftyp_size])
+        self.assertEqual([atom.type for atom in atoms], ['ftyp'])
+
+    def test_stream_payloads(self):
+        data = read_testdata('loop_circle.mp4')
+        payloads = []
+
+        def on_payload(atom, chunk):
+            payloads.append((atom.type, chunk))
+
+        atoms = list(iter_atoms(PipeReader(data), chunk_size=1000, stream_payloads=True, on_payload=on_payload,
+                                max_buffer_size=64 * 1024))
+
+        mdat = [atom for atom in atoms if atom.type == 'mdat'][0]
+        body_start = mdat._input_file_offset + mdat.header_length
+        self.assertEqual(b''.join(chunk for atom_type, chunk in payloads if atom_type == 'mdat'),
+                         data[body_start:mdat._input_file_offset + mdat.size])
+
+        with self.assertRaises(IOError):
+            mdat.get_data()
+
+    def test_buffer_limit(self):
+        data = read_testdata('loop_circle.mp4')
+        with self.assertRaises(ParseLimitExceeded):
+            list(iter_atoms(PipeReader(data), max_buffer_size=64 * 1024))
+
+    def test_truncated_stream(self):
+        data = read_testdata('loop_circle.mp4')
+        with self.assertRaises(MalformedIsomFile):
+            list(iter_atoms(PipeReader(data[:-1])))
+
+if __name__ == '__main__':
+    unittest.main()
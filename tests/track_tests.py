@@ -0,0 +1,108 @@
+from io import BytesIO
+import os
+import shutil
+import tempfile
+import unittest
+
+import isomedia
+from isomedia.exceptions import MalformedIsomFile
+from isomedia.source import FileSource, LatencySource
+from isomedia.track import Track, tracks
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+class TestTrack(unittest.TestCase):
+    def check_samples(self, isofile, data):
+        for track in tracks(isofile):
+            offsets = track.index.offsets
+            sizes = track.index.sizes
+
+            self.assertEqual(bytes(track.read_sample(3)), data[offsets[3]:offsets[3] + sizes[3]])
+
+            samples = [bytes(sample) for sample in track.read_samples(range(len(track)))]
+            self.assertEqual(samples, [data[offset:offset + size] for offset, size in zip(offsets, sizes)])
+
+            reversed_samples = [bytes(sample) for sample in track.read_samples(reversed(range(len(track))))]
+            self.assertEqual(reversed_samples, samples[::-1])
+
+    def test_read_samples(self):
+        mp4filename = os.path.join(TESTDATA, 'guitar.mp4')
+        with open(mp4filename, 'rb') as infile:
+            data = infile.read()
+
+            self.check_samples(isomedia.load(infile), data)
+
+        isofile = isomedia.load_path(mp4filename)
+        self.check_samples(isofile, data)
+        isofile.close()
+
+    def check_truncated(self, isofile, truncate):
+        track = tracks(isofile)[0]
+        last = len(track) - 1
+        truncate(track.index.offsets[last] + 1)
+
+        with self.assertRaises(MalformedIsomFile):
+            track.read_sample(last)
+        with self.assertRaises(MalformedIsomFile):
+            track.read_samples([last])
+
+    def test_truncated_file(self):
+        mp4filename = os.path.join(TESTDATA, 'loop_circle.mp4')
+        with open(mp4filename, 'rb') as infile:
+            data = infile.read()
+
+        memory_file = BytesIO(data)
+        self.check_truncated(isomedia.load(memory_file), memory_file.truncate)
+
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'truncated.mp4')
+            shutil.copy(mp4filename, path)
+            with open(path, 'r+b') as infile:
+                self.check_truncated(isomedia.load(infile), infile.truncate)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_reads_through_source(self):
+        with open(os.path.join(TESTDATA, 'guitar.mp4'), 'rb') as infile:
+            source = LatencySource(FileSource(infile), 0)
+            isofile = isomedia.ISOBaseMediaFile(infile, source=source)
+            track = tracks(isofile)[0]
+
+            del source.requests[:]
+            track.read_samples(range(len(track)))
+            self.assertTrue(source.requests)
+
+    def test_reads_coalesced(self):
+        with open(os.path.join(TESTDATA, 'loop_circle.mp4'), 'rb') as infile:
+            isofile = isomedia.load(infile)
+            track = Track(isofile.find('moov/trak'))
+
+            reads = []
+            read_ranges = isofile.read_ranges
+
+            def counting_read_ranges(offset, lengths):
+                reads.append(len(lengths))
+                return read_ranges(offset, lengths)
+
+            isofile.read_ranges = counting_read_ranges
+            track.read_samples(range(len(track)))
+
+            self.assertEqual(sum(reads), len(track))
+            self.assertTrue(len(reads) < len(track))
+
+    def test_sample_at(self):
+        with open(os.path.join(TESTDATA, 'loop_circle.mp4'), 'rb') as infile:
+            track = Track(isomedia.load(infile).find('moov/trak'))
+            decode_times = track.index.decode_times
+
+            self.assertEqual(track.sample_at(0), 0)
+            self.assertEqual(track.sample_at(decode_times[5]), 5)
+            self.assertEqual(track.sample_at(decode_times[6] - 1), 5)
+            self.assertEqual(track.sample_at(decode_times[-1] + 1000000), len(track) - 1)
+
+            with self.assertRaises(IndexError):
+                track.sample_at(-1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+from io import BytesIO
+import tempfile
+import threading
+import unittest
+
+import isomedia
+from isomedia.exceptions import MalformedIsomFile
+from isomedia.transfer import RangeWriter, copy_range
+
+TESTDATA = os.path.join(os.path.dirname(__file__), 'testdata')
+
+class TestTransfer(unittest.TestCase):
+    def test_copy_between_files(self):
+        mp4filename = os.path.join(TESTDATA, 'guitar.mp4')
+
+        with open(mp4filename, 'rb') as infile:
+            expected = infile.read()
+
+            with tempfile.TemporaryFile() as outfile:
+                outfile.write(b'head')
+                copy_range(infile, outfile, 100, 500000)
+                outfile.write(b'tail')
+
+                outfile.seek(0)
+                self.assertEqual(outfile.read(), b'head' + expected[100:500100] + b'tail')
+
+    def test_write_to_pipe(self):
+        mp4filename = os.path.join(TESTDATA, 'guitar.mp4')
+        read_fd, write_fd = os.pipe()
+        received = []
+
+        def read():
+            with os.fdopen(read_fd, 'rb') as pipe:
+                received.append(pipe.read())
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        try:
+            with open(mp4filename, 'rb') as infile:
+                with os.fdopen(write_fd, 'wb') as pipe:
+                    isomedia.load(infile).write(pipe)
+        finally:
+            reader.join()
+
+        with open(mp4filename, 'rb') as infile:
+            self.assertEqual(received, [infile.read()])
+
+    def test_copy_to_memory(self):
+        infile = BytesIO(b'0123456789')
+        outfile = BytesIO()
+
+        copy_range(infile, outfile, 2, 5)
+        self.assertEqual(outfile.getvalue(), b'23456')
+
+        with self.assertRaises(MalformedIsomFile):
+            copy_range(infile, outfile, 8, 5)
+
+    def test_adjacent_ranges_coalesce(self):
+        copies = []
+        output = RangeWriter(BytesIO(), lambda offset, length, fp: copies.append((offset, length)))
+
+        output.copy(0, 10)
+        output.copy(10, 5)
+        output.write(b'x')
+        output.copy(15, 5)
+        output.copy(30, 5)
+        output.flush()
+
+        self.assertEqual(copies, [(0, 15), (15, 5), (30, 5)])
+
+if __name__ == '__main__':
+    unittest.main()